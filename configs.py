@@ -25,8 +25,25 @@ minimum_auto_pixel_scale = 2
 
 
 """ FPS """
-target_fps = 60
-precise_fps = False
+target_fps = 60  # simulation ticks per second. the game logic assumes this never changes.
+max_ticks_per_frame = 4  # if rendering falls further behind than this, the simulation slows down instead of catching up
+max_render_fps = 60  # cap on rendered frames per second, or None to render as fast as the display allows
+
+
+""" Background Throttling """
+throttle_in_background = True
+unfocused_tps = 20  # ticks (and frames) per second while the window doesn't have focus. the game runs slower.
+hidden_tps = 10  # ticks per second while the window is minimized or hidden. nothing is rendered.
+pause_when_unfocused = True  # whether levels pause themselves when the window loses focus
+
+render_only_when_changed = True  # skip drawing frames that would look the same as the last one
+idle_redraw_interval_secs = 1  # ...but draw at least this often regardless
+
+
+""" Adaptive Quality """
+adaptive_quality = True  # turn down optional visual effects (never gameplay) when frames keep running over budget
+frame_budget_ms = 1000 / 60 * 0.9  # how long a frame's work may take, not counting the time spent waiting
+reduced_particle_spawn_rate = 0.5  # multiplier for decorative particle spawn rates while they're reduced
 
 
 """ Miscellaneous """
@@ -59,4 +76,5 @@ wireframe_3d = False
 use_local_paths = os.path.exists("store_userdata_here.txt")
 save_data_path = "save_data.json"
 settings_path = "settings.json"
+model_cache_dir = "model_cache"  # parsed 3D models get cached here
 
@@ -1,9 +1,13 @@
 import traceback
 import os
 import pathlib
+import argparse
 
-import configs
-import src.game.circuits
+import src.engine.startupreport as startupreport  # first, so the startup timeline covers the other imports
+
+with startupreport.phase("imports"):
+    import configs
+    import src.game.circuits
 
 
 """
@@ -13,6 +17,16 @@ The main entry point.
 game_class = src.game.circuits.CircuitsGame  # <--- change this to your actual game class
 
 
+def _parse_args():
+    parser = argparse.ArgumentParser(prog=configs.name_of_game)
+    parser.add_argument("--startup-report", nargs="?", const=os.path.join("logs", "startup_report.json"),
+                        default=None, metavar="PATH",
+                        help="print a timeline of the game's startup and write it to PATH as JSON "
+                             "(default: logs/startup_report.json)")
+    args, _ = parser.parse_known_args()  # ignore anything we don't recognize (e.g. args added by pyinstaller)
+    return args
+
+
 def _dismiss_splash_screen():
     try:
         import pyi_splash  # special pyinstaller thing - import will not resolve in dev
@@ -23,6 +37,7 @@ def _dismiss_splash_screen():
 
 if __name__ == "__main__":
     _dismiss_splash_screen()
+    startupreport.set_report_path(_parse_args().startup_report)
 
     try:
         import src.engine.gameloop as gameloop
@@ -22,10 +22,19 @@ class Game:
         raise NotImplementedError()
 
     def all_sprites(self):
+        """The sprites to render this frame (immediate mode)."""
         raise NotImplementedError()
 
+    def all_sprite_groups(self):
+        """The retained-mode SpriteGroups to render. These are only re-walked when they're marked as changed."""
+        return []
+
     def get_clear_color(self):
         return configs.clear_color
 
+    def on_window_focus_changed(self, has_focus):
+        """Called when the game's window gains or loses focus (including when it's minimized)."""
+        pass
+
     def cleanup(self):
         pass
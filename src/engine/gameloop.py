@@ -1,6 +1,9 @@
+import time
+
 import pygame
 
 import src.utils.util as util
+import src.utils.threadutils as threadutils
 import src.engine.sounds as sounds
 import src.engine.window as window
 import src.engine.inputs as inputs
@@ -9,6 +12,8 @@ import src.engine.keybinds as keybinds
 import src.engine.renderengine as renderengine
 import src.engine.spritesheets as spritesheets
 import src.engine.globaltimer as globaltimer
+import src.engine.startupreport as startupreport
+import src.engine.qualitygovernor as qualitygovernor
 import configs
 
 
@@ -24,62 +29,89 @@ def create_instance(game):
         return _INSTANCE
 
 
+def get_instance() -> '_GameLoop':
+    return _INSTANCE
+
+
+class _Throttle:
+    NONE = "none"
+    UNFOCUSED = "unfocused"  # the window's visible but something else has focus
+    HIDDEN = "hidden"  # the window's minimized or hidden, so nothing needs to be drawn
+
+
 class _GameLoop:
 
     def __init__(self, game):
         self._game = game
-        self._clock = pygame.time.Clock()
+        self._frame_limiter = globaltimer.FrameLimiter()
         self._requested_fullscreen_toggle_this_tick = False
         self._slo_mo_timer = 0
 
+        # the simulation ticks at a fixed rate, independent of how often frames are rendered
+        self._tick_accumulator = globaltimer.TickAccumulator(configs.target_fps,
+                                                             max_ticks_per_frame=configs.max_ticks_per_frame)
+        self._frame_count = 0
+
+        self._throttle = _Throttle.NONE
+        self._had_focus = True
+        self._last_render_time = 0
+
+        # turns down optional visual effects when frames are taking too long
+        self._quality_governor = qualitygovernor.create_instance(configs.frame_budget_ms / 1000)
+        self._quality_governor.set_enabled(configs.adaptive_quality)
+
         print("INFO: pygame version: " + pygame.version.ver)
-        print("INFO: initializing sounds...")
-        pygame.mixer.pre_init(44100, -16, 1, 2048)
-
-        pygame.mixer.init()
-        pygame.init()
-
-        window_icon = pygame.image.load(util.resource_path("assets/icons/icon_16x16.png"))
-        window_icon.set_colorkey((255, 0, 0))
-
-        print("INFO: creating window...")
-        window.create_instance(window_size=configs.default_window_size,
-                               min_size=configs.minimum_window_size,
-                               opengl_mode=not configs.start_in_compat_mode)
-        window.get_instance().set_caption(configs.name_of_game)
-        window.get_instance().set_icon(window_icon)
-        window.get_instance().show()
-
-        glsl_version_to_use = None
-        if window.get_instance().is_opengl_mode():
-            # make sure we can actually support OpenGL
-            glsl_version_to_use = renderengine.check_system_glsl_version(or_else_throw=False)
-            if glsl_version_to_use is None:
-                window.get_instance().set_opengl_mode(False)
-
-        print("INFO: creating render engine...")
-        render_eng = renderengine.create_instance(glsl_version_to_use)
-        render_eng.init(*configs.default_window_size)
-        render_eng.set_min_size(*configs.minimum_window_size)
+        with startupreport.phase("display init"):
+            print("INFO: initializing sounds...")
+            pygame.mixer.pre_init(44100, -16, 1, 2048)
+
+            pygame.mixer.init()
+            pygame.init()
+            sounds.init()
+
+            window_icon = pygame.image.load(util.resource_path("assets/icons/icon_16x16.png"))
+            window_icon.set_colorkey((255, 0, 0))
+
+            print("INFO: creating window...")
+            window.create_instance(window_size=configs.default_window_size,
+                                   min_size=configs.minimum_window_size,
+                                   opengl_mode=not configs.start_in_compat_mode)
+            window.get_instance().set_caption(configs.name_of_game)
+            window.get_instance().set_icon(window_icon)
+            window.get_instance().show()
+
+        with startupreport.phase("GL init"):
+            glsl_version_to_use = None
+            if window.get_instance().is_opengl_mode():
+                # make sure we can actually support OpenGL
+                glsl_version_to_use = renderengine.check_system_glsl_version(or_else_throw=False)
+                if glsl_version_to_use is None:
+                    window.get_instance().set_opengl_mode(False)
+
+            print("INFO: creating render engine...")
+            render_eng = renderengine.create_instance(glsl_version_to_use)
+            render_eng.init(*configs.default_window_size)
+            render_eng.set_min_size(*configs.minimum_window_size)
 
         inputs.create_instance()
         keybinds.create_instance()
 
-        sprite_atlas = spritesheets.create_instance()
+        with startupreport.phase("atlas build"):
+            sprite_atlas = spritesheets.create_instance()
 
-        for sheet in self._game.get_sheets():
-            sprite_atlas.add_sheet(sheet)
+            for sheet in self._game.get_sheets():
+                sprite_atlas.add_sheet(sheet)
 
-        atlas_surface = sprite_atlas.create_atlas_surface()
+            atlas_surface = sprite_atlas.create_atlas_surface()
 
-        # uncomment for fun
-        # import src.utils.artutils as artutils
-        # artutils.rainbowfill(atlas_surface)
+            # uncomment for fun
+            # import src.utils.artutils as artutils
+            # artutils.rainbowfill(atlas_surface)
 
-        # uncomment to save out the full texture atlas
-        # pygame.image.save(atlas_surface, "texture_atlas.png")
+            # uncomment to save out the full texture atlas
+            # pygame.image.save(atlas_surface, "texture_atlas.png")
 
-        render_eng.set_texture_atlas(atlas_surface)
+            render_eng.set_texture_atlas(atlas_surface)
 
         for layer in self._game.get_layers():
             renderengine.get_instance().add_layer(layer)
@@ -87,7 +119,8 @@ class _GameLoop:
         px_scale = window.calc_pixel_scale(window.get_instance().get_display_size())
         render_eng.set_pixel_scale(px_scale)
 
-        self._game.initialize()
+        with startupreport.phase("game init"):
+            self._game.initialize()
 
         if configs.is_dev:
             keybinds.get_instance().set_global_action(pygame.K_F1, "toggle profiling", lambda: self._toggle_profiling())
@@ -110,11 +143,15 @@ class _GameLoop:
         ignore_resize_events_next_tick = False
 
         while running:
+            frame_start_time = time.perf_counter()
+            frame_work_secs = None  # only set on frames that actually get rendered
+
             # processing user input events
             all_resize_events = []
 
+            # note that presses are only cleared after they've been seen by a tick (see below), so they aren't lost
+            # on frames that don't run any ticks.
             input_state = inputs.get_instance()
-            input_state.pre_update()
 
             for py_event in pygame.event.get():
                 if py_event.type == pygame.QUIT:
@@ -140,6 +177,18 @@ class _GameLoop:
                 elif py_event.type == pygame.VIDEORESIZE:
                     all_resize_events.append(py_event)
 
+                elif py_event.type == pygame.WINDOWFOCUSLOST:
+                    window.get_instance().set_has_focus(False)
+                elif py_event.type == pygame.WINDOWFOCUSGAINED:
+                    window.get_instance().set_has_focus(True)
+                elif py_event.type in (pygame.WINDOWMINIMIZED, pygame.WINDOWHIDDEN):
+                    window.get_instance().set_visible(False)
+                elif py_event.type in (pygame.WINDOWRESTORED, pygame.WINDOWMAXIMIZED, pygame.WINDOWSHOWN):
+                    window.get_instance().set_visible(True)
+
+                # anything could've changed what's on screen (input, the window being uncovered, etc.)
+                renderengine.get_instance().request_redraw()
+
                 if not pygame.mouse.get_focused():
                     input_state.set_mouse_pos(None)
 
@@ -174,56 +223,141 @@ class _GameLoop:
 
                 renderengine.get_instance().resize(display_w, display_h, px_scale=new_pixel_scale)
 
-            input_state.update()
+            # finish up any background work that has to be completed on the main thread
+            threadutils.process_main_thread_callbacks(time_budget_secs=0.004)
+
             sounds.update()
 
-            # updates the actual game state
-            still_running = self._game.update()
+            self._update_throttle()
 
-            if still_running is False:
-                running = False
+            slo_mo_mode = configs.is_dev and input_state.is_held(pygame.K_TAB)
+            if self._throttle == _Throttle.HIDDEN:
+                ticks_per_sec = configs.hidden_tps
+            elif self._throttle == _Throttle.UNFOCUSED:
+                ticks_per_sec = configs.unfocused_tps
+            else:
+                ticks_per_sec = configs.target_fps if not slo_mo_mode else configs.target_fps // 4
+            self._tick_accumulator.set_ticks_per_sec(ticks_per_sec)
 
-            # draws the actual game state
-            for spr in self._game.all_sprites():
-                if spr is not None:
-                    renderengine.get_instance().update(spr)
+            for _ in range(self._tick_accumulator.advance(time.perf_counter())):
+                input_state.update()
 
-            renderengine.get_instance().set_clear_color(self._game.get_clear_color())
-            renderengine.get_instance().render_layers()
+                # updates the actual game state
+                still_running = self._game.update()
 
-            pygame.display.flip()
+                globaltimer.inc_tick_count()
+                input_state.pre_update()
 
-            slo_mo_mode = configs.is_dev and input_state.is_held(pygame.K_TAB)
-            target_fps = configs.target_fps if not slo_mo_mode else configs.target_fps // 4
+                if slo_mo_mode:
+                    self._slo_mo_timer += 1
 
-            self._wait_until_next_frame(target_fps)
+                if still_running is False:
+                    running = False
+                    break
 
-            globaltimer.inc_tick_count()
+            # draws the actual game state
+            if self._throttle != _Throttle.HIDDEN:
+                for spr in self._game.all_sprites():
+                    if spr is not None:
+                        renderengine.get_instance().update(spr)
+                renderengine.get_instance().set_sprite_groups(self._game.all_sprite_groups())
+
+                renderengine.get_instance().set_clear_color(self._game.get_clear_color())
+
+                cur_time = time.perf_counter()
+                if (not configs.render_only_when_changed
+                        or renderengine.get_instance().has_pending_changes()
+                        or cur_time - self._last_render_time >= configs.idle_redraw_interval_secs):
+                    renderengine.get_instance().render_layers()
+
+                    # flip() can block until the next vblank, which isn't work the governor can do anything about
+                    frame_work_secs = time.perf_counter() - frame_start_time
+                    pygame.display.flip()
+                    startupreport.first_frame_shown()
+
+                    globaltimer.inc_frame_count()
+                    self._last_render_time = cur_time
+                else:
+                    # nothing on screen changed, so the last frame's still good
+                    renderengine.get_instance().skip_frame()
+
+            if frame_work_secs is not None and self._throttle == _Throttle.NONE and not slo_mo_mode:
+                # throttled frames are slow on purpose, so they don't count
+                self._quality_governor.record_frame_time(frame_work_secs)
+
+            if self._throttle == _Throttle.NONE:
+                self._wait_until_next_frame(configs.max_render_fps)
+            else:
+                self._wait_until_next_frame(ticks_per_sec)
+
+            self._frame_count += 1
 
             if globaltimer.get_show_fps():
-                if globaltimer.tick_count() % 20 == 0:
+                if self._frame_count % 20 == 0:
                     window.get_instance().set_caption_info("FPS", "{:.1f}".format(globaltimer.get_fps()))
-            elif globaltimer.tick_count() % configs.target_fps == 0:
-                if globaltimer.get_fps() < 0.9 * configs.target_fps and configs.is_dev and not slo_mo_mode:
-                    print("WARN: fps drop: {} ({} sprites)".format(round(globaltimer.get_fps() * 10) / 10.0,
-                                                                   renderengine.get_instance().count_sprites()))
-            if slo_mo_mode:
-                self._slo_mo_timer += 1
-            elif self._slo_mo_timer > 0:
+                    window.get_instance().set_caption_info("TPS", "{:.1f}".format(globaltimer.get_tps()))
+                    window.get_instance().set_caption_info("JITTER", "{:.2f}ms".format(
+                        self._frame_limiter.get_stats()["jitter_ms"]))
+                    window.get_instance().set_caption_info("QUALITY", "{}/{}".format(
+                        self._quality_governor.get_level(), self._quality_governor.get_max_level()))
+            elif self._frame_count % configs.target_fps == 0 and self._throttle == _Throttle.NONE:
+                if globaltimer.get_tps() < 0.9 * configs.target_fps and configs.is_dev and not slo_mo_mode:
+                    print("WARN: simulation slowdown: {} ticks/sec at {} fps ({} sprites, quality level {})".format(
+                        round(globaltimer.get_tps() * 10) / 10.0,
+                        round(globaltimer.get_fps() * 10) / 10.0,
+                        renderengine.get_instance().count_sprites(),
+                        self._quality_governor.get_level()))
+            if not slo_mo_mode and self._slo_mo_timer > 0:
                 # useful for timing things in the game
                 print("INFO: slow-mo mode ended after {} tick(s)".format(self._slo_mo_timer))
                 self._slo_mo_timer = 0
 
         self._game.cleanup()
 
+        if startupreport.get_report_path() is not None:
+            # again, to pick up anything that was loaded lazily after startup
+            startupreport.write_report(startupreport.get_report_path())
+
         print("INFO: quitting game")
         pygame.quit()
 
-    def _wait_until_next_frame(self, target_fps):
-        if configs.precise_fps:
-            self._clock.tick_busy_loop(target_fps)
+    def _update_throttle(self):
+        win = window.get_instance()
+        if not configs.throttle_in_background:
+            new_throttle = _Throttle.NONE
+        elif not win.is_visible():
+            new_throttle = _Throttle.HIDDEN
+        elif not win.has_focus():
+            new_throttle = _Throttle.UNFOCUSED
         else:
-            self._clock.tick(target_fps)
+            new_throttle = _Throttle.NONE
+
+        if new_throttle != self._throttle:
+            print("INFO: window is {}, throttling changed: {} -> {}".format(
+                "visible" if win.is_visible() else "hidden", self._throttle, new_throttle))
+            self._throttle = new_throttle
+
+            # start the new rates from scratch, so the simulation doesn't try to "catch up" on the time it
+            # spent throttled (or get a burst of ticks from the old rate's leftover time).
+            self._tick_accumulator.reset()
+            self._frame_limiter.reset_schedule()
+            self._quality_governor.reset()
+            renderengine.get_instance().request_redraw()
+
+        if win.has_focus() != self._had_focus:
+            self._had_focus = win.has_focus()
+            if not self._had_focus:
+                # it won't see the keys being released
+                inputs.get_instance().release_all()
+            self._game.on_window_focus_changed(self._had_focus)
+
+    def _wait_until_next_frame(self, target_fps):
+        # target_fps=None means render as fast as the display allows
+        self._frame_limiter.wait(target_fps)
+
+    def get_frame_pacing_stats(self):
+        """returns: see globaltimer.FrameLimiter.get_stats"""
+        return self._frame_limiter.get_stats()
 
 
 
@@ -1,4 +1,6 @@
 import time
+import math
+from collections import deque
 
 _TICK_COUNT = 0
 
@@ -6,6 +8,9 @@ _TICK_COUNT = 0
 _TICK_TIMES = [time.time()] * 10
 _TICK_TIME_IDX = 0
 
+_FRAME_TIMES = [time.time()] * 10
+_FRAME_TIME_IDX = 0
+
 _SHOW_FPS = False
 
 
@@ -16,7 +21,7 @@ def tick_count():
 
 def inc_tick_count():
     """
-    It's pretty important that the game loop calls this once per frame (at the end, after rendering).
+    It's pretty important that the game loop calls this once per simulation tick (at the end, after the game's update).
     src.engine.renderengine and src.engine.inputs specifically rely on this for their internal logic.
     """
     global _TICK_COUNT
@@ -27,15 +32,96 @@ def inc_tick_count():
     _TICK_TIME_IDX = (_TICK_TIME_IDX + 1) % len(_TICK_TIMES)  # circular list
 
 
-def get_fps():
-    """returns: average fps of the last several frames."""
-    min_time = min(_TICK_TIMES)
-    max_time = max(_TICK_TIMES)
+def inc_frame_count():
+    """The game loop calls this once per rendered frame. There may be zero, one or several ticks per frame."""
+    global _FRAME_TIME_IDX
+    _FRAME_TIMES[_FRAME_TIME_IDX] = time.time()
+    _FRAME_TIME_IDX = (_FRAME_TIME_IDX + 1) % len(_FRAME_TIMES)
+
+
+def _calc_rate(times):
+    min_time = min(times)
+    max_time = max(times)
     elapsed_time = max_time - min_time
     if elapsed_time == 0:
         return 999
     else:
-        return (len(_TICK_TIMES) - 1) / elapsed_time
+        return (len(times) - 1) / elapsed_time
+
+
+def get_fps():
+    """returns: average fps of the last several rendered frames."""
+    return _calc_rate(_FRAME_TIMES)
+
+
+def get_tps():
+    """returns: average number of simulation ticks per second, over the last several ticks."""
+    return _calc_rate(_TICK_TIMES)
+
+
+class TickAccumulator:
+    """
+        Converts elapsed real time into a number of fixed-length simulation ticks, so that the simulation runs at
+        the same rate regardless of how fast frames are being rendered.
+    """
+
+    def __init__(self, ticks_per_sec, max_ticks_per_frame=4, slop=0.1):
+        """
+            max_ticks_per_frame: the most ticks that'll be run to catch up in a single frame. If the game falls further
+                behind than that, the extra time is dropped (and the game slows down) rather than spiraling.
+            slop: the fraction of a tick's length that a tick can start early by. This absorbs timing jitter (e.g.
+                pygame's Clock alternates between 16 and 17 ms frames at 60 fps), so a display running at the tick
+                rate doesn't alternate between 0 and 2 ticks per frame. It doesn't affect the long-run tick rate.
+        """
+        self._tick_secs = 1 / ticks_per_sec
+        self._max_ticks_per_frame = max_ticks_per_frame
+        self._slop = slop
+
+        self._accumulated_secs = 0
+        self._last_time = None
+
+        self._dropped_ticks = 0
+
+    def set_ticks_per_sec(self, ticks_per_sec):
+        self._tick_secs = 1 / ticks_per_sec
+
+    def get_tick_secs(self):
+        return self._tick_secs
+
+    def advance(self, cur_time_secs) -> int:
+        """cur_time_secs: the current time, from a monotonic clock.
+            returns: how many ticks to run this frame.
+        """
+        if self._last_time is None:
+            self._last_time = cur_time_secs
+            return 1  # the first frame always gets a tick
+
+        self._accumulated_secs += max(0, cur_time_secs - self._last_time)
+        self._last_time = cur_time_secs
+
+        n_ticks = 0
+        while self._accumulated_secs >= self._tick_secs * (1 - self._slop):
+            if n_ticks >= self._max_ticks_per_frame:
+                self._dropped_ticks += int(self._accumulated_secs / self._tick_secs)
+                self._accumulated_secs = 0
+                break
+            self._accumulated_secs -= self._tick_secs
+            n_ticks += 1
+
+        return n_ticks
+
+    def get_interpolation_alpha(self):
+        """returns: how far (from 0 to 1) the current time is between the last tick and the next one."""
+        return max(0, min(1, self._accumulated_secs / self._tick_secs))
+
+    def get_num_dropped_ticks(self):
+        """returns: how many ticks have been skipped because the game couldn't keep up."""
+        return self._dropped_ticks
+
+    def reset(self):
+        """Forgets any accumulated time (e.g. after a long pause, so the game doesn't try to catch up)."""
+        self._accumulated_secs = 0
+        self._last_time = None
 
 
 def get_show_fps():
@@ -45,3 +131,232 @@ def get_show_fps():
 def set_show_fps(val):
     global _SHOW_FPS
     _SHOW_FPS = val
+
+
+class FrameLimiter:
+    """
+        Waits until the next frame's deadline by sleeping until shortly before it, then spinning for the remainder.
+        The margin it leaves for spinning adapts to how much the OS has been oversleeping lately, so pacing is about
+        as tight as a pure busy loop while the CPU mostly sleeps.
+    """
+
+    def __init__(self, initial_margin_secs=0.002, min_margin_secs=0.0002, history_size=120,
+                 clock=time.perf_counter, sleep=time.sleep, cpu_clock=time.thread_time):
+        self._margin_secs = initial_margin_secs
+        self._min_margin_secs = min_margin_secs
+
+        self._clock = clock
+        self._sleep = sleep
+        self._cpu_clock = cpu_clock
+
+        self._next_deadline = None
+        self._last_frame_end = None
+
+        self._oversleeps = deque(maxlen=30)  # recent amounts the OS overslept by, in secs
+        self._intervals = deque(maxlen=history_size)  # recent frame intervals, in secs
+        self._errors = deque(maxlen=history_size)  # recent (actual - target) frame intervals, in secs
+
+        self._n_frames = 0
+        self._n_missed_deadlines = 0
+        self._total_wait_secs = 0
+        self._total_wait_cpu_secs = 0
+        self._total_spin_secs = 0
+
+    def wait(self, target_fps):
+        """Blocks until it's time to start the next frame.
+            target_fps: the frame rate to pace to, or None to return immediately.
+        """
+        start_time = self._clock()
+        start_cpu_time = self._cpu_clock()
+
+        if target_fps is None or target_fps <= 0:
+            self._next_deadline = None
+            self._finish_frame(start_time, start_time, start_cpu_time, None)
+            return
+
+        period = 1 / target_fps
+        if self._next_deadline is None:
+            self._next_deadline = start_time + period
+        elif start_time > self._next_deadline:
+            # the frame ran long. start a fresh schedule instead of rushing the next few frames to catch up
+            self._n_missed_deadlines += 1
+            self._next_deadline = start_time
+            self._finish_frame(start_time, start_time, start_cpu_time, period)
+            self._next_deadline = start_time + period
+            return
+
+        deadline = self._next_deadline
+        margin = min(self._margin_secs, period / 2)
+
+        sleep_secs = deadline - start_time - margin
+        if sleep_secs > 0:
+            self._sleep(sleep_secs)
+            actual_sleep_secs = self._clock() - start_time
+            self._record_oversleep(actual_sleep_secs - sleep_secs)
+
+        spin_start = self._clock()
+        cur_time = spin_start
+        while cur_time < deadline:
+            cur_time = self._clock()
+        self._total_spin_secs += cur_time - spin_start
+
+        self._finish_frame(start_time, cur_time, start_cpu_time, period)
+        self._next_deadline = deadline + period
+
+    def _record_oversleep(self, oversleep_secs):
+        self._oversleeps.append(max(0, oversleep_secs))
+        # enough to cover the worst recent oversleep, plus a little extra
+        self._margin_secs = max(self._min_margin_secs, max(self._oversleeps) * 1.25)
+
+    def _finish_frame(self, wait_start, wait_end, wait_start_cpu, period):
+        self._n_frames += 1
+        self._total_wait_secs += wait_end - wait_start
+        self._total_wait_cpu_secs += max(0, self._cpu_clock() - wait_start_cpu)
+
+        if self._last_frame_end is not None:
+            interval = wait_end - self._last_frame_end
+            self._intervals.append(interval)
+            if period is not None:
+                self._errors.append(interval - period)
+        self._last_frame_end = wait_end
+
+    def reset_schedule(self):
+        """Starts a fresh schedule on the next wait, e.g. after the frame rate changes."""
+        self._next_deadline = None
+        self._last_frame_end = None
+
+    def get_sleep_margin(self):
+        """returns: how long before each deadline the limiter currently stops sleeping and starts spinning, in secs."""
+        return self._margin_secs
+
+    def get_stats(self):
+        """returns: a dict of frame pacing stats. Times are in milliseconds. Interval and jitter stats cover the
+            recent history, the totals cover the limiter's whole lifetime.
+        """
+        res = {
+            "frames": self._n_frames,
+            "missed_deadlines": self._n_missed_deadlines,
+            "sleep_margin_ms": self._margin_secs * 1000,
+            "total_wait_ms": self._total_wait_secs * 1000,
+            "total_spin_ms": self._total_spin_secs * 1000,
+            "total_wait_cpu_ms": self._total_wait_cpu_secs * 1000,
+            # how much of the time spent waiting actually used the CPU
+            "wait_cpu_fraction": self._total_wait_cpu_secs / self._total_wait_secs if self._total_wait_secs > 0 else 0,
+            "mean_interval_ms": 0,
+            "jitter_ms": 0,  # standard deviation of the frame intervals
+            "max_error_ms": 0,  # worst difference between a frame interval and the target
+        }
+        if len(self._intervals) > 0:
+            mean = sum(self._intervals) / len(self._intervals)
+            res["mean_interval_ms"] = mean * 1000
+            res["jitter_ms"] = math.sqrt(sum((v - mean) ** 2 for v in self._intervals) / len(self._intervals)) * 1000
+        if len(self._errors) > 0:
+            res["max_error_ms"] = max(abs(e) for e in self._errors) * 1000
+        return res
+
+
+if __name__ == "__main__":
+    import random
+
+    def _count_ticks(frame_durations, ticks_per_sec=60, max_ticks_per_frame=4):
+        acc = TickAccumulator(ticks_per_sec, max_ticks_per_frame=max_ticks_per_frame)
+        cur_time = 0
+        total = acc.advance(cur_time)
+        for dur in frame_durations:
+            cur_time += dur
+            total += acc.advance(cur_time)
+        return total, acc
+
+    # the number of ticks shouldn't depend on the frame rate
+    for fps in (30, 59.94, 60, 75, 144, 240, 1000):
+        n_ticks, _ = _count_ticks([1 / fps] * int(10 * fps))
+        assert abs(n_ticks - 601) <= 1, "{} ticks at {} fps".format(n_ticks, fps)
+
+    # or on jitter
+    rng = random.Random(12345)
+    durations = [rng.uniform(0.5, 1.5) / 60 for _ in range(600)]
+    n_ticks, _ = _count_ticks(durations)
+    assert abs(n_ticks - (1 + sum(durations) * 60)) <= 1, n_ticks
+
+    # a display running at the tick rate (with a little noise) should get exactly one tick per frame
+    acc = TickAccumulator(60)
+    acc.advance(0)
+    cur_time = 0
+    for i in range(600):
+        cur_time += (1 / 60) * rng.uniform(0.995, 1.005)
+        assert acc.advance(cur_time) == 1, "frame {}".format(i)
+
+    # same for pygame.time.Clock, which rounds its frame times to whole milliseconds
+    acc = TickAccumulator(60)
+    acc.advance(0)
+    cur_time = 0
+    for i in range(600):
+        cur_time += (16 if i % 3 == 0 else 17) / 1000
+        assert acc.advance(cur_time) == 1, "frame {}".format(i)
+
+    # if frames are too slow to catch up, the simulation slows down instead
+    n_ticks, acc = _count_ticks([1 / 10] * 100, max_ticks_per_frame=4)
+    assert n_ticks == 401, n_ticks
+    assert acc.get_num_dropped_ticks() > 0
+
+    # a huge hitch only costs up to max_ticks_per_frame
+    n_ticks, _ = _count_ticks([1 / 60, 5.0, 1 / 60], max_ticks_per_frame=4)
+    assert n_ticks == 1 + 1 + 4 + 1, n_ticks
+
+    print("INFO: all TickAccumulator tests passed")
+
+    class _FakeTime:
+        """A clock where sleeping always overshoots by a fixed amount, and reading the time takes 10us."""
+
+        def __init__(self, oversleep):
+            self.t = 0
+            self.cpu = 0
+            self.oversleep = oversleep
+
+        def clock(self):
+            self.t += 0.00001
+            self.cpu += 0.00001  # spinning burns CPU
+            return self.t
+
+        def sleep(self, secs):
+            self.t += secs + self.oversleep
+
+        def cpu_clock(self):
+            return self.cpu
+
+    # the margin should grow to cover the OS's oversleep, so deadlines are hit (almost) exactly
+    fake = _FakeTime(oversleep=0.0015)
+    limiter = FrameLimiter(initial_margin_secs=0.0005, clock=fake.clock, sleep=fake.sleep, cpu_clock=fake.cpu_clock)
+    for _ in range(300):  # the first frame or two overshoot, until the margin adapts (and they leave the history)
+        fake.t += 0.005  # the frame's "work"
+        limiter.wait(60)
+    stats = limiter.get_stats()
+    assert limiter.get_sleep_margin() >= 0.0015, limiter.get_sleep_margin()
+    assert stats["missed_deadlines"] == 0, stats
+    assert stats["max_error_ms"] < 0.1, stats
+    assert abs(stats["mean_interval_ms"] - 1000 / 60) < 0.01, stats
+    assert stats["wait_cpu_fraction"] < 0.25, stats  # mostly sleeping
+
+    # frames that run long are counted, and don't cause a burst of short frames afterwards
+    fake = _FakeTime(oversleep=0.0005)
+    limiter = FrameLimiter(clock=fake.clock, sleep=fake.sleep, cpu_clock=fake.cpu_clock)
+    for i in range(60):
+        fake.t += 0.030 if i == 30 else 0.005
+        before = fake.t
+        limiter.wait(60)
+        if i == 31:
+            assert fake.t - before > 0.005, "rushed the frame after a hitch"
+    assert limiter.get_stats()["missed_deadlines"] == 1, limiter.get_stats()
+
+    # and with the real clock, compared to a pure busy loop
+    for name, initial_margin in (("hybrid", 0.002), ("busy loop", 1000)):
+        limiter = FrameLimiter(initial_margin_secs=initial_margin, min_margin_secs=initial_margin)
+        for _ in range(60):
+            limiter.wait(60)
+        stats = limiter.get_stats()
+        print("INFO: {}: mean interval {:.3f}ms, jitter {:.3f}ms, max error {:.3f}ms, missed {}, "
+              "waiting CPU usage {:.0f}%".format(name, stats["mean_interval_ms"], stats["jitter_ms"],
+                                                 stats["max_error_ms"], stats["missed_deadlines"],
+                                                 100 * stats["wait_cpu_fraction"]))
+
+    print("INFO: all FrameLimiter tests passed")
@@ -227,6 +227,13 @@ class InputState:
                     return True
         return False
 
+    def release_all(self):
+        """Releases every held key and mouse button, e.g. when the window loses focus (and so won't see them
+            being released).
+        """
+        self._held_keys.clear()
+        self._mouse_down_pos.clear()
+
     def pre_update(self):
         """
         Called *before* inputs are passed in.
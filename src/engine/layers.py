@@ -13,18 +13,24 @@ def assert_int(val):
 
 class _Layer:
 
-    def __init__(self, layer_id, layer_height, sort_sprites=True, use_color=True):
+    def __init__(self, layer_id, layer_height, sort_sprites=True, use_color=True, cutout_only=False):
         """
             layer_id: The string identifier for this layer.
             layer_z: The z-depth of this layer, in relation to other layers in the engine. Higher z = on top.
             sort_sprites: Whether the sprites in this layer should be sorted by their depth.
             use_color: Whether this layer should use the color information in its sprites.
+            cutout_only: Whether every sprite in this layer is either fully opaque or fully transparent at each pixel.
+                If so (and the render engine supports it), the GPU's depth buffer is used to order the sprites
+                instead of sorting them on the CPU.
         """
         self._layer_id = layer_id
         self._layer_z = layer_height
 
         self._sort_sprites = sort_sprites
         self._use_color = use_color
+        self._cutout_only = cutout_only
+
+        self._depth_test_available = False  # set by the render engine
 
         self._offset = (0, 0)
         self._scale = 1
@@ -50,6 +56,18 @@ class _Layer:
     def is_color(self):
         return self._use_color
 
+    def is_cutout_only(self):
+        return self._cutout_only
+
+    def set_depth_test_available(self, val):
+        self._depth_test_available = val
+
+    def uses_depth_test(self):
+        return self.is_sorted() and self.is_cutout_only() and self._depth_test_available
+
+    def should_sort_on_cpu(self):
+        return self.is_sorted() and not self.uses_depth_test()
+
     def accepts_sprite_type(self, sprite_type):
         raise NotImplementedError()
 
@@ -71,6 +89,12 @@ class _Layer:
     def is_dirty(self):
         raise NotImplementedError()
 
+    def get_render_key(self):
+        """returns: a value that changes whenever the layer would draw differently, apart from changes to its
+            sprites (which make it dirty instead).
+        """
+        return (self._offset, self._scale)
+
     def get_num_sprites(self):
         raise NotImplementedError()
 
@@ -98,8 +122,9 @@ class ImageLayer(_Layer):
         Layer for ImageSprites.
     """
 
-    def __init__(self, layer_id, layer_z, sort_sprites=True, use_color=True):
-        _Layer.__init__(self, layer_id, layer_z, sort_sprites=sort_sprites, use_color=use_color)
+    def __init__(self, layer_id, layer_z, sort_sprites=True, use_color=True, cutout_only=False):
+        _Layer.__init__(self, layer_id, layer_z, sort_sprites=sort_sprites, use_color=use_color,
+                        cutout_only=cutout_only)
 
         self.images = []  # ordered list of image ids
         self._image_set = set()  # set of image ids
@@ -116,6 +141,16 @@ class ImageLayer(_Layer):
         self._to_remove = []
         self._to_add = []
 
+        self._needs_resort = False
+
+        self._image_idxs = {}    # image id -> index in self.images, as of the last full rebuild
+        self._sorted_depths = {}  # image id -> depth it was sorted with (only kept if sorting on the CPU)
+
+    def set_depth_test_available(self, val):
+        if val != self._depth_test_available:
+            super().set_depth_test_available(val)
+            self._needs_resort = True  # the CPU might have to start (or stop) sorting
+
     def update(self, sprite_id, last_mod_time):
         assert_int(sprite_id)
         if sprite_id in self._image_set:
@@ -135,7 +170,7 @@ class ImageLayer(_Layer):
             del self._last_known_last_modified_ticks[sprite_id]
 
     def is_dirty(self):
-        return len(self._dirty_sprites) + len(self._to_add) + len(self._to_remove) > 0
+        return self._needs_resort or len(self._dirty_sprites) + len(self._to_add) + len(self._to_remove) > 0
 
     def accepts_sprite_type(self, sprite_type):
         return sprite_type == sprites.SpriteTypes.IMAGE
@@ -162,8 +197,7 @@ class ImageLayer(_Layer):
         if self.is_color():
             self.colors.resize(self.color_stride() * n_sprites, refcheck=False)
 
-        # TODO - we only need to iterate over dirty indices here
-        # TODO - even better, can we numpyify this whole thing?
+        # TODO - can we numpyify this whole thing?
         for i in range(0, n_sprites):
             sprite = sprite_info_lookup[self.images[i]].sprite
             sprite.add_urself(
@@ -173,7 +207,34 @@ class ImageLayer(_Layer):
                 self.colors,
                 self.indices)
 
+    def _can_rebuild_in_place(self, sprite_info_lookup):
+        if self._needs_resort or len(self._to_add) > 0 or len(self._to_remove) > 0:
+            return False
+        sort_on_cpu = self.should_sort_on_cpu()
+        for sprite_id in self._dirty_sprites:
+            if sprite_id not in self._image_idxs:
+                return False
+            elif sort_on_cpu and sprite_info_lookup[sprite_id].sprite.depth() != self._sorted_depths.get(sprite_id):
+                return False  # it needs to move in the draw order
+        return True
+
+    def populate_data_arrays_at(self, sprite_ids, sprite_info_lookup):
+        for sprite_id in sprite_ids:
+            sprite = sprite_info_lookup[sprite_id].sprite
+            sprite.add_urself(
+                self._image_idxs[sprite_id],
+                self.vertices,
+                self.tex_coords,
+                self.colors,
+                self.indices)
+
     def rebuild(self, sprite_info_lookup):
+        if self._can_rebuild_in_place(sprite_info_lookup):
+            # only re-pack the sprites that changed
+            self.populate_data_arrays_at(self._dirty_sprites, sprite_info_lookup)
+            self._dirty_sprites.clear()
+            return
+
         if len(self._to_remove) > 0:
             # this is all here to handle the case where you add and remove a sprite on the same frame
             for sprite_id in self._to_remove:
@@ -191,19 +252,35 @@ class ImageLayer(_Layer):
             self._to_add.clear()
 
         self._dirty_sprites.clear()
+        self._needs_resort = False
 
-        if self.is_sorted():
-            self.images.sort(key=lambda x: -sprite_info_lookup[x].sprite.depth())
-
+        self.sort_images(sprite_info_lookup)
         self.populate_data_arrays(sprite_info_lookup)
 
+        self._image_idxs = {sprite_id: i for i, sprite_id in enumerate(self.images)}
+        if self.should_sort_on_cpu():
+            self._sorted_depths = {sprite_id: sprite_info_lookup[sprite_id].sprite.depth() for sprite_id in self.images}
+        else:
+            self._sorted_depths = {}
+
+    def sort_images(self, sprite_info_lookup):
+        """Puts the images into draw order. When the GPU is handling depth, the (stable) insertion order is
+            kept, which matches the sorted order for sprites of equal depth.
+        """
+        if self.should_sort_on_cpu():
+            self.images.sort(key=lambda x: -sprite_info_lookup[x].sprite.depth())
+
     def render(self, engine):
         if engine.is_opengl():
             # split up like this to make it easier to find performance bottlenecks
             self.set_client_states(True, engine)
             self._set_uniforms(engine)
             self._pass_attributes(engine)
+            if self.uses_depth_test():
+                engine.set_depth_test_enabled(True)
             self._draw_elements(engine)
+            if self.uses_depth_test():
+                engine.set_depth_test_enabled(False)
             self.set_client_states(False, engine)
         else:
             # compatibility mode
@@ -241,10 +318,34 @@ class ImageLayer(_Layer):
                                            self.is_sorted(), self.is_color())
 
 
+class TexturePageLayer(ImageLayer):
+    """
+        Layer for ImageSprites whose models live in their own texture pages (see RenderEngine.set_texture_page)
+        instead of the main atlas. Each sprite gets its own draw call, so it's only meant for a handful of big
+        images (like cutscenes). Sprites whose page isn't loaded yet (or was evicted) are skipped.
+    """
+
+    def __init__(self, layer_id, layer_z, sort_sprites=True, use_color=True):
+        ImageLayer.__init__(self, layer_id, layer_z, sort_sprites=sort_sprites, use_color=use_color,
+                            cutout_only=False)
+
+    def _draw_elements(self, engine):
+        stride = self.index_stride()
+        for i in range(0, len(self.images)):
+            model = engine.sprite_info_lookup[self.images[i]].sprite.model()
+            page_id = None if model is None else model.get_texture_page()
+            if page_id is None or not engine.has_texture_page(page_id):
+                continue
+            engine.bind_texture_page(page_id)
+            engine.draw_elements(self.indices[i * stride:(i + 1) * stride])
+
+        engine.bind_texture_page(None)
+
+
 class PolygonLayer(ImageLayer):
 
     def __init__(self, layer_id, layer_z, sort_sprites=True):
-        ImageLayer.__init__(self, layer_id, layer_z, sort_sprites=sort_sprites, use_color=True)
+        ImageLayer.__init__(self, layer_id, layer_z, sort_sprites=sort_sprites, use_color=True, cutout_only=False)
 
     def accepts_sprite_type(self, sprite_type):
         return sprite_type == sprites.SpriteTypes.TRIANGLE
@@ -0,0 +1,247 @@
+from collections import deque
+
+"""
+Turns down optional visual work (lighting updates, particles, text outlines, etc.) in steps when frames keep taking
+longer than the frame-time budget, and turns it back up once there's headroom again. Nothing in here is allowed to
+affect the simulation, only how nicely it's drawn.
+"""
+
+
+class Reductions:
+    """The optional work that can be reduced, in the order it gets reduced."""
+    SHAKE = "shake"                    # visual shaking of entities (see Entity.set_xy_perturbs)
+    TEXT_OUTLINES = "text_outlines"    # outlines around TextSprites
+    PARTICLES = "particles"            # decorative particle spawn rates
+    BG_ANIMATION = "bg_animation"      # the background triangles in the overworld
+    LIGHTING = "lighting"              # how often block lighting is recalculated
+
+    ALL = (SHAKE, TEXT_OUTLINES, PARTICLES, BG_ANIMATION, LIGHTING)
+
+
+class QualityGovernor:
+
+    def __init__(self, budget_secs, steps=Reductions.ALL, window_size=30, miss_fraction=0.25,
+                 headroom=0.6, upgrade_window_size=120, max_upgrade_window_size=960, verbose=True):
+        """
+            budget_secs: how long a frame's work (not including time spent waiting for the next frame) may take.
+            steps: the reductions to apply, in order. Level N means the first N of them are active.
+            window_size: number of recent frames to consider when deciding whether to reduce quality.
+            miss_fraction: quality is reduced when more than this fraction of the window is over budget.
+            headroom: quality is restored when every frame in the upgrade window took less than this
+                fraction of the budget.
+            upgrade_window_size: number of frames with headroom needed before quality is restored. This doubles
+                (up to max_upgrade_window_size) whenever a restored level immediately has to be reduced again,
+                so the governor doesn't flip back and forth.
+        """
+        self._budget_secs = budget_secs
+        self._steps = tuple(steps)
+        self._window_size = window_size
+        self._miss_fraction = miss_fraction
+        self._headroom = headroom
+        self._base_upgrade_window_size = upgrade_window_size
+        self._upgrade_window_size = upgrade_window_size
+        self._max_upgrade_window_size = max_upgrade_window_size
+        self._verbose = verbose
+
+        self._enabled = True
+        self._level = 0
+
+        self._recent = deque(maxlen=window_size)  # frame times since the last change
+        self._num_misses = 0                      # number of frames in _recent that were over budget
+        self._frames_with_headroom = 0            # consecutive frames under the headroom threshold
+
+        self._frame_count = 0
+        self._last_upgrade_frame = None
+
+        self._decisions = []  # list of dicts, see get_decisions()
+
+    def set_enabled(self, val):
+        """When disabled, everything runs at full quality."""
+        self._enabled = val
+
+    def is_enabled(self):
+        return self._enabled
+
+    def get_budget_secs(self):
+        return self._budget_secs
+
+    def get_level(self):
+        return self._level if self._enabled else 0
+
+    def get_max_level(self):
+        return len(self._steps)
+
+    def is_reduced(self, reduction):
+        """returns: whether the given kind of work (see Reductions) should currently be cut back."""
+        if not self._enabled or reduction not in self._steps:
+            return False
+        return self._steps.index(reduction) < self._level
+
+    def record_frame_time(self, secs):
+        """Call once per rendered frame with how long its work took.
+            returns: True if the quality level changed.
+        """
+        self._frame_count += 1
+        if not self._enabled:
+            return False
+
+        if len(self._recent) == self._recent.maxlen and self._recent[0] > self._budget_secs:
+            self._num_misses -= 1
+        self._recent.append(secs)
+        if secs > self._budget_secs:
+            self._num_misses += 1
+
+        if secs < self._budget_secs * self._headroom:
+            self._frames_with_headroom += 1
+        else:
+            self._frames_with_headroom = 0
+
+        if (len(self._recent) == self._window_size
+                and self._num_misses > self._miss_fraction * self._window_size
+                and self._level < self.get_max_level()):
+            if self._last_upgrade_frame is not None \
+                    and self._frame_count - self._last_upgrade_frame <= self._upgrade_window_size:
+                # that level was just restored and it's already too slow, so wait longer next time
+                self._upgrade_window_size = min(self._max_upgrade_window_size, self._upgrade_window_size * 2)
+            self._last_upgrade_frame = None
+            self._change_level(self._level + 1, "{}/{} frames over budget".format(self._num_misses,
+                                                                                  len(self._recent)))
+            return True
+
+        elif self._frames_with_headroom >= self._upgrade_window_size and self._level > 0:
+            self._change_level(self._level - 1, "{} frames under {:.1f}ms".format(
+                self._frames_with_headroom, self._budget_secs * self._headroom * 1000))
+            self._last_upgrade_frame = self._frame_count
+            return True
+
+        elif self._last_upgrade_frame is not None \
+                and self._frame_count - self._last_upgrade_frame > self._upgrade_window_size \
+                and self._upgrade_window_size > self._base_upgrade_window_size:
+            # the restored level has held up, so go back to the normal wait
+            self._upgrade_window_size = self._base_upgrade_window_size
+            self._last_upgrade_frame = None
+
+        return False
+
+    def _change_level(self, new_level, reason):
+        old_level = self._level
+        self._level = new_level
+        mean_ms = 1000 * sum(self._recent) / len(self._recent) if len(self._recent) > 0 else 0
+
+        decision = {
+            "frame": self._frame_count,
+            "old_level": old_level,
+            "new_level": new_level,
+            "step": self._steps[min(old_level, new_level)],
+            "reason": reason,
+            "mean_frame_ms": round(mean_ms, 2)
+        }
+        self._decisions.append(decision)
+
+        if self._verbose:
+            print("INFO: {} {} (quality level {} -> {}): {}, mean frame time {:.1f}ms (budget {:.1f}ms)".format(
+                "reducing" if new_level > old_level else "restoring", decision["step"], old_level, new_level,
+                reason, mean_ms, self._budget_secs * 1000))
+
+        # start fresh, so the next decision is based on how the new level performs
+        self._recent.clear()
+        self._num_misses = 0
+        self._frames_with_headroom = 0
+
+    def get_decisions(self):
+        """returns: list of dicts describing each level change, oldest first. Keys are: frame, old_level,
+            new_level, step (the reduction that was applied or removed), reason, and mean_frame_ms.
+        """
+        return list(self._decisions)
+
+    def reset(self):
+        """Goes back to full quality and forgets the recent frame times. The game loop calls this whenever the
+            window's throttling changes, since frames from before the change say nothing about the ones after it.
+        """
+        if self._level > 0:
+            self._change_level(0, "reset")
+        self._recent.clear()
+        self._num_misses = 0
+        self._frames_with_headroom = 0
+        self._upgrade_window_size = self._base_upgrade_window_size
+        self._last_upgrade_frame = None
+
+
+_INSTANCE = None
+
+
+def create_instance(budget_secs, **kwargs):
+    global _INSTANCE
+    _INSTANCE = QualityGovernor(budget_secs, **kwargs)
+    return _INSTANCE
+
+
+def get_instance() -> QualityGovernor:
+    global _INSTANCE
+    if _INSTANCE is None:
+        # nothing's measuring the frames, so it just stays at full quality
+        _INSTANCE = QualityGovernor(1 / 60, verbose=False)
+    return _INSTANCE
+
+
+def is_reduced(reduction):
+    return get_instance().is_reduced(reduction)
+
+
+if __name__ == "__main__":
+    BUDGET = 1 / 60
+
+    def _run(trace, **kwargs):
+        gov = QualityGovernor(BUDGET, verbose=False, **kwargs)
+        levels = []
+        for t in trace:
+            gov.record_frame_time(t)
+            levels.append(gov.get_level())
+        return gov, levels
+
+    # comfortably under budget: nothing changes
+    gov, levels = _run([0.005] * 1000)
+    assert max(levels) == 0 and len(gov.get_decisions()) == 0
+
+    # a few isolated spikes (e.g. loading a level) aren't enough to reduce anything
+    gov, levels = _run(([0.005] * 59 + [0.1]) * 20)
+    assert max(levels) == 0, levels
+
+    # sustained overload reduces quality one step at a time, in order
+    gov, levels = _run([0.025] * 30)
+    assert levels[-1] == 1 and gov.is_reduced(Reductions.SHAKE) and not gov.is_reduced(Reductions.TEXT_OUTLINES)
+    gov, levels = _run([0.025] * 1000)
+    assert levels[-1] == gov.get_max_level()
+    assert all(gov.is_reduced(r) for r in Reductions.ALL)
+    assert [d["new_level"] for d in gov.get_decisions()] == list(range(1, gov.get_max_level() + 1))
+    assert [d["step"] for d in gov.get_decisions()] == list(Reductions.ALL)
+
+    # it stops as soon as frames fit the budget, and restores quality once there's headroom
+    gov, levels = _run([0.025] * 60 + [0.012] * 500 + [0.005] * 500)
+    assert levels[59] == 2, levels[59]
+    assert levels[559] == 2, levels[559]  # under budget, but not by enough to risk going back up
+    assert levels[-1] == 0, levels[-1]
+    assert [d["new_level"] for d in gov.get_decisions()] == [1, 2, 1, 0]
+
+    # if the cost really does depend on the level, it settles instead of oscillating
+    # (it still probes the higher level now and then, but less and less often)
+    gov = QualityGovernor(BUDGET, verbose=False)
+    slow_frames = 0
+    for _ in range(20000):
+        slow = gov.get_level() < 2
+        slow_frames += 1 if slow else 0
+        gov.record_frame_time(0.02 if slow else 0.005)
+    assert gov.get_level() in (1, 2)
+    assert slow_frames < 0.05 * 20000, slow_frames
+    assert len(gov.get_decisions()) < 50, len(gov.get_decisions())
+
+    # disabled means full quality, no matter what
+    gov, levels = _run([0.1] * 100)
+    gov.set_enabled(False)
+    assert gov.get_level() == 0 and not gov.is_reduced(Reductions.LIGHTING)
+
+    gov.set_enabled(True)
+    gov.reset()
+    assert gov.get_level() == 0 and gov.get_decisions()[-1]["reason"] == "reset"
+
+    print("INFO: all qualitygovernor tests passed")
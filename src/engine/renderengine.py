@@ -36,6 +36,12 @@ def create_instance(glsl_version):
 
         _SINGLETON.set_texture_atlas(old_engine.cached_texture_atlas)
         _SINGLETON.sprite_info_lookup.update(old_engine.sprite_info_lookup)
+        _SINGLETON._immediate_uids.update(old_engine._immediate_uids)
+        _SINGLETON._immediate_uids_this_frame.update(old_engine._immediate_uids_this_frame)
+        for group in old_engine._sprite_groups:
+            _SINGLETON._sprite_groups[group] = old_engine._sprite_groups[group]
+        for page_id in old_engine._texture_pages:
+            _SINGLETON.set_texture_page(page_id, old_engine._texture_pages[page_id][0])
 
     return _SINGLETON
 
@@ -139,6 +145,17 @@ class Shader:
         glUseProgram(0)
 
 
+def _all_leaf_sprites(sprite):
+    """yields: the non-parent sprites under the given sprite (or the sprite itself), at any depth."""
+    if sprite is None:
+        return
+    elif sprite.is_parent():
+        for child in sprite.all_sprites():
+            yield from _all_leaf_sprites(child)
+    else:
+        yield sprite
+
+
 class _SpriteInfoBundle:
 
     def __init__(self, sprite, last_updated_tick):
@@ -150,6 +167,14 @@ class RenderEngine:
 
     def __init__(self):
         self.sprite_info_lookup = {}  # (int) id -> _SpriteInfoBundle
+
+        # sprites that are re-submitted every frame via update() ("immediate mode"). Any that weren't
+        # submitted this frame are removed, so we only need to track the ids from the last two frames.
+        self._immediate_uids = set()
+        self._immediate_uids_this_frame = set()
+
+        # sprites that stay submitted until their group changes ("retained mode").
+        self._sprite_groups = {}  # SpriteGroup -> set of sprite ids
         self.size = (0, 0)
         self.min_size = (0, 0)
         self._pixel_scale = 1  # the number of screen "pixels" per game pixel
@@ -162,9 +187,18 @@ class RenderEngine:
 
         self.cached_texture_atlas = None
         self.raw_texture_data = (None, 0, 0)  # data, width, height
+
+        # big images that get their own textures instead of living in the atlas (see TexturePageLayer).
+        self._texture_pages = {}  # page_id -> (Surface, tex_id)
+
+        # used to tell whether a frame would look any different from the last one (see has_pending_changes).
+        self._redraw_requested = True
+        self._last_render_key = None
+        self._clear_color = None
         
     def add_layer(self, layer):
         self.layers[layer.get_layer_id()] = layer
+        layer.set_depth_test_available(self.supports_depth_test())
         
         self.ordered_layers = list(self.layers.values())
         self.ordered_layers.sort(key=lambda x: x.get_layer_z())
@@ -216,6 +250,7 @@ class RenderEngine:
             params: tuple of floats (r, g, b) each between 0 and 1.0
         """
         r, g, b = color
+        self._clear_color = color
         glClearColor(r, g, b, 0.0)
 
     def get_pixel_scale(self):
@@ -282,6 +317,13 @@ class RenderEngine:
     def is_opengl(self):
         return True
 
+    def supports_depth_test(self):
+        """Whether this engine can order the sprites of cutout-only layers with a depth buffer."""
+        return False
+
+    def set_depth_test_enabled(self, val):
+        raise NotImplementedError()
+
     def get_shader(self):
         return self.shader
 
@@ -304,17 +346,24 @@ class RenderEngine:
            XXX on Windows, when pygame.display.set_mode is called, it seems to wipe away the active
            gl context, so we get around that by rebuilding the shader program and rebinding the texture...
         """
+        self.request_redraw()
         self.shader.end()
 
         self.shader = self.build_shader()
         self.shader.begin()
         self.setup_shader()
 
+        for page_id in self._texture_pages:
+            surface, tex_id = self._texture_pages[page_id]
+            self._upload_texture(pygame.image.tostring(surface, 'RGBA', True),
+                                 surface.get_width(), surface.get_height(), tex_id)
+
         img_data, w, h = self.raw_texture_data
         if img_data is not None:
             self._set_texture_data_as_str(img_data, w, h, tex_id=self.tex_id)
 
     def set_texture_atlas(self, texture: pygame.Surface):
+        self.request_redraw()
         self.cached_texture_atlas = texture
         img_data = pygame.image.tostring(texture, 'RGBA', True)
         self._set_texture_data_as_str(img_data, texture.get_width(), texture.get_height())
@@ -327,10 +376,7 @@ class RenderEngine:
             tex_id = glGenTextures(1)
             self.tex_id = tex_id
 
-        glBindTexture(GL_TEXTURE_2D, tex_id)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
+        self._upload_texture(img_data, width, height, tex_id)
         glEnable(GL_TEXTURE_2D)
 
         glEnable(GL_BLEND)
@@ -341,48 +387,166 @@ class RenderEngine:
 
         self.on_texture_changed()
 
+    def _upload_texture(self, img_data, width, height, tex_id):
+        glBindTexture(GL_TEXTURE_2D, tex_id)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
+
+    def set_texture_page(self, page_id, surface: pygame.Surface):
+        """Uploads an image into its own texture (a "page"), separate from the main atlas. Models on the page
+            should be created with texture_page=page_id and texture_size=surface.get_size().
+            Must be called from the main thread.
+        """
+        self.request_redraw()
+        tex_id = self._texture_pages[page_id][1] if page_id in self._texture_pages else glGenTextures(1)
+        self._upload_texture(pygame.image.tostring(surface, 'RGBA', True),
+                             surface.get_width(), surface.get_height(), tex_id)
+        self._texture_pages[page_id] = (surface, tex_id)
+        if self.tex_id is not None:
+            glBindTexture(GL_TEXTURE_2D, self.tex_id)  # put the atlas back
+
+    def remove_texture_page(self, page_id):
+        self.request_redraw()
+        if page_id in self._texture_pages:
+            tex_id = self._texture_pages[page_id][1]
+            del self._texture_pages[page_id]
+            glDeleteTextures([tex_id])
+
+    def has_texture_page(self, page_id):
+        return page_id in self._texture_pages
+
+    def all_texture_pages(self):
+        return self._texture_pages.keys()
+
+    def bind_texture_page(self, page_id):
+        """Binds a texture page for the upcoming draw calls. Pass None to go back to the main atlas."""
+        if page_id is None:
+            glBindTexture(GL_TEXTURE_2D, self.tex_id)
+            self.set_texture_size(self.raw_texture_data[1], self.raw_texture_data[2])
+        else:
+            surface, tex_id = self._texture_pages[page_id]
+            glBindTexture(GL_TEXTURE_2D, tex_id)
+            self.set_texture_size(surface.get_width(), surface.get_height())
+
+    def set_texture_size(self, w, h):
+        pass
+
     def on_texture_changed(self):
         pass
         
     def update(self, sprite):
-        if sprite is None:
-            return
+        """Submits a sprite for this frame only (i.e. "immediate mode"). It'll be removed at the end of the frame
+            unless it's submitted again next frame. A sprite should be submitted either this way or through a
+            SpriteGroup, not both at once (moving a sprite from one to the other is fine).
+        """
+        for leaf in _all_leaf_sprites(sprite):
+            self._put_sprite(leaf)
+            self._immediate_uids_this_frame.add(leaf.uid())
+
+    def _put_sprite(self, sprite):
+        uid = sprite.uid()
+        cur_tick = globaltimer.tick_count()
 
-        if sprite.is_parent():
-            for child_sprite in sprite.all_sprites():
-                self.update(child_sprite)
+        if uid not in self.sprite_info_lookup:
+            self.sprite_info_lookup[uid] = _SpriteInfoBundle(sprite, cur_tick)
         else:
-            uid = sprite.uid()
-            cur_tick = globaltimer.tick_count()
+            self.sprite_info_lookup[uid].sprite = sprite
+            self.sprite_info_lookup[uid].last_updated_tick = cur_tick
 
-            if uid not in self.sprite_info_lookup:
-                self.sprite_info_lookup[uid] = _SpriteInfoBundle(sprite, cur_tick)
-            else:
-                self.sprite_info_lookup[uid].sprite = sprite
-                self.sprite_info_lookup[uid].last_updated_tick = cur_tick
+        layer = self.layers[sprite.layer_id()]
 
-            layer = self.layers[sprite.layer_id()]
+        if layer.accepts_sprite_type(sprite.sprite_type()):
+            layer.update(uid, sprite.last_modified_tick())
+        else:
+            raise ValueError("Incompatible sprite type: {}".format(sprite.sprite_type()))
 
-            if layer.accepts_sprite_type(sprite.sprite_type()):
-                layer.update(uid, sprite.last_modified_tick())
-            else:
-                raise ValueError("Incompatible sprite type: {}".format(sprite.sprite_type()))
+    def _remove_sprite(self, uid):
+        if uid in self.sprite_info_lookup:
+            sprite_info = self.sprite_info_lookup[uid]
+            self.layers[sprite_info.sprite.layer_id()].remove(uid)
+            del self.sprite_info_lookup[uid]
+
+    def set_sprite_groups(self, groups):
+        """Sets the retained-mode sprite groups to render. Only groups that are new or marked as changed are
+            re-walked, and groups that were previously set but aren't anymore are removed.
+        """
+        groups = set(g for g in groups if g is not None)
+        for old_group in [g for g in self._sprite_groups if g not in groups]:
+            for uid in self._sprite_groups[old_group]:
+                self._remove_group_sprite(uid)
+            del self._sprite_groups[old_group]
+
+        for group in groups:
+            if group not in self._sprite_groups or group.is_changed():
+                self._sync_sprite_group(group)
+
+    def _sync_sprite_group(self, group):
+        old_uids = self._sprite_groups.get(group, ())
+        new_uids = set()
+        for spr in group.all_sprites():
+            for leaf in _all_leaf_sprites(spr):
+                self._put_sprite(leaf)
+                new_uids.add(leaf.uid())
+
+                # if it was submitted in immediate mode last frame, the group owns it now
+                self._immediate_uids.discard(leaf.uid())
+
+        for uid in old_uids:
+            if uid not in new_uids:
+                self._remove_group_sprite(uid)
+
+        self._sprite_groups[group] = new_uids
+        group.clear_changed()
+
+    def _remove_group_sprite(self, uid):
+        if uid not in self._immediate_uids_this_frame:
+            self._remove_sprite(uid)
+        # else it moved from the group to immediate mode, which owns it now
 
     def clear_screen(self):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
+    def _remove_stale_immediate_sprites(self):
+        # sprites that were submitted last frame but not this one. proportional to the number of
+        # immediate-mode sprites, rather than the total number of sprites (retained ones included).
+        for uid in self._immediate_uids:
+            if uid not in self._immediate_uids_this_frame:
+                self._remove_sprite(uid)
+
+        self._immediate_uids, self._immediate_uids_this_frame = self._immediate_uids_this_frame, self._immediate_uids
+        self._immediate_uids_this_frame.clear()
+
+    def request_redraw(self):
+        """Makes has_pending_changes() return True until the next render, for changes it can't detect itself."""
+        self._redraw_requested = True
+
+    def _calc_render_key(self):
+        return (tuple(layer.get_render_key() for layer in self.ordered_layers),
+                tuple(sorted(self.hidden_layers)), self.size, self._pixel_scale, self._clear_color)
+
+    def has_pending_changes(self):
+        """returns: whether the next render_layers() call would draw anything different from the last one.
+            Call this after the frame's sprites have been submitted.
+        """
+        if self._redraw_requested:
+            return True
+        for uid in self._immediate_uids:
+            if uid not in self._immediate_uids_this_frame:
+                return True  # a sprite went away
+        for layer in self.ordered_layers:
+            if layer.is_dirty():
+                return True
+        return self._calc_render_key() != self._last_render_key
+
+    def skip_frame(self):
+        """Call this instead of render_layers() on frames that aren't going to be drawn."""
+        self._remove_stale_immediate_sprites()
+
     def render_layers(self):
         self.clear_screen()
 
-        # clear out sprites that weren't updated this tick
-        cur_tick = globaltimer.tick_count()
-        ids_to_remove = [sprite_id for sprite_id in self.sprite_info_lookup
-                         if self.sprite_info_lookup[sprite_id].last_updated_tick < cur_tick]
-
-        for sprite_id in ids_to_remove:
-            sprite_info = self.sprite_info_lookup[sprite_id]
-            self.layers[sprite_info.sprite.layer_id()].remove(sprite_id)
-            del self.sprite_info_lookup[sprite_id]
+        self._remove_stale_immediate_sprites()
 
         for layer in self.ordered_layers:
             if layer.is_dirty():
@@ -393,6 +557,9 @@ class RenderEngine:
             
             self.render_layer(layer)
 
+        self._redraw_requested = False
+        self._last_render_key = self._calc_render_key()
+
     def render_layer(self, layer):
         layer.render(self)
 
@@ -420,6 +587,7 @@ class RenderEngine130(RenderEngine):
         super().__init__()
         self._tex_uniform_loc = None
         self._tex_size_uniform_loc = None
+        self._alpha_test_uniform_loc = None
 
         self._model_matrix_uniform_loc = None
         self._view_matrix_uniform_loc = None
@@ -466,11 +634,16 @@ class RenderEngine130(RenderEngine):
             
             uniform vec2 texSize;
             uniform sampler2D tex0;
+            uniform bool alphaTest;
 
             void main(void) {
                 vec2 texPos = vec2(texCoord.x / texSize.x, texCoord.y / texSize.y);
                 vec4 tcolor = texture2D(tex0, texPos);
                 
+                if (alphaTest && tcolor.w < 0.5) {
+                    discard;  // otherwise transparent pixels would still write to the depth buffer
+                }
+                
                 for (int i = 0; i < 3; i++) {
                     if (tcolor[i] >= 0.99) {
                         gl_FragColor[i] = tcolor[i] * color[i];
@@ -500,6 +673,11 @@ class RenderEngine130(RenderEngine):
         self._assert_valid_var("texSize", self._tex_size_uniform_loc)
         printOpenGLError()
 
+        self._alpha_test_uniform_loc = glGetUniformLocation(prog_id, "alphaTest")
+        self._assert_valid_var("alphaTest", self._alpha_test_uniform_loc)
+        glUniform1i(self._alpha_test_uniform_loc, 0)
+        printOpenGLError()
+
         self._model_matrix_uniform_loc = glGetUniformLocation(prog_id, "model")
         self._assert_valid_var("model", self._model_matrix_uniform_loc)
         glUniformMatrix4fv(self._model_matrix_uniform_loc, 1, GL_TRUE, self._model_matrix)
@@ -528,6 +706,20 @@ class RenderEngine130(RenderEngine):
         glVertexAttrib3f(self._color_attrib_loc, 1.0, 1.0, 1.0)
         printOpenGLError()
 
+    def supports_depth_test(self):
+        return True
+
+    def set_depth_test_enabled(self, val):
+        if val:
+            # each depth-tested layer starts fresh, so it still draws on top of all the layers below it.
+            glClear(GL_DEPTH_BUFFER_BIT)
+            glEnable(GL_DEPTH_TEST)
+            glDepthFunc(GL_LEQUAL)  # ties go to the sprite drawn last, same as the painter's algorithm
+        else:
+            glDisable(GL_DEPTH_TEST)
+        glUniform1i(self._alpha_test_uniform_loc, 1 if val else 0)
+        printOpenGLError()
+
     def set_model_matrix(self, mat):
         self._model_matrix = mat if mat is not None else numpy.identity(4, dtype=numpy.float32)
         glUniformMatrix4fv(self._model_matrix_uniform_loc, 1, GL_TRUE, self._model_matrix)
@@ -566,11 +758,11 @@ class RenderEngine130(RenderEngine):
 
     def on_texture_changed(self):
         if self.raw_texture_data is not None:
-            tex_w = self.raw_texture_data[1]
-            tex_h = self.raw_texture_data[2]
+            self.set_texture_size(self.raw_texture_data[1], self.raw_texture_data[2])
 
-            glUniform2f(self._tex_size_uniform_loc, float(tex_w), float(tex_h))
-            printOpenGLError()
+    def set_texture_size(self, w, h):
+        glUniform2f(self._tex_size_uniform_loc, float(w), float(h))
+        printOpenGLError()
 
     def set_vertices_enabled(self, val):
         if val:
@@ -641,10 +833,14 @@ class RenderEngine120(RenderEngine130):
             
             uniform vec2 texSize;
             uniform sampler2D tex0;
+            uniform bool alphaTest;
             
             void main(void) {
                 vec2 texPos = vec2(texCoord.x / texSize.x, texCoord.y / texSize.y);
                 vec4 tcolor = texture2D(tex0, texPos);
+                if (alphaTest && tcolor.w < 0.5) {
+                    discard;
+                }
                 for (int i = 0; i < 3; i++) {
                     if (tcolor[i] >= 0.99) {
                         gl_FragColor[i] = tcolor[i] * color[i];
@@ -663,6 +859,8 @@ import src.engine.sprites as sprites
 
 class PurePygameRenderEngine(RenderEngine):
 
+    MAX_SURFACE_CACHE_BYTES = 64 * 1024 * 1024
+
     def __init__(self):
         super().__init__()
         self.clear_color = (0, 0, 0)
@@ -671,6 +869,11 @@ class PurePygameRenderEngine(RenderEngine):
         self.camera_scale = (1, 1)
         self.camera_surface = None
 
+        # flipping, rotating, tinting and scaling surfaces is expensive, so we cache the results.
+        # (texture page, model rect, xflip, rotation, color, size) -> Surface
+        self._xformed_surface_cache = util.LRUCache(PurePygameRenderEngine.MAX_SURFACE_CACHE_BYTES,
+                                                    size_func=lambda surf: surf.get_width() * surf.get_height() * 4)
+
     def is_opengl(self):
         return False
 
@@ -690,8 +893,10 @@ class PurePygameRenderEngine(RenderEngine):
 
     def set_colors_enabled(self, val): pass
     def set_colors(self, data): pass
+    def set_depth_test_enabled(self, val): pass
 
     def reset_for_display_mode_change(self, new_surface):
+        self.request_redraw()
         self.set_camera_2d(self.camera_xy, self.camera_scale)
 
     def on_texture_changed(self): pass
@@ -704,6 +909,7 @@ class PurePygameRenderEngine(RenderEngine):
         self.resize(w, h)
 
     def set_clear_color(self, color):
+        self._clear_color = color
         self.clear_color = tuple(util.bound(int(c * 256), 0, 255) for c in color)
 
     def _get_render_mult(self) -> int:
@@ -725,9 +931,64 @@ class PurePygameRenderEngine(RenderEngine):
                 self.camera_surface = pygame.Surface(camera_surface_size, pygame.SRCALPHA)
 
     def set_texture_atlas(self, texture: pygame.Surface):
+        self.request_redraw()
         self.cached_texture_atlas = texture.convert_alpha()
+        self._xformed_surface_cache.clear()
         self.on_texture_changed()
 
+    def set_texture_page(self, page_id, surface: pygame.Surface):
+        self.request_redraw()
+        self._texture_pages[page_id] = (surface.convert_alpha(), None)
+
+    def remove_texture_page(self, page_id):
+        self.request_redraw()
+        if page_id in self._texture_pages:
+            del self._texture_pages[page_id]
+            # page ids aren't reused for different images, so any cached surfaces from it can just age out.
+
+    def bind_texture_page(self, page_id): pass
+
+    def _get_source_surface(self, model: 'sprites.ImageModel'):
+        page_id = model.get_texture_page()
+        if page_id is None:
+            return self.cached_texture_atlas
+        elif page_id in self._texture_pages:
+            return self._texture_pages[page_id][0]
+        else:
+            return None
+
+    def get_surface_cache(self) -> util.LRUCache:
+        return self._xformed_surface_cache
+
+    def _get_xformed_surface(self, sprite: 'sprites.ImageSprite', src_surface, src_rect_on_atlas, size):
+        key = (sprite.model().get_texture_page(), src_rect_on_atlas,
+               sprite.xflip(), sprite.rotation(), tuple(sprite.color()), size)
+        res = self._xformed_surface_cache.get(key)
+        if res is None:
+            subsurf = src_surface.subsurface(src_rect_on_atlas)
+            orig_subsurf = subsurf
+            if sprite.xflip():
+                subsurf = pygame.transform.flip(subsurf, True, False)
+
+            if sprite.rotation() == 0:
+                subsurf = subsurf.copy()
+            elif sprite.rotation() == 1:
+                subsurf = pygame.transform.rotate(subsurf, -90)
+            elif sprite.rotation() == 2:
+                subsurf = pygame.transform.rotate(subsurf, -180)
+            else:
+                subsurf = pygame.transform.rotate(subsurf, -270)
+
+            if sprite.color() != (1, 1, 1):
+                if subsurf == orig_subsurf:
+                    subsurf = subsurf.copy()
+                color255 = tuple(util.bound(int(c * 256), 0, 255) for c in sprite.color())
+                subsurf.fill(color255, [0, 0, subsurf.get_width(), subsurf.get_height()], pygame.BLEND_MULT)
+
+            res = pygame.transform.scale(subsurf, size)
+            self._xformed_surface_cache.put(key, res)
+        return res
+
     def _get_drawing_surface(self):
         if self.camera_surface is not None:
             return self.camera_surface
@@ -746,7 +1007,8 @@ class PurePygameRenderEngine(RenderEngine):
                     self.camera_xy[1] * mult)
 
             if isinstance(sprite, sprites.ImageSprite):
-                if sprite.model() is not None:
+                src_surface = None if sprite.model() is None else self._get_source_surface(sprite.model())
+                if src_surface is not None:
                     src_rect_on_atlas = sprite.model().rect()
                     dest_rect_in_world = sprite.rect()
 
@@ -762,29 +1024,10 @@ class PurePygameRenderEngine(RenderEngine):
                             and sprite.xflip() is False
                             and sprite.color() == (1, 1, 1)):
                         # already the correct size, just blit it
-                        surf.blit(self.cached_texture_atlas, (dest_rect[0], dest_rect[1]), src_rect_on_atlas)
+                        surf.blit(src_surface, (dest_rect[0], dest_rect[1]), src_rect_on_atlas)
                     else:
-                        subsurf = self.cached_texture_atlas.subsurface(src_rect_on_atlas)
-                        orig_subsurf = subsurf
-                        if sprite.xflip():
-                            subsurf = pygame.transform.flip(subsurf, True, False)
-
-                        if sprite.rotation() == 0:
-                            subsurf = subsurf.copy()
-                        elif sprite.rotation() == 1:
-                            subsurf = pygame.transform.rotate(subsurf, -90)
-                        elif sprite.rotation() == 2:
-                            subsurf = pygame.transform.rotate(subsurf, -180)
-                        else:
-                            subsurf = pygame.transform.rotate(subsurf, -270)
-
-                        if sprite.color() != (1, 1, 1):
-                            if subsurf == orig_subsurf:
-                                subsurf = subsurf.copy()
-                            color255 = tuple(util.bound(int(c * 256), 0, 255) for c in sprite.color())
-                            subsurf.fill(color255, [0, 0, subsurf.get_width(), subsurf.get_height()], pygame.BLEND_MULT)
-
-                        xformed = pygame.transform.scale(subsurf, (int(dest_rect[2]), int(dest_rect[3])))
+                        xformed = self._get_xformed_surface(sprite, src_surface, src_rect_on_atlas,
+                                                            (int(dest_rect[2]), int(dest_rect[3])))
                         surf.blit(xformed, (dest_rect[0], dest_rect[1]))
             elif isinstance(sprite, sprites.TriangleSprite):
                 surf = self._get_drawing_surface()
@@ -1,3 +1,5 @@
+import time
+
 import pygame
 
 import configs
@@ -39,6 +41,10 @@ class Scene:
     def all_sprites(self):
         raise NotImplementedError()
 
+    def all_sprite_groups(self):
+        """returns: the SpriteGroups this scene wants to keep on screen (see sprites.SpriteGroup)."""
+        return []
+
     def update_sprites(self):
         """Creates and/or updates the sprites in the scene.
             This method is optional and intended for scenes that want to implement a pause mode (where
@@ -52,12 +58,28 @@ class Scene:
         """Performs the "logic update" for the scene."""
         raise NotImplementedError()
 
+    def is_ready(self):
+        """Whether the scene is done with any background preparation. The SceneManager keeps the current scene
+            running until the next one is ready.
+        """
+        return True
+
+    def finish_preparing(self):
+        """Called on the main thread once the scene is ready, right before it becomes active. Should be quick."""
+        pass
+
     def became_active(self):
         pass
 
     def about_to_become_inactive(self):
         pass
 
+    def on_window_focus_changed(self, has_focus):
+        """Called on the active scene when the window gains or loses focus. Scenes that can pause should
+            consider doing so here.
+        """
+        pass
+
     def get_clear_color(self):
         return configs.clear_color
 
@@ -80,9 +102,21 @@ class SceneManager:
         self._next_scene = None
         self._next_scene_delay = 0
 
+        self._ticks_waiting_for_next_scene = 0
+        self._transition_stats = {
+            "transitions": 0,
+            "max_ticks_waiting": 0,        # frames spent running the old scene while the new one was being prepared
+            "max_finish_preparing_ms": 0,  # the worst main-thread cost of finishing a scene
+            "last_finish_preparing_ms": 0,
+        }
+
     def set_next_scene(self, scene, delay=0):
         self._next_scene = scene
         self._next_scene_delay = delay
+        self._ticks_waiting_for_next_scene = 0
+
+    def get_transition_stats(self):
+        return dict(self._transition_stats)
 
     def get_active_scene(self) -> Scene:
         return self._active_scene
@@ -90,20 +124,45 @@ class SceneManager:
     def get_clear_color(self):
         return self.get_active_scene().get_clear_color()
 
+    def on_window_focus_changed(self, has_focus):
+        self.get_active_scene().on_window_focus_changed(has_focus)
+
     def all_sprites(self):
         for spr in self.get_active_scene().all_sprites():
             yield spr
 
+    def all_sprite_groups(self):
+        for group in self.get_active_scene().all_sprite_groups():
+            yield group
+
+    def _activate_next_scene(self):
+        start_time = time.perf_counter()
+        self._next_scene.finish_preparing()
+        finish_ms = (time.perf_counter() - start_time) * 1000
+
+        stats = self._transition_stats
+        stats["transitions"] += 1
+        stats["max_ticks_waiting"] = max(stats["max_ticks_waiting"], self._ticks_waiting_for_next_scene)
+        stats["max_finish_preparing_ms"] = max(stats["max_finish_preparing_ms"], finish_ms)
+        stats["last_finish_preparing_ms"] = finish_ms
+        if self._ticks_waiting_for_next_scene > 0:
+            print("INFO: prepared {} in the background ({} frame(s), {:.1f}ms to finish on the main thread)".format(
+                type(self._next_scene).__name__, self._ticks_waiting_for_next_scene, finish_ms))
+
+        self._active_scene.about_to_become_inactive()
+        self._active_scene = self._next_scene
+        self._next_scene.became_active()
+        self._next_scene = None
+        self._next_scene_delay = 0
+
     def update(self):
         if self._next_scene is not None:
-            if self._next_scene_delay <= 0:
-                self._active_scene.about_to_become_inactive()
-                self._active_scene = self._next_scene
-                self._next_scene.became_active()
-                self._next_scene = None
-                self._next_scene_delay = 0
-            else:
+            if self._next_scene_delay > 0:
                 self._next_scene_delay -= 1
+            elif not self._next_scene.is_ready():
+                self._ticks_waiting_for_next_scene += 1  # keep running the current scene in the meantime
+            else:
+                self._activate_next_scene()
 
         self._active_scene.update()
         self._active_scene.update_sprites()
@@ -1,5 +1,6 @@
 import pygame
 import src.utils.util as util
+import src.utils.threadutils as threadutils
 import traceback
 import random
 
@@ -12,12 +13,130 @@ _RECENTLY_PLAYED = {}  # effect_id -> ticks since last play
 
 RECENCY_LIMIT = 4  # if an effect was already played X ticks ago, don't play it again
 
+MAX_VOICES = 16  # max number of effects that can play at once
+_NUM_UNMANAGED_CHANNELS = 8  # left over for Sound.play() calls that don't go through here (e.g. songs)
+
+_CATEGORY_LIMITS = {}  # category -> max number of voices that category can use at once
+_EFFECT_INFO = {}      # effect_id -> (category, priority)
+
+_VOICES = {}  # channel_idx -> _Voice
+_CHANNELS_RESERVED = False
+_PLAY_COUNT = 0
+
+_PRELOAD_FUTURES = []  # Futures that resolve to {effect_id: Sound}
+
+_STATS = {
+    "played": 0,
+    "suppressed_recent": 0,  # skipped because the same effect just played
+    "dropped": 0,            # skipped because there were no voices left
+    "stolen": 0,             # voices that got cut off to make room for a more important effect
+    "loaded_on_demand": 0,   # effects that had to be loaded on the main thread (i.e. they weren't preloaded)
+    "preloaded": 0,
+    "load_failures": 0,
+}
+
+
+class _Voice:
+
+    def __init__(self, channel_idx, effect_path, category, priority, play_order):
+        self.channel_idx = channel_idx
+        self.effect_path = effect_path
+        self.category = category
+        self.priority = priority
+        self.play_order = play_order
+
+
+def init():
+    """Reserves the channels used for sound effects. Should be called after the mixer is initialized."""
+    global _CHANNELS_RESERVED
+    if pygame.mixer.get_init() is None:
+        return False
+    pygame.mixer.set_num_channels(MAX_VOICES + _NUM_UNMANAGED_CHANNELS)
+    pygame.mixer.set_reserved(MAX_VOICES)  # keeps Sound.play() from grabbing our channels
+    _CHANNELS_RESERVED = True
+    return True
+
 
 def set_volume(volume):
     global _MASTER_VOLUME
     _MASTER_VOLUME = util.bound(volume, 0.0, 1.0)
 
 
+def set_category_limit(category, max_voices):
+    if max_voices is None:
+        if category in _CATEGORY_LIMITS:
+            del _CATEGORY_LIMITS[category]
+    else:
+        _CATEGORY_LIMITS[category] = max_voices
+
+
+def set_category(sound, category, priority=0, overwrite=False):
+    """
+    sound: an effect path, (effect_path, volume) tuple, or collection of those.
+    category: the category the sound's voices count against (see set_category_limit).
+    priority: when there aren't any voices left, effects can cut off voices of equal or lower priority.
+    overwrite: whether to replace the category of effects that already have one.
+    """
+    for effect_path in _all_effect_paths(sound):
+        if overwrite or effect_path not in _EFFECT_INFO:
+            _EFFECT_INFO[effect_path] = (category, priority)
+
+
+def get_stats():
+    res = dict(_STATS)
+    res["active_voices"] = len(_VOICES)
+    return res
+
+
+def reset_stats():
+    for key in _STATS:
+        _STATS[key] = 0
+
+
+def preload_sounds(sounds) -> threadutils.Future:
+    """Loads sound effects on a background thread, so they don't cause a hitch the first time they're played.
+    sounds: collection of effect paths (or anything else play_sound accepts).
+    """
+    to_load = [p for p in dict.fromkeys(_all_effect_paths(sounds)) if p not in _LOADED_EFFECTS]
+
+    def _do_load():
+        res = {}
+        for effect_path in to_load:
+            try:
+                res[effect_path] = pygame.mixer.Sound(effect_path)
+            except Exception as e:
+                print("ERROR: failed to preload sound effect {} ({})".format(effect_path, e))
+                res[effect_path] = None
+        return res
+
+    print("INFO: preloading {} sound effect(s)".format(len(to_load)))
+    fut = threadutils.do_decode_work_on_background_thread(_do_load)
+    _PRELOAD_FUTURES.append(fut)
+    return fut
+
+
+def is_preloading():
+    return len(_PRELOAD_FUTURES) > 0
+
+
+def _collect_preloaded_sounds():
+    for fut in [f for f in _PRELOAD_FUTURES if f.is_done()]:
+        _PRELOAD_FUTURES.remove(fut)
+        loaded = fut.get_val() or {}
+        for effect_path in loaded:
+            if effect_path not in _LOADED_EFFECTS:
+                _LOADED_EFFECTS[effect_path] = loaded[effect_path]
+                if loaded[effect_path] is not None:
+                    _STATS["preloaded"] += 1
+                else:
+                    _STATS["load_failures"] += 1
+
+
+def _reap_finished_voices():
+    for channel_idx in [idx for idx in _VOICES if not pygame.mixer.Channel(idx).get_busy()]:
+        del _VOICES[channel_idx]
+
+
 def update():
     to_remove = []
     for effect in _RECENTLY_PLAYED:
@@ -28,6 +147,23 @@ def update():
     for effect in to_remove:
         del _RECENTLY_PLAYED[effect]
 
+    if len(_PRELOAD_FUTURES) > 0:
+        _collect_preloaded_sounds()
+
+
+def _all_effect_paths(sound):
+    if sound is None or len(sound) == 0:
+        return []
+    elif isinstance(sound, str):
+        return [util.resource_path(sound)]
+    elif isinstance(sound, tuple) and len(sound) == 2 and isinstance(sound[1], (int, float)):
+        return [util.resource_path(sound[0])]
+    else:
+        res = []
+        for item in sound:
+            res.extend(_all_effect_paths(item))
+        return res
+
 
 def resolve_path_and_volume(sound, vol=1.0):
     """
@@ -56,25 +192,69 @@ def resolve_path_and_volume(sound, vol=1.0):
     return None, vol
 
 
+def _choose_voice_to_steal(candidates, priority):
+    """returns: the lowest priority (and then oldest) voice that's not more important than the new effect, or None."""
+    best = None
+    for v in candidates:
+        if v.priority <= priority and (best is None or (v.priority, v.play_order) < (best.priority, best.play_order)):
+            best = v
+    return best
+
+
+def _allocate_channel(category, priority):
+    """returns: index of the channel the new effect should play on, or None if it should be dropped."""
+    _reap_finished_voices()
+
+    to_steal = None
+    if category in _CATEGORY_LIMITS:
+        in_category = [v for v in _VOICES.values() if v.category == category]
+        if len(in_category) >= _CATEGORY_LIMITS[category]:
+            to_steal = _choose_voice_to_steal(in_category, priority)
+            if to_steal is None:
+                return None
+
+    if to_steal is None and len(_VOICES) >= MAX_VOICES:
+        to_steal = _choose_voice_to_steal(_VOICES.values(), priority)
+        if to_steal is None:
+            return None
+
+    if to_steal is not None:
+        pygame.mixer.Channel(to_steal.channel_idx).stop()
+        del _VOICES[to_steal.channel_idx]
+        _STATS["stolen"] += 1
+        return to_steal.channel_idx
+
+    for idx in range(0, MAX_VOICES):
+        if idx not in _VOICES:
+            return idx
+    return None
+
+
 def play_sound(sound, vol=1.0):
+    global _PLAY_COUNT
     effect_path, volume = resolve_path_and_volume(sound, vol=vol)
 
     if _MASTER_VOLUME == 0 or volume <= 0 or effect_path is None:
         return
 
     if effect_path in _RECENTLY_PLAYED:
+        _STATS["suppressed_recent"] += 1
         return
 
+    if len(_PRELOAD_FUTURES) > 0:
+        _collect_preloaded_sounds()
+
     if effect_path in _LOADED_EFFECTS:
         effect = _LOADED_EFFECTS[effect_path]
     else:
         try:
             effect = pygame.mixer.Sound(effect_path)
-            effect.set_volume(_MASTER_VOLUME * volume)
+            _STATS["loaded_on_demand"] += 1
         except Exception:
             print("ERROR: failed to load sound effect {}".format(effect_path))
             traceback.print_exc()
             effect = None
+            _STATS["load_failures"] += 1
         _LOADED_EFFECTS[effect_path] = effect
 
     if effect is not None:
@@ -85,6 +265,79 @@ def play_sound(sound, vol=1.0):
         # if configs.is_dev:
         #     print("INFO: playing sound effect: {}".format(effect_path))
 
-        effect.set_volume(_MASTER_VOLUME * volume)
-        effect.play()
+        if not _CHANNELS_RESERVED and not init():
+            return
+
+        category, priority = _EFFECT_INFO.get(effect_path, (None, 0))
+        channel_idx = _allocate_channel(category, priority)
+        if channel_idx is None:
+            _STATS["dropped"] += 1
+            return
+
+        _PLAY_COUNT += 1
+        channel = pygame.mixer.Channel(channel_idx)
+        channel.set_volume(_MASTER_VOLUME * volume)
+        channel.play(effect)
+        _VOICES[channel_idx] = _Voice(channel_idx, effect_path, category, priority, _PLAY_COUNT)
+        _STATS["played"] += 1
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import wave
+
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pygame.mixer.init(44100, -16, 1, 2048)
+    assert init()
+
+    # a few seconds of silence, so the voices are still busy while the test runs
+    tmp_dir = tempfile.mkdtemp()
+    test_effects = []
+    for i in range(6):
+        path = os.path.join(tmp_dir, "effect_{}.wav".format(i))
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(44100)
+            f.writeframes(b"\x00\x00" * 44100 * 5)
+        test_effects.append(path)
+
+    # preloading
+    fut = preload_sounds(test_effects + test_effects[:2])  # duplicates are only loaded once
+    fut.wait(poll_rate_secs=0.01, time_limit_secs=10)
+    update()
+    assert get_stats()["preloaded"] == len(test_effects), get_stats()
+    assert not is_preloading()
+
+    # per-category limits: equal priority steals the oldest voice
+    set_category_limit("low", 2)
+    set_category(test_effects[0:3], "low", priority=1)
+    for effect in test_effects[0:3]:
+        play_sound(effect)
+    stats = get_stats()
+    assert stats["played"] == 3 and stats["stolen"] == 1 and stats["active_voices"] == 2, stats
+
+    # lower priority effects can't cut off higher priority ones
+    set_category_limit("high", 1)
+    set_category(test_effects[3], "high", priority=5)
+    set_category(test_effects[4], "high", priority=0)
+    play_sound(test_effects[3])
+    play_sound(test_effects[4])
+    stats = get_stats()
+    assert stats["played"] == 4 and stats["dropped"] == 1, stats
+
+    # the same effect twice in a row is suppressed
+    play_sound(test_effects[5])
+    play_sound(test_effects[5])
+    stats = get_stats()
+    assert stats["played"] == 5 and stats["suppressed_recent"] == 1, stats
+
+    # nothing had to be loaded on the main thread
+    assert stats["loaded_on_demand"] == 0 and stats["load_failures"] == 0, stats
+
+    reset_stats()
+    assert get_stats()["played"] == 0
 
+    pygame.mixer.quit()
+    print("INFO: all sounds tests passed")
@@ -1,20 +1,20 @@
 
 import src.engine.globaltimer as globaltimer
+import src.engine.qualitygovernor as qualitygovernor
 
+import itertools
 import math
 import typing
 
 import src.utils.util as util
 
 
-UNIQUE_ID_CTR = 0
+_UNIQUE_ID_CTR = itertools.count()
 
 
 def gen_unique_id():
-    """Note: this ain't threadsafe"""
-    global UNIQUE_ID_CTR
-    UNIQUE_ID_CTR += 1
-    return UNIQUE_ID_CTR - 1
+    # next() on a count is atomic, so sprites can be created off the main thread (e.g. while preparing a scene)
+    return next(_UNIQUE_ID_CTR)
 
 
 class SpriteTypes:
@@ -59,6 +59,46 @@ class AbstractSprite:
         return "{}({}, {}, {})".format(type(self).__name__, self.sprite_type(), self.layer_id(), self.uid())
 
 
+class SpriteGroup:
+    """A collection of sprites that stays submitted to the RenderEngine across frames (i.e. "retained mode").
+
+        Instead of yielding its sprites every frame, the owner calls mark_changed() (or set_sprites()) whenever
+        they're modified, and only then does the engine walk them again. Groups that stop being returned by
+        Game.all_sprite_groups() are removed from the engine automatically.
+    """
+
+    def __init__(self, sprite_provider=None):
+        """
+            sprite_provider: () -> iterable of sprites. If None, the group holds whatever was passed to set_sprites().
+        """
+        self._provider = sprite_provider
+        self._sprites = []
+        self._changed = True
+
+    def set_sprites(self, sprites):
+        self._sprites = list(sprites)
+        self._changed = True
+
+    def mark_changed(self):
+        self._changed = True
+
+    def is_changed(self):
+        return self._changed
+
+    def clear_changed(self):
+        """Called by the RenderEngine after it has synced this group's sprites."""
+        self._changed = False
+
+    def all_sprites(self):
+        src = self._sprites if self._provider is None else self._provider()
+        for spr in src:
+            if spr is not None:
+                yield spr
+
+    def __repr__(self):
+        return "{}(changed={})".format(type(self).__name__, self._changed)
+
+
 class TriangleSprite(AbstractSprite):
 
     def __init__(self, layer_id, p1=(0, 0), p2=(0, 0), p3=(0, 0), color=(1, 1, 1), depth=1, uid=None):
@@ -356,18 +396,20 @@ class ImageSprite(AbstractSprite):
 _CURRENT_ATLAS_SIZE = None  # XXX this is a mega hack, just look away please
 
 
-_IMAGE_MODEL_UID_COUNTER = 0
+_IMAGE_MODEL_UID_COUNTER = itertools.count()
 
 
 def _get_next_model_uid():
-    global _IMAGE_MODEL_UID_COUNTER
-    _IMAGE_MODEL_UID_COUNTER += 1
-    return _IMAGE_MODEL_UID_COUNTER - 1
+    return next(_IMAGE_MODEL_UID_COUNTER)
 
 
 class ImageModel:
 
-    def __init__(self, x, y, w, h, offset=(0, 0), texture_size=None):
+    def __init__(self, x, y, w, h, offset=(0, 0), texture_size=None, texture_page=None):
+        """
+            texture_page: the id of the texture page this model lives on (see RenderEngine.set_texture_page),
+                or None if it's in the main sprite atlas.
+        """
         # sheet coords, origin top left corner
         self.x = x + offset[0]
         self.y = y + offset[1]
@@ -385,6 +427,8 @@ class ImageModel:
         self.tx2 = self.x + self.w
         self.ty2 = tex_size[1] - self.y
 
+        self._texture_page = texture_page
+
         self._uid = _get_next_model_uid()
         
     def rect(self):
@@ -401,6 +445,9 @@ class ImageModel:
 
     def uid(self):
         return self._uid
+
+    def get_texture_page(self):
+        return self._texture_page
         
     def __repr__(self):
         return "ImageModel({}, {}, {}, {})".format(self.x, self.y, self.w, self.h)
@@ -833,6 +880,8 @@ class TextSprite(MultiSprite):
     CENTER = 1
     RIGHT = 2
 
+    MAX_UNUSED_SPRITES = 16
+
     def __init__(self, layer_id, x, y, text, scale=1.0, depth=0, color=(1, 1, 1), color_lookup=None, font_lookup=None,
                  x_kerning=DEFAULT_X_KERNING, y_kerning=DEFAULT_Y_KERNING, alignment=LEFT,
                  outline_thickness=0, outline_color=(0, 0, 0)):
@@ -848,6 +897,7 @@ class TextSprite(MultiSprite):
         self._alignment = alignment
         self._outline_thickness = outline_thickness
         self._outline_color = outline_color
+        self._outlines_drawn = None  # whether the outline was drawn the last time the sprites were built
         self._x_kerning = x_kerning
         self._y_kerning = y_kerning
 
@@ -860,7 +910,7 @@ class TextSprite(MultiSprite):
         # this stuff is calculated by _build_character_sprites
         self._character_sprites = []
         self._bounding_rect = [0, 0, 0, 0]
-        self._unused_sprites = []  # TODO delete
+        self._unused_sprites = []  # blank sprites that can be reused, at most MAX_UNUSED_SPRITES of them
 
         self._build_character_sprites()
 
@@ -870,11 +920,25 @@ class TextSprite(MultiSprite):
     def size(self):
         return self._bounding_rect[2], self._bounding_rect[3]
 
+    def _should_draw_outlines(self):
+        # outlines multiply the number of sprites, so they're one of the first things to go. the layout still
+        # includes them though, so the text doesn't change size (or move) when they come and go.
+        return not qualitygovernor.is_reduced(qualitygovernor.Reductions.TEXT_OUTLINES)
+
+    def _get_layout(self):
+        key = (self._text, self._font_lookup, self._scale, self._x_kerning, self._y_kerning,
+               self._alignment, self._outline_thickness)
+        res = _TEXT_LAYOUT_CACHE.get(key)
+        if res is None:
+            res = _TextLayout(*key)
+            _TEXT_LAYOUT_CACHE.put(key, res)
+        return res
+
     def _build_character_sprites(self):
-        a_character = self._font_lookup.get_char("o")
-        char_size = a_character.size()
+        layout = self._get_layout()
 
-        # we're going to reuse these if possible
+        # we're going to reuse these if possible (this keeps their uids stable, so the layers can update
+        # their quads in place instead of removing and re-adding them).
         old_sprites = []
         old_sprites.extend(self._unused_sprites)
         self._unused_sprites.clear()
@@ -883,101 +947,47 @@ class TextSprite(MultiSprite):
         old_sprites.extend(self._character_sprites)
         self._character_sprites.clear()
 
-        self._bounding_rect = [self._x, self._y, 0, 0]
-
-        cur_x = self._x
-        cur_y = self._y
+        self._outlines_drawn = self._should_draw_outlines()
 
-        outline_offsets = [(0, 0)]
-        if self._outline_thickness > 0:
-            thick = self._outline_thickness
-            outline_offsets.extend([(-thick, 0), (0, -thick), (thick, 0), (0, thick)])
+        for glyph in layout.glyphs:
+            idx, char_model, dx, dy, is_outline = glyph
+            if is_outline and not self._outlines_drawn:
+                continue
+            if len(old_sprites) > 0:
+                next_sprite = old_sprites.pop()
+            else:
+                next_sprite = ImageSprite.new_sprite(self.layer_id())
 
-        for idx in range(0, len(self._text)):
-            character = self._text[idx]
-            if character == "\n":
-                cur_x = self._x
-                cur_y += math.ceil(char_size[1] * self._scale) + self._y_kerning
+            if not is_outline:
+                char_color = self._base_color if idx not in self._color_lookup else self._color_lookup[idx]
             else:
-                char_model = self._font_lookup.get_char(character)
-                if char_model is not None:
-                    for offs in outline_offsets:
-                        is_outline = offs != (0, 0)
-                        if len(old_sprites) > 0:
-                            next_sprite = old_sprites.pop()
-                        else:
-                            next_sprite = ImageSprite.new_sprite(self.layer_id())
-
-                        if not is_outline:
-                            char_color = self._base_color if idx not in self._color_lookup else self._color_lookup[idx]
-                        else:
-                            char_color = self._outline_color
-
-                        char_sprite = next_sprite.update(new_model=char_model,
-                                                         new_x=cur_x + offs[0],
-                                                         new_y=cur_y + offs[1],
-                                                         new_scale=self._scale,
-                                                         new_depth=self._depth + 0.1 * (1 if is_outline else 0),
-                                                         new_color=char_color)
-
-                        if not is_outline:
-                            base_char_sprite = char_sprite
-
-                        self._character_sprites.append(char_sprite)
-
-                    self._bounding_rect[2] = max(self._bounding_rect[2], base_char_sprite.x() + base_char_sprite.width() - self._bounding_rect[0])
-                    self._bounding_rect[3] = max(self._bounding_rect[3], base_char_sprite.y() + base_char_sprite.height() - self._bounding_rect[1])
-                    cur_x += base_char_sprite.width() + self._x_kerning
-                else:
-                    self._bounding_rect[2] = max(self._bounding_rect[2], cur_x + math.ceil(char_size[0] * self._scale) - self._bounding_rect[0])
-                    self._bounding_rect[3] = max(self._bounding_rect[3], cur_y + math.ceil(char_size[1] * self._scale) - self._bounding_rect[1])
-                    cur_x += math.ceil(char_size[0] * self._scale) + self._x_kerning
+                char_color = self._outline_color
+
+            self._character_sprites.append(next_sprite.update(new_model=char_model,
+                                                              new_x=self._x + dx,
+                                                              new_y=self._y + dy,
+                                                              new_scale=self._scale,
+                                                              new_depth=self._depth + (0.1 if is_outline else 0),
+                                                              new_color=char_color))
 
-        if self._alignment != TextSprite.LEFT:
-            self._realign_characters()
+        self._bounding_rect = [self._x, self._y, layout.size[0], layout.size[1]]
 
-        for spr in old_sprites:
+        # hang onto a few spares, in case the text gets longer again soon
+        for spr in old_sprites[-TextSprite.MAX_UNUSED_SPRITES:]:
             spr = spr.update(new_model=False, new_x=self._bounding_rect[0], new_y=self._bounding_rect[1] + 16)
             self._unused_sprites.append(spr)
 
-    def _realign_characters(self):
-        row_to_chars = {}
-        for idx, c in enumerate(self._character_sprites):
-            # Dividing up character sprites by row is a little complicated due to outline sprites
-            # having an offset from their line's 'true y'. But we can just divide and round.
-            row = round((c.y() - self.get_rect()[1]) / c.height())
-            if row not in row_to_chars:
-                row_to_chars[row] = []
-            row_to_chars[row].append((c, idx))
-
-        x_min = self._bounding_rect[0]
-        x_max = x_min + self._bounding_rect[2]
-
-        for row in row_to_chars:
-            row_to_chars[row].sort(key=lambda c_idx: c_idx[0].x())
-            line_length = row_to_chars[row][-1][0].x() + row_to_chars[row][-1][0].width() - row_to_chars[row][0][0].x()
-            if self._alignment == TextSprite.RIGHT:
-                dx = x_max - x_min - line_length
-            elif self._alignment == TextSprite.CENTER:
-                dx = (self._bounding_rect[2] - line_length) // 2
-            else:
-                dx = 0
-
-            for c, idx in row_to_chars[row]:
-                self._character_sprites[idx] = c.update(new_x=c.x() + dx)
-
     def update(self, new_x=None, new_y=None, new_text=None, new_scale=None, new_depth=None,
                new_color=None, new_color_lookup=None, new_font_lookup=None, new_alignment=None,
                new_outline_thickness=None, new_outline_color=None,
                new_x_kerning=None, new_y_kerning=None):
 
         did_change = False
+        old_xy = (self._x, self._y)
 
         if new_x is not None and new_x != self._x:
-            did_change = True
             self._x = new_x
         if new_y is not None and new_y != self._y:
-            did_change = True
             self._y = new_y
         if new_text is not None and new_text != self._text:
             did_change = True
@@ -1012,16 +1022,25 @@ class TextSprite(MultiSprite):
         if new_y_kerning is not None and new_y_kerning != self._y_kerning:
             did_change = True
             self._y_kerning = new_y_kerning
+        if self._outline_thickness > 0 and self._should_draw_outlines() != self._outlines_drawn:
+            did_change = True  # the quality level changed
 
         if did_change:
             self._build_character_sprites()
+        elif old_xy != (self._x, self._y):
+            self._translate_character_sprites(self._x - old_xy[0], self._y - old_xy[1])
 
         return self
 
+    def _translate_character_sprites(self, dx, dy):
+        for i, spr in enumerate(self._character_sprites):
+            self._character_sprites[i] = spr.update(new_x=spr.x() + dx, new_y=spr.y() + dy)
+        self._bounding_rect = [self._x, self._y, self._bounding_rect[2], self._bounding_rect[3]]
+
     def all_sprites_nullable(self):
         for spr in self._character_sprites:
             yield spr
-        for spr in self._unused_sprites:  # big yikes.. why?
+        for spr in self._unused_sprites:  # keeps their uids alive in the layers
             yield spr
 
     def __repr__(self):
@@ -1057,11 +1076,28 @@ class TextSprite(MultiSprite):
 
         using_tbs = isinstance(text, TextBuilder)
 
+        if using_tbs:
+            key = (text.text, frozenset(text.colors.items()), width, scale, font_lookup, x_kerning)
+        else:
+            key = (text, width, scale, font_lookup, x_kerning)
+
+        res = _WRAPPED_TEXT_CACHE.get(key)
+        if res is None:
+            res = TextSprite._wrap_text_to_fit(text, width, scale, font_lookup, x_kerning)
+            _WRAPPED_TEXT_CACHE.put(key, res)
+
+        # callers are allowed to mess with the results, so they get copies
+        return [tb.copy() for tb in res] if using_tbs else list(res)
+
+    @staticmethod
+    def _wrap_text_to_fit(text, width, scale, font_lookup, x_kerning):
+        using_tbs = isinstance(text, TextBuilder)
+
         if "\n" in text:
             lines = text.split("\n")
             res = []
             for line in lines:
-                for subline in TextSprite.wrap_text_to_fit(line, width, scale=scale, font_lookup=font_lookup, x_kerning=x_kerning):
+                for subline in TextSprite._wrap_text_to_fit(line, width, scale, font_lookup, x_kerning):
                     res.append(subline)
             return res
         else:
@@ -1101,6 +1137,82 @@ class TextSprite(MultiSprite):
             return res
 
 
+class _TextLayout:
+    """The positions of a block of text's glyphs, relative to its top-left corner.
+        Depends only on the text's shape (not its position or colors), so it can be shared between TextSprites.
+    """
+
+    def __init__(self, text, font_lookup, scale, x_kerning, y_kerning, alignment, outline_thickness):
+        self.glyphs = []     # list of (char_idx, model, dx, dy, is_outline)
+        self.size = (0, 0)
+
+        a_character = font_lookup.get_char("o")
+        char_size = a_character.size()
+
+        outline_offsets = [(0, 0)]
+        if outline_thickness > 0:
+            thick = outline_thickness
+            outline_offsets.extend([(-thick, 0), (0, -thick), (thick, 0), (0, thick)])
+
+        rows = []  # list of lists of glyph indices, one per line
+        cur_row = []
+
+        w, h = 0, 0
+        cur_x = 0
+        cur_y = 0
+
+        for idx in range(0, len(text)):
+            character = text[idx]
+            if character == "\n":
+                rows.append(cur_row)
+                cur_row = []
+                cur_x = 0
+                cur_y += math.ceil(char_size[1] * scale) + y_kerning
+            else:
+                char_model = font_lookup.get_char(character)
+                if char_model is not None:
+                    for offs in outline_offsets:
+                        cur_row.append(len(self.glyphs))
+                        self.glyphs.append((idx, char_model, cur_x + offs[0], cur_y + offs[1], offs != (0, 0)))
+
+                    char_w = char_model.width() * scale
+                    char_h = char_model.height() * scale
+                    w = max(w, cur_x + char_w)
+                    h = max(h, cur_y + char_h)
+                    cur_x += char_w + x_kerning
+                else:
+                    w = max(w, cur_x + math.ceil(char_size[0] * scale))
+                    h = max(h, cur_y + math.ceil(char_size[1] * scale))
+                    cur_x += math.ceil(char_size[0] * scale) + x_kerning
+        rows.append(cur_row)
+
+        self.size = (w, h)
+
+        if alignment != TextSprite.LEFT:
+            for row in rows:
+                if len(row) == 0:
+                    continue
+                # outlines count towards the line's length
+                row_x_min = min(self.glyphs[i][2] for i in row)
+                row_x_max = max(self.glyphs[i][2] + self.glyphs[i][1].width() * scale for i in row)
+                line_length = row_x_max - row_x_min
+                if alignment == TextSprite.RIGHT:
+                    dx = w - line_length
+                elif alignment == TextSprite.CENTER:
+                    dx = (w - line_length) // 2
+                else:
+                    dx = 0
+                for i in row:
+                    idx, char_model, x, y, is_outline = self.glyphs[i]
+                    self.glyphs[i] = (idx, char_model, x + dx, y, is_outline)
+
+        self.glyphs = tuple(self.glyphs)
+
+
+_TEXT_LAYOUT_CACHE = util.LRUCache(512)   # (text, font, scale, kerning, alignment, outline) -> _TextLayout
+_WRAPPED_TEXT_CACHE = util.LRUCache(512)  # (text, width, scale, font, kerning) -> list of lines
+
+
 class TextBuilder:
 
     def __init__(self, text="", colors=None):
@@ -2,8 +2,10 @@ import pygame
 import traceback
 
 import src.engine.sprites as sprites
+import src.engine.renderengine as renderengine
 import src.utils.util as util
 import src.utils.artutils as artutils
+import src.utils.threadutils as threadutils
 
 
 class SpriteSheet:
@@ -218,6 +220,67 @@ class SingleImageSheet(SpriteSheet):
         self._img = sprites.ImageModel(0, 0, sheet.get_width(), sheet.get_height(), offset=start_pos)
 
 
+class StreamedImageLoader:
+    """
+        Loads big standalone images on demand into their own texture pages, instead of packing them into the atlas.
+        Decoding happens on a background thread, and the upload happens on the main thread the first time the
+        image is requested after it's decoded. Each image's filepath is used as its page id.
+    """
+
+    def __init__(self):
+        self._pending = {}  # filepath -> Future (of Surface, or None if it failed to load)
+        self._models = {}   # filepath -> ImageModel, or None if it failed to load
+
+    def prefetch(self, filepath):
+        if filepath not in self._models and filepath not in self._pending:
+            self._pending[filepath] = threadutils.do_decode_work_on_background_thread(
+                lambda: StreamedImageLoader._load(filepath))
+
+    @staticmethod
+    def _load(filepath):
+        resource_path = util.resource_path(filepath)
+        try:
+            return pygame.image.load(resource_path)
+        except Exception:
+            print("ERROR: failed to load streamed image from path: {}".format(resource_path))
+            traceback.print_exc()
+            return None
+
+    def is_loading(self, filepath):
+        return filepath in self._pending
+
+    def get_img(self, filepath) -> sprites.ImageModel:
+        """returns: the image's model, or None if it's still loading (or failed to load)."""
+        if filepath in self._models:
+            return self._models[filepath]
+
+        self.prefetch(filepath)
+        fut = self._pending[filepath]
+        if not fut.is_done():
+            return None
+
+        del self._pending[filepath]
+        surface = fut.get_val()
+        if surface is not None:
+            renderengine.get_instance().set_texture_page(filepath, surface)
+            size = surface.get_size()
+            self._models[filepath] = sprites.ImageModel(0, 0, size[0], size[1],
+                                                        texture_size=size, texture_page=filepath)
+        else:
+            self._models[filepath] = None  # don't keep retrying
+
+        return self._models[filepath]
+
+    def evict_all_except(self, keep=()):
+        """Unloads every image (and cancels every pending load) that isn't in keep."""
+        for filepath in [f for f in self._models if f not in keep]:
+            del self._models[filepath]
+            renderengine.get_instance().remove_texture_page(filepath)
+        for filepath in [f for f in self._pending if f not in keep]:
+            self._pending[filepath].cancel()  # if it's already decoding, it'll still finish, but it gets dropped
+            del self._pending[filepath]
+
+
 _SINGLETON = None
 
 
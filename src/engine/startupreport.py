@@ -0,0 +1,109 @@
+import contextlib
+import json
+import os
+import time
+import traceback
+
+"""
+A timeline of the game's startup (imports, window creation, atlas building, etc.), measured from the moment this
+module is first imported. Import it as early as possible, wrap each step in phase(), and call first_frame_shown()
+once the first frame has been flipped to the screen.
+"""
+
+_START_TIME = time.perf_counter()
+
+_PHASES = []  # list of [name, start_secs, end_secs, depth], in the order they started
+_DEPTH = 0
+
+_FIRST_FRAME_TIME = None
+_REPORT_PATH = None  # if set, the report gets written here
+
+
+def set_report_path(path):
+    """path: where to write the JSON report, or None to skip it."""
+    global _REPORT_PATH
+    _REPORT_PATH = path
+
+
+def get_report_path():
+    return _REPORT_PATH
+
+
+def _now():
+    return time.perf_counter() - _START_TIME
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Records how long the enclosed block takes. Phases can be nested."""
+    global _DEPTH
+    entry = [name, _now(), None, _DEPTH]
+    _PHASES.append(entry)
+    _DEPTH += 1
+    try:
+        yield
+    finally:
+        _DEPTH -= 1
+        entry[2] = _now()
+
+
+def first_frame_shown():
+    """Marks the end of startup. Only the first call does anything."""
+    global _FIRST_FRAME_TIME
+    if _FIRST_FRAME_TIME is not None:
+        return
+    _FIRST_FRAME_TIME = _now()
+
+    if _REPORT_PATH is not None:
+        print_summary()
+        write_report(_REPORT_PATH)
+
+
+def get_time_to_first_frame():
+    """returns: secs from startup to the first frame, or None if it hasn't been shown yet."""
+    return _FIRST_FRAME_TIME
+
+
+def get_timeline():
+    res = []
+    for name, start, end, depth in _PHASES:
+        res.append({
+            "name": name,
+            "start_ms": round(start * 1000, 2),
+            "duration_ms": None if end is None else round((end - start) * 1000, 2),
+            "depth": depth,
+            "after_first_frame": _FIRST_FRAME_TIME is not None and start >= _FIRST_FRAME_TIME
+        })
+    return res
+
+
+def print_summary():
+    print("INFO: startup timeline:")
+    for item in get_timeline():
+        dur = "..." if item["duration_ms"] is None else "{:.1f}ms".format(item["duration_ms"])
+        print("INFO:   {}{} {} (at {:.1f}ms)".format("  " * item["depth"], item["name"], dur, item["start_ms"]))
+    if _FIRST_FRAME_TIME is not None:
+        print("INFO:   first frame shown at {:.1f}ms".format(_FIRST_FRAME_TIME * 1000))
+
+
+def write_report(path, extra_info=None):
+    """Writes the timeline to a JSON file. Phases that happen after the first frame (e.g. loading the levels when the
+        player first hits "start") are included too, if the report is written again later.
+    """
+    blob = {
+        "first_frame_ms": None if _FIRST_FRAME_TIME is None else round(_FIRST_FRAME_TIME * 1000, 2),
+        "phases": get_timeline()
+    }
+    if extra_info is not None:
+        blob.update(extra_info)
+
+    try:
+        directory = os.path.dirname(path)
+        if directory != "" and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, "w") as f:
+            json.dump(blob, f, indent=2)
+        print("INFO: wrote startup report to {}".format(path))
+    except Exception:
+        print("ERROR: failed to write startup report to {}".format(path))
+        traceback.print_exc()
@@ -2,6 +2,10 @@ from OpenGL.GL import *
 
 import numpy
 import math
+import os
+import hashlib
+import struct
+import traceback
 
 import src.engine.layers as layers
 import src.engine.sprites as sprites
@@ -47,19 +51,35 @@ class Camera3D:
 
 class ThreeDeeLayer(layers.ImageLayer):
 
+    # models with at least this many sprites get merged into a single draw call (see _get_batch).
+    MIN_BATCH_SIZE = 2
+
     def __init__(self, layer_id, layer_z):
         super().__init__(layer_id, layer_z, sort_sprites=False, use_color=False)
         self.camera = Camera3D()
 
+        # model_id -> (list of Sprite3D, camera_pos, vertices, tex_coords, indices)
+        # the sprites are kept around so that their ids can't get reused while they're in here.
+        self._batches = {}
+
     def set_camera(self, cam):
         self.camera = cam.get_snapshot()
 
+    def get_render_key(self):
+        if len(self) > 0:
+            return object()  # the camera is usually moving, so don't bother trying to skip frames
+        else:
+            return super().get_render_key()
+
     def accepts_sprite_type(self, sprite_type):
         return sprite_type == sprites.SpriteTypes.THREE_DEE
 
     def populate_data_arrays(self, sprite_info_lookup):
         pass  # we don't actually use these
 
+    def populate_data_arrays_at(self, sprite_ids, sprite_info_lookup):
+        pass
+
     def get_sprites_grouped_by_model_id(self, engine):
         res = {}  # model_id -> list of Sprite3D
         for sprite_id in self.images:
@@ -78,16 +98,59 @@ class ThreeDeeLayer(layers.ImageLayer):
 
         model_ids_to_sprites = self.get_sprites_grouped_by_model_id(engine)
         for model_id in model_ids_to_sprites:
-            # only pass model data (vertices, tex_coords, indices) once per unique model in the scene
-            model = model_ids_to_sprites[model_id][0].model()
-            self._pass_attributes_for_model(engine, model)
-
-            # draw each sprite with that model, using the same data data, but different uniforms
-            for spr_3d in model_ids_to_sprites[model_id]:
-                self._set_uniforms_for_sprite(engine, spr_3d)
-                glDrawElements(GL_TRIANGLES, len(self.indices), GL_UNSIGNED_INT, self.indices)
+            sprite_list = model_ids_to_sprites[model_id]
+            if len(sprite_list) >= ThreeDeeLayer.MIN_BATCH_SIZE:
+                # bake all the sprites' transforms into one big mesh and draw it in one go
+                vertices, tex_coords, indices = self._get_batch(model_id, sprite_list)
+                engine.set_model_matrix(numpy.identity(4, dtype=numpy.float32))
+                engine.set_vertices(vertices)
+                engine.set_texture_coords(tex_coords)
+                glDrawElements(GL_TRIANGLES, len(indices), GL_UNSIGNED_INT, indices)
+            else:
+                model = sprite_list[0].model()
+                self._pass_attributes_for_model(engine, model)
+                indices = model.get_index_array()
+                for spr_3d in sprite_list:
+                    self._set_uniforms_for_sprite(engine, spr_3d)
+                    glDrawElements(GL_TRIANGLES, len(indices), GL_UNSIGNED_INT, indices)
+
+        for model_id in [m_id for m_id in self._batches if m_id not in model_ids_to_sprites]:
+            del self._batches[model_id]
+
         self.set_client_states(False, engine)
 
+    def _get_batch(self, model_id, sprite_list):
+        """returns: (vertices, tex_coords, indices) with every sprite's model transform already applied.
+            The result is reused until a sprite changes (or, for billboards, the camera moves).
+        """
+        camera_pos = self.camera.get_position()
+        if model_id in self._batches:
+            old_sprites, old_camera_pos, vertices, tex_coords, indices = self._batches[model_id]
+            if (len(old_sprites) == len(sprite_list)
+                    and all(s1 is s2 for s1, s2 in zip(old_sprites, sprite_list))
+                    and (old_camera_pos == camera_pos
+                         or all(not spr.xform_depends_on_camera() for spr in sprite_list))):
+                return vertices, tex_coords, indices
+
+        model = sprite_list[0].model()
+        n_verts = len(model.get_vertex_array())
+
+        xforms = numpy.array([spr.get_xform(camera_pos=camera_pos) for spr in sprite_list], dtype=numpy.float32)
+        raw_verts = numpy.ones((n_verts, 4), dtype=numpy.float32)
+        raw_verts[:, 0:3] = model.get_vertex_array()
+
+        # (k, 4, 4) x (n, 4) -> (k, n, 4), i.e. every vertex of every instance
+        vertices = numpy.einsum('kij,nj->kni', xforms, raw_verts)[:, :, 0:3]
+        vertices = numpy.ascontiguousarray(vertices, dtype=numpy.float32).reshape(-1)
+
+        tex_coords = numpy.tile(model.get_texture_coord_array().reshape(-1), len(sprite_list))
+
+        offsets = numpy.arange(len(sprite_list), dtype=numpy.uint32) * n_verts
+        indices = (model.get_index_array()[numpy.newaxis, :] + offsets[:, numpy.newaxis]).reshape(-1)
+
+        self._batches[model_id] = (list(sprite_list), camera_pos, vertices, tex_coords, indices)
+        return vertices, tex_coords, indices
+
     def set_client_states(self, enable, engine):
         super().set_client_states(enable, engine)
 
@@ -132,16 +195,8 @@ class ThreeDeeLayer(layers.ImageLayer):
         engine.set_model_matrix(model)
 
     def _pass_attributes_for_model(self, engine, model_3d):
-        self.vertices.resize(3 * len(model_3d.get_vertices()), refcheck=False)
-        self.tex_coords.resize(2 * len(model_3d.get_texture_coords()), refcheck=False)
-        self.indices.resize(len(model_3d.get_indices()), refcheck=False)
-
-        model_3d.add_urself(self.vertices,
-                            self.tex_coords,
-                            self.indices)
-
-        engine.set_vertices(self.vertices)
-        engine.set_texture_coords(self.tex_coords)
+        engine.set_vertices(model_3d.get_vertex_array())
+        engine.set_texture_coords(model_3d.get_texture_coord_array())
 
 
 class Sprite3D(sprites.AbstractSprite):
@@ -156,10 +211,22 @@ class Sprite3D(sprites.AbstractSprite):
 
         self._color = color  # not used currently
 
+        self._cached_xform = None  # (camera_pos, matrix), sprites are immutable so this never goes stale otherwise
+
     def model(self) -> 'ThreeDeeModel':
         return self._model
 
+    def xform_depends_on_camera(self):
+        return False
+
     def get_xform(self, camera_pos=(0, 0, 0)):
+        """returns: the model matrix for this sprite. Don't modify it, it's cached."""
+        cache_key = tuple(camera_pos) if self.xform_depends_on_camera() else None
+        if self._cached_xform is None or self._cached_xform[0] != cache_key:
+            self._cached_xform = (cache_key, self._calc_xform(camera_pos))
+        return self._cached_xform[1]
+
+    def _calc_xform(self, camera_pos):
         pos = self.position()
         scale = self.scale()
 
@@ -287,6 +354,9 @@ class BillboardSprite3D(Sprite3D):
         self._horz_billboard = horz_billboard
         self._vert_billboard = vert_billboard
 
+    def xform_depends_on_camera(self):
+        return True
+
     def get_effective_rotation(self, camera_pos=(0, 0, 0)):
         towards_camera = util.set_length(util.sub(camera_pos, self.position()), 1)
         rot_to_camera = matutils.get_xyz_rot_to_face_direction(towards_camera,
@@ -334,10 +404,10 @@ class ThreeDeeModel:
     def __init__(self, model_id, vertices, normals, native_texture_coords, indices, map_from_texture_to_atlas=lambda xy: xy):
         """
         :param model_id: str
-        :param vertices: list of (x, y, z)
-        :param normals: list of (x, y, z)
-        :param native_texture_coords: list of (x, y)
-        :param indices: list of ints, one for each corner of each triangle
+        :param vertices: list (or array) of (x, y, z)
+        :param normals: list (or array) of (x, y, z)
+        :param native_texture_coords: list (or array) of (x, y)
+        :param indices: list (or array) of ints, one for each corner of each triangle
         :param map_from_texture_to_atlas: converts points from native_texture_coords to actual atlas coordinates
         """
         self._model_id = model_id
@@ -350,6 +420,11 @@ class ThreeDeeModel:
         self._map_from_texture_to_atlas = map_from_texture_to_atlas
         self._cached_atlas_coords = []  # list of (x, y)
 
+        # the geometry never changes, so it's only converted into arrays once.
+        self._vertex_array = None     # float32 array of shape (n, 3)
+        self._tex_coord_array = None  # float32 array of shape (n, 2), in atlas coords
+        self._index_array = None      # uint32 array
+
     def get_model_id(self):
         return self._model_id
 
@@ -367,77 +442,60 @@ class ThreeDeeModel:
             self._cached_atlas_coords = [self._map_from_texture_to_atlas(xy) for xy in self._native_texture_coords]
         return self._cached_atlas_coords
 
+    def get_vertex_array(self) -> numpy.ndarray:
+        if self._vertex_array is None:
+            self._vertex_array = numpy.array(self.get_vertices(), dtype=numpy.float32).reshape(-1, 3)
+        return self._vertex_array
+
+    def get_texture_coord_array(self) -> numpy.ndarray:
+        # (lazy because the atlas might not exist yet when the model is loaded)
+        if self._tex_coord_array is None:
+            self._tex_coord_array = numpy.array(self.get_texture_coords(), dtype=numpy.float32).reshape(-1, 2)
+        return self._tex_coord_array
+
+    def get_index_array(self) -> numpy.ndarray:
+        if self._index_array is None:
+            self._index_array = numpy.array(self.get_indices(), dtype=numpy.uint32)
+        return self._index_array
+
     def add_urself(self, vertices, tex_coords, indices):
-        for i in range(0, 3 * len(self.get_vertices())):
-            vertices[i] = self.get_vertices()[i // 3][i % 3]
-        for i in range(0, 2 * len(self.get_texture_coords())):
-            tex_coords[i] = self.get_texture_coords()[i // 2][i % 2]
-        for i in range(0, len(self.get_indices())):
-            indices[i] = self.get_indices()[i]
+        vertices[0:3 * len(self.get_vertices())] = self.get_vertex_array().reshape(-1)
+        tex_coords[0:2 * len(self.get_texture_coords())] = self.get_texture_coord_array().reshape(-1)
+        indices[0:len(self.get_indices())] = self.get_index_array()
 
     @staticmethod
-    def load_from_disk(model_id, model_path, map_from_texture_to_atlas):
+    def load_from_disk(model_id, model_path, map_from_texture_to_atlas, cache_dir=None):
+        """
+        :param cache_dir: directory for binary copies of parsed models. If None, the .obj is always parsed.
+        """
         try:
-            raw_vertices = []
-            raw_normals = []
-            raw_native_texture_coords = []
-            triangle_faces = []
-
             safe_path = util.resource_path(model_path)
-            with open(safe_path) as f:
-                for line in f:
-                    line = line.rstrip()  # remove trailing newlines and whitespace
-                    if line.startswith("v "):
-                        xyz = line[2:].split(" ")
-                        vertex = (float(xyz[0]), float(xyz[1]), float(xyz[2]))
-                        raw_vertices.append(vertex)
-
-                    elif line.startswith("vn "):
-                        xyz = line[3:].split(" ")
-                        normal_vec = (float(xyz[0]), float(xyz[1]), float(xyz[2]))
-                        raw_normals.append(normal_vec)
-
-                    elif line.startswith("vt "):
-                        xy = line[3:].split(" ")
-                        texture_coords = (float(xy[0]), float(xy[1]))
-                        raw_native_texture_coords.append(texture_coords)
-
-                    elif line.startswith("f "):
-                        corners = []
-                        for corner in line[2:].split(" "):
-                            vtn = corner.split("/")  # vertex, texture, normal
-                            vertex_idx = int(vtn[0]) - 1
-                            texture_idx = int(vtn[1]) - 1 if len(vtn) > 1 and len(vtn[1]) > 0 else -1
-                            normal_idx = int(vtn[2]) - 1 if len(vtn) > 2 and len(vtn[2]) > 0 else -1
-                            corners.append((vertex_idx, texture_idx, normal_idx))
-                        triangle_faces.append(tuple(corners))
-
-            vertices = []
-            native_texture_coords = []
-            normals = []
-            indices = []
-
-            for tri in triangle_faces:
-                for c in tri:  # TODO use the normals
-                    v_idx, t_idx, norm_idx = c
-                    vertex_xyz = raw_vertices[v_idx]
-                    texture_xy = raw_native_texture_coords[t_idx] if t_idx >= 0 else None
-                    norm_xyz = raw_normals[norm_idx] if norm_idx >= 0 else None
-                    # TODO can probably condense this a bit (only have one index per unique (vertex, texture, normal))
-                    # TODO would that ever matter for most models? probably not?
-                    index = len(indices)
-
-                    vertices.append(vertex_xyz)
-                    native_texture_coords.append(texture_xy)
-                    normals.append(norm_xyz)
-                    indices.append(index)
-            print("INFO: loaded model ({} faces): {}".format(len(triangle_faces), model_path))
-            return ThreeDeeModel(model_id, vertices, normals, native_texture_coords, indices,
-                                 map_from_texture_to_atlas=map_from_texture_to_atlas)
+            with open(safe_path, "rb") as f:
+                raw_bytes = f.read()
         except IOError:
             print("ERROR: failed to load model: {}".format(model_path))
             return None
 
+        source_hash = hashlib.sha1(raw_bytes).digest()
+        cache_path = None if cache_dir is None else os.path.join(cache_dir, os.path.basename(model_path) + ".bin")
+
+        mesh = None
+        if cache_path is not None and os.path.exists(cache_path):
+            mesh = _read_mesh_cache(cache_path, source_hash)
+
+        if mesh is None:
+            mesh = _parse_obj(raw_bytes.decode("utf-8"))
+            print("INFO: loaded model ({} faces, {} unique vertices): {}".format(
+                mesh.n_faces, len(mesh.vertices), model_path))
+            if cache_path is not None:
+                _write_mesh_cache(cache_path, source_hash, mesh)
+        else:
+            print("INFO: loaded model ({} faces, {} unique vertices) from cache: {}".format(
+                mesh.n_faces, len(mesh.vertices), model_path))
+
+        return ThreeDeeModel(model_id, mesh.vertices, mesh.normals, mesh.texture_coords, mesh.indices,
+                             map_from_texture_to_atlas=map_from_texture_to_atlas)
+
     @staticmethod
     def build_from_2d_model(model_2d: sprites.ImageModel) -> 'ThreeDeeModel':
         vertices = [(-1, -1, 0), (1, 1, 0), (-1, 1, 0), (-1, -1, 0), (1, -1, 0), (1, 1, 0)]
@@ -448,3 +506,118 @@ class ThreeDeeModel:
 
         return ThreeDeeModel("2d_sprite_" + str(model_2d.uid()), vertices, normals, native_texture_coords, indices)
 
+
+class _Mesh:
+    """An indexed triangle mesh, where each vertex is a unique (position, texture coord, normal)."""
+
+    def __init__(self, vertices, texture_coords, normals, indices, n_faces):
+        self.vertices = vertices              # float32 array of shape (n, 3)
+        self.texture_coords = texture_coords  # float32 array of shape (n, 2), nan where the .obj didn't specify one
+        self.normals = normals                # float32 array of shape (n, 3), same deal
+        self.indices = indices                # uint16 or uint32 array, one for each corner of each triangle
+        self.n_faces = n_faces
+
+
+def _parse_obj(text) -> _Mesh:
+    raw_vertices = []
+    raw_normals = []
+    raw_native_texture_coords = []
+
+    # exporters tend to write out the same values under different indices, so corners are compared by value.
+    corner_to_idx = {}  # (xyz, texture xy, normal xyz) -> index of the vertex in the mesh
+    unique_corners = []
+    indices = []
+    n_faces = 0
+
+    for line in text.splitlines():
+        line = line.rstrip()  # remove trailing whitespace
+        if line.startswith("v "):
+            xyz = line[2:].split(" ")
+            raw_vertices.append((float(xyz[0]), float(xyz[1]), float(xyz[2])))
+
+        elif line.startswith("vn "):
+            xyz = line[3:].split(" ")
+            raw_normals.append((float(xyz[0]), float(xyz[1]), float(xyz[2])))
+
+        elif line.startswith("vt "):
+            xy = line[3:].split(" ")
+            raw_native_texture_coords.append((float(xy[0]), float(xy[1])))
+
+        elif line.startswith("f "):
+            n_faces += 1
+            for corner in line[2:].split(" "):
+                vtn = corner.split("/")  # vertex, texture, normal
+                vertex_idx = int(vtn[0]) - 1
+                texture_idx = int(vtn[1]) - 1 if len(vtn) > 1 and len(vtn[1]) > 0 else -1
+                normal_idx = int(vtn[2]) - 1 if len(vtn) > 2 and len(vtn[2]) > 0 else -1
+
+                key = (raw_vertices[vertex_idx],
+                       raw_native_texture_coords[texture_idx] if texture_idx >= 0 else None,
+                       raw_normals[normal_idx] if normal_idx >= 0 else None)
+                if key not in corner_to_idx:
+                    corner_to_idx[key] = len(unique_corners)
+                    unique_corners.append(key)
+                indices.append(corner_to_idx[key])
+
+    def _to_array(values, n_components):
+        missing = (float("nan"),) * n_components
+        return numpy.array([v if v is not None else missing for v in values],
+                           dtype=numpy.float32).reshape(-1, n_components)
+
+    vertices = _to_array([c[0] for c in unique_corners], 3)
+    texture_coords = _to_array([c[1] for c in unique_corners], 2)
+    normals = _to_array([c[2] for c in unique_corners], 3)
+
+    index_type = numpy.uint16 if len(unique_corners) <= 0xFFFF else numpy.uint32
+    return _Mesh(vertices, texture_coords, normals, numpy.array(indices, dtype=index_type), n_faces)
+
+
+_MESH_CACHE_MAGIC = b"M3DC"
+_MESH_CACHE_VERSION = 1
+_MESH_CACHE_HEADER = struct.Struct("<4sI20sIIII")  # magic, version, source hash, n_verts, n_indices, index size, n_faces
+
+
+def _read_mesh_cache(cache_path, source_hash) -> _Mesh:
+    """returns: the cached mesh, or None if it's missing, corrupt, or out of date."""
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+
+        magic, version, cached_hash, n_verts, n_indices, index_size, n_faces = _MESH_CACHE_HEADER.unpack_from(data)
+        if magic != _MESH_CACHE_MAGIC or version != _MESH_CACHE_VERSION or cached_hash != source_hash:
+            return None
+
+        offs = _MESH_CACHE_HEADER.size
+        vertices = numpy.frombuffer(data, dtype=numpy.float32, count=n_verts * 3, offset=offs).reshape(-1, 3)
+        offs += vertices.nbytes
+        texture_coords = numpy.frombuffer(data, dtype=numpy.float32, count=n_verts * 2, offset=offs).reshape(-1, 2)
+        offs += texture_coords.nbytes
+        normals = numpy.frombuffer(data, dtype=numpy.float32, count=n_verts * 3, offset=offs).reshape(-1, 3)
+        offs += normals.nbytes
+        index_type = numpy.uint16 if index_size == 2 else numpy.uint32
+        indices = numpy.frombuffer(data, dtype=index_type, count=n_indices, offset=offs)
+
+        return _Mesh(vertices, texture_coords, normals, indices, n_faces)
+    except Exception:
+        print("WARN: failed to read model cache: {}".format(cache_path))
+        traceback.print_exc()
+        return None
+
+
+def _write_mesh_cache(cache_path, source_hash, mesh: _Mesh):
+    try:
+        directory = os.path.dirname(cache_path)
+        if directory != "" and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        temp_path = cache_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(_MESH_CACHE_HEADER.pack(_MESH_CACHE_MAGIC, _MESH_CACHE_VERSION, source_hash,
+                                            len(mesh.vertices), len(mesh.indices), mesh.indices.itemsize,
+                                            mesh.n_faces))
+            for arr in (mesh.vertices, mesh.texture_coords, mesh.normals, mesh.indices):
+                f.write(arr.tobytes())
+        os.replace(temp_path, cache_path)
+    except Exception:
+        print("WARN: failed to write model cache: {}".format(cache_path))
+        traceback.print_exc()
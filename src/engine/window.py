@@ -65,6 +65,9 @@ class WindowState:
 
         self._opengl_mode: bool = opengl_mode
 
+        self._has_focus = True
+        self._is_visible = True  # False while the window is minimized or hidden
+
     def _get_mods(self):
         mods = 0
         if self._opengl_mode:
@@ -85,6 +88,10 @@ class WindowState:
         self._update_caption()
         self._update_icon()
 
+        if self._opengl_mode:
+            # sprites' depths are only ~1e-6 apart in z, which a 16-bit depth buffer can't resolve.
+            pygame.display.gl_set_attribute(pygame.GL_DEPTH_SIZE, 24)
+
         if self._is_fullscreen:
             new_surface = pygame.display.set_mode((0, 0), self._get_mods())
             self._fullscreen_size = new_surface.get_size()
@@ -198,6 +205,18 @@ class WindowState:
     def is_opengl_mode(self):
         return self._opengl_mode
 
+    def has_focus(self):
+        return self._has_focus
+
+    def set_has_focus(self, val):
+        self._has_focus = val
+
+    def is_visible(self):
+        return self._is_visible
+
+    def set_visible(self, val):
+        self._is_visible = val
+
     def window_to_screen_pos(self, pos):
         if pos is None:
             return None
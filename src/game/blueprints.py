@@ -106,16 +106,27 @@ class SpecType:
     def build_entities(self, json_blob) -> typing.Iterable[entities.Entity]:
         raise NotImplementedError()
 
-    def build(self, json_blob, world) -> None:
+    def build(self, json_blob, world) -> typing.List[entities.Entity]:
+        """returns: the (top-level) entities that were added to the world."""
         blob_copy = json_blob.copy()
         for key in self.optional_keys:
             if key not in blob_copy:
                 blob_copy[key] = self.optional_keys[key]
 
-        for ent in self.build_entities(blob_copy):
-            if ent is not None:
-                world.add_entity(ent, next_update=False)
-                ent._spec = json_blob.copy()  # XXX but helpful for the level editor
+        res = []
+        try:
+            for ent in self.build_entities(blob_copy):
+                if ent is not None:
+                    world.add_entity(ent, next_update=False)
+                    ent._spec = json_blob.copy()  # XXX but helpful for the level editor
+                    res.append(ent)
+        except Exception:
+            # don't leave half of the spec in the world, nothing would know to remove it
+            for ent in res:
+                if ent.get_world() is world:
+                    world.remove_entity(ent, next_update=False)
+            raise
+        return res
 
     def get_default_value(self, k):
         if k in self.optional_keys:
@@ -991,36 +1002,7 @@ class LevelBlueprint:
                 print("ERROR: failed to build blob: {}".format(blob))
                 traceback.print_exc()
 
-        camera_bound_rects = {}  # camera id -> rect
-
-        min_xy_with_data = [None, None]
-        max_xy_with_data = [None, None]
-        for ent in world.all_entities(types=(entities.AbstractBlockEntity, entities.CameraBoundMarker)):
-            if ent.is_block():
-                min_xy_with_data[0] = min(min_xy_with_data[0] if min_xy_with_data[0] is not None else float('inf'), ent.get_rect()[0])
-                max_xy_with_data[0] = max(max_xy_with_data[0] if max_xy_with_data[0] is not None else -float('inf'), ent.get_rect()[0] + ent.get_rect()[2])
-                min_xy_with_data[1] = min(min_xy_with_data[1] if min_xy_with_data[1] is not None else float('inf'), ent.get_rect()[1])
-                max_xy_with_data[1] = max(max_xy_with_data[1] if max_xy_with_data[1] is not None else -float('inf'), ent.get_rect()[1] + ent.get_rect()[3])
-
-            if ent.is_camera_bound_marker():
-                if ent.get_idx() in camera_bound_rects:
-                    camera_bound_rects[ent.get_idx()] = util.rect_union([camera_bound_rects[ent.get_idx()], ent.get_rect()])
-                else:
-                    camera_bound_rects[ent.get_idx()] = ent.get_rect()
-
-        safe_zones = []
-        if len(camera_bound_rects) > 0:
-            # if you're in a camera bound, that's safe.
-            for idx in camera_bound_rects:
-                safe_zones.append(camera_bound_rects[idx])
-        elif max_xy_with_data[0] is not None:
-            # if there are no camera bounds, assume the blocks define the shape of the level.
-            safe_zones.append([min_xy_with_data[0],
-                               min_xy_with_data[1],
-                               max_xy_with_data[0] - min_xy_with_data[0],
-                               max_xy_with_data[1] - min_xy_with_data[1]])
-
-        world.set_safe_zones(safe_zones)
+        world.set_safe_zones(calc_safe_zones(world))
 
         return world
 
@@ -1036,6 +1018,58 @@ class LevelBlueprint:
         return "{}:{}".format(type(self).__name__, self.name())
 
 
+def build_spec_into_world(blob, world) -> typing.List[entities.Entity]:
+    """Builds a single entity spec into an existing world (like LevelBlueprint.create_world does for every spec).
+        returns: the (top-level) entities that were added, or an empty list if the spec is invalid.
+    """
+    try:
+        spec_type = SpecTypes.get(blob[TYPE_ID])
+        spec_type.check_if_valid(blob)
+    except Exception:
+        print("ERROR: failed to build blob: {}".format(blob))
+        traceback.print_exc()
+        return []
+    try:
+        return spec_type.build(blob, world)
+    except Exception:
+        print("ERROR: failed to build blob: {}".format(blob))
+        traceback.print_exc()
+        return []
+
+
+def calc_safe_zones(world):
+    camera_bound_rects = {}  # camera id -> rect
+
+    min_xy_with_data = [None, None]
+    max_xy_with_data = [None, None]
+    for ent in world.all_entities(types=(entities.AbstractBlockEntity, entities.CameraBoundMarker)):
+        if ent.is_block():
+            min_xy_with_data[0] = min(min_xy_with_data[0] if min_xy_with_data[0] is not None else float('inf'), ent.get_rect()[0])
+            max_xy_with_data[0] = max(max_xy_with_data[0] if max_xy_with_data[0] is not None else -float('inf'), ent.get_rect()[0] + ent.get_rect()[2])
+            min_xy_with_data[1] = min(min_xy_with_data[1] if min_xy_with_data[1] is not None else float('inf'), ent.get_rect()[1])
+            max_xy_with_data[1] = max(max_xy_with_data[1] if max_xy_with_data[1] is not None else -float('inf'), ent.get_rect()[1] + ent.get_rect()[3])
+
+        if ent.is_camera_bound_marker():
+            if ent.get_idx() in camera_bound_rects:
+                camera_bound_rects[ent.get_idx()] = util.rect_union([camera_bound_rects[ent.get_idx()], ent.get_rect()])
+            else:
+                camera_bound_rects[ent.get_idx()] = ent.get_rect()
+
+    safe_zones = []
+    if len(camera_bound_rects) > 0:
+        # if you're in a camera bound, that's safe.
+        for idx in camera_bound_rects:
+            safe_zones.append(camera_bound_rects[idx])
+    elif max_xy_with_data[0] is not None:
+        # if there are no camera bounds, assume the blocks define the shape of the level.
+        safe_zones.append([min_xy_with_data[0],
+                           min_xy_with_data[1],
+                           max_xy_with_data[0] - min_xy_with_data[0],
+                           max_xy_with_data[1] - min_xy_with_data[1]])
+
+    return safe_zones
+
+
 def load_level_from_file(filepath) -> LevelBlueprint:
     try:
         json_blob = util.load_json_from_path(filepath)
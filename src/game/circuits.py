@@ -10,10 +10,10 @@ import src.engine.layers as layers
 import src.engine.threedee as threedee
 import src.engine.keybinds as keybinds
 import src.engine.inputs as inputs
-import src.engine.readme_writer as readme_writer
 import src.engine.cursors as cursors
 import src.engine.scenes as scenes
 import src.engine.globaltimer as globaltimer
+import src.engine.startupreport as startupreport
 import src.engine.window as window
 import src.engine.renderengine as renderengine
 import src.utils.util as util
@@ -22,6 +22,7 @@ import src.game.globalstate as gs
 import src.game.const as const
 import src.game.menus as menus
 import src.game.songsystem as songsystem
+import src.game.soundref as soundref
 
 import src.game.spriteref as spriteref
 
@@ -35,10 +36,14 @@ class CircuitsGame(game.Game):
 
     def initialize(self):
         if configs.is_dev:
-            _update_readme()
+            with startupreport.phase("readme update"):
+                _update_readme()
 
         util.set_info_for_user_data_path(configs.userdata_subdir, "Ghast")
 
+        with startupreport.phase("sounds"):
+            soundref.initialize_sounds()
+
         keybinds.get_instance().set_binding(const.MOVE_LEFT, [pygame.K_LEFT, pygame.K_a])
         keybinds.get_instance().set_binding(const.MOVE_RIGHT, [pygame.K_RIGHT, pygame.K_d])
         keybinds.get_instance().set_binding(const.JUMP, [pygame.K_UP, pygame.K_w, pygame.K_SPACE])
@@ -143,9 +148,11 @@ class CircuitsGame(game.Game):
 
         globaltimer.set_show_fps(True)
 
-        gs.get_instance().load_data_from_disk()
+        with startupreport.phase("save load"):
+            gs.get_instance().load_data_from_disk()
 
-        scenes.set_instance(menus.CircuitsSceneManager(menus.MainMenuScene()))
+        with startupreport.phase("first scene"):
+            scenes.set_instance(menus.CircuitsSceneManager(menus.MainMenuScene()))
 
     def get_sheets(self):
         return spriteref.initialize_sheets()
@@ -154,13 +161,15 @@ class CircuitsGame(game.Game):
         yield threedee.ThreeDeeLayer(spriteref.THREEDEE_LAYER, 1)
         yield layers.PolygonLayer(spriteref.POLYGON_LAYER, 3, sort_sprites=True)
 
-        yield layers.ImageLayer(spriteref.BLOCK_LAYER, 5, sort_sprites=True, use_color=True)
+        yield layers.ImageLayer(spriteref.BLOCK_LAYER, 5, sort_sprites=True, use_color=True, cutout_only=True)
         yield layers.ImageLayer(spriteref.ENTITY_LAYER, 10, sort_sprites=True, use_color=True)
         yield layers.ImageLayer(spriteref.WORLD_UI_LAYER, 12, sort_sprites=True, use_color=True)
 
         yield layers.PolygonLayer(spriteref.POLYGON_UI_BG_LAYER, 15, sort_sprites=True)
+        yield layers.TexturePageLayer(spriteref.CUTSCENE_LAYER, 17, sort_sprites=False, use_color=True)
         yield layers.ImageLayer(spriteref.UI_BG_LAYER, 19, sort_sprites=True, use_color=True)
         yield layers.ImageLayer(spriteref.UI_FG_LAYER, 20, sort_sprites=True, use_color=True)
+        yield layers.TexturePageLayer(spriteref.LEVEL_PREVIEW_LAYER, 9999, sort_sprites=False, use_color=True)
         yield layers.PolygonLayer(spriteref.POLYGON_ULTRA_OMEGA_TOP_LAYER, 10000, sort_sprites=True)
         yield layers.ImageLayer(spriteref.ULTRA_OMEGA_GAMMA_TOP_IMAGE_LAYER, 10005, sort_sprites=True)
 
@@ -175,20 +184,33 @@ class CircuitsGame(game.Game):
         if globaltimer.tick_count() % 15 == 0:
             window.get_instance().set_caption_info("SPRITES", renderengine.get_instance().count_sprites())
             window.get_instance().set_caption_info("NO_GL_MODE", None if window.get_instance().is_opengl_mode() else "True")
+            if not renderengine.get_instance().is_opengl():
+                hits, misses, _ = renderengine.get_instance().get_surface_cache().get_stats()
+                hit_pcnt = "{:.1f}%".format(100 * hits / max(1, hits + misses))
+                window.get_instance().set_caption_info("SURF_CACHE_HITS", hit_pcnt)
+            else:
+                window.get_instance().set_caption_info("SURF_CACHE_HITS", None)
         return not gs.get_instance().should_exit()
 
     def cleanup(self):
-        gs.get_instance().save_data_to_disk()
+        gs.get_instance().save_data_to_disk(now=True)
 
     def get_clear_color(self):
         return scenes.get_instance().get_clear_color()
 
+    def on_window_focus_changed(self, has_focus):
+        scenes.get_instance().on_window_focus_changed(has_focus)
+
     def all_sprites(self):
         for spr in gs.get_instance().all_sprites():
             yield spr
         for spr in scenes.get_instance().all_sprites():
             yield spr
 
+    def all_sprite_groups(self):
+        for group in scenes.get_instance().all_sprite_groups():
+            yield group
+
     def _handle_global_keybinds(self):
         if inputs.get_instance().was_pressed(const.TOGGLE_MUTE):
             is_muted = (gs.get_instance().get_settings().get(gs.Settings.MUTE_MUSIC) and
@@ -213,6 +235,7 @@ class CircuitsGame(game.Game):
 
 
 def _update_readme():
+    import src.engine.readme_writer as readme_writer  # dev-only
     gif_directory = "gifs"
     gif_filenames = [f for f in os.listdir(gif_directory) if os.path.isfile(os.path.join(gif_directory, f))]
     gif_filenames = [f for f in gif_filenames if f.endswith(".gif") and f[0].isdigit()]
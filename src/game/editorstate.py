@@ -0,0 +1,390 @@
+import sys
+
+import src.utils.util as util
+
+
+class SpecIndex:
+    """Uniform grid of spec rects, for finding the specs at a point or in a rect without checking all of them."""
+
+    def __init__(self, cell_size=64, max_cells_per_spec=256):
+        self.cell_size = cell_size
+        self.max_cells_per_spec = max_cells_per_spec
+
+        self._rects = {}        # spec_id -> rect
+        self._cells = {}        # (cell_x, cell_y) -> set of spec_ids
+        self._huge_ids = set()  # specs that would cover too many cells, these get checked on every query
+
+    def __len__(self):
+        return len(self._rects)
+
+    def _cell_range(self, rect):
+        cs = self.cell_size
+        return (int(rect[0] // cs), int(rect[1] // cs),
+                int((rect[0] + max(0, rect[2])) // cs), int((rect[1] + max(0, rect[3])) // cs))
+
+    def _all_cells_in_rect(self, rect):
+        x1, y1, x2, y2 = self._cell_range(rect)
+        for x in range(x1, x2 + 1):
+            for y in range(y1, y2 + 1):
+                yield (x, y)
+
+    def _is_huge(self, rect):
+        x1, y1, x2, y2 = self._cell_range(rect)
+        return (x2 - x1 + 1) * (y2 - y1 + 1) > self.max_cells_per_spec
+
+    def set(self, spec_id, rect):
+        """Puts (or moves) the spec's rect in the index. rect can be None, for specs with no position."""
+        self.remove(spec_id)
+        if rect is None:
+            return
+        self._rects[spec_id] = rect
+        if self._is_huge(rect):
+            self._huge_ids.add(spec_id)
+        else:
+            for cell in self._all_cells_in_rect(rect):
+                if cell not in self._cells:
+                    self._cells[cell] = set()
+                self._cells[cell].add(spec_id)
+
+    def remove(self, spec_id):
+        if spec_id not in self._rects:
+            return
+        rect = self._rects.pop(spec_id)
+        if spec_id in self._huge_ids:
+            self._huge_ids.remove(spec_id)
+        else:
+            for cell in self._all_cells_in_rect(rect):
+                if cell in self._cells:
+                    self._cells[cell].discard(spec_id)
+                    if len(self._cells[cell]) == 0:
+                        del self._cells[cell]
+
+    def get_rect(self, spec_id):
+        return self._rects.get(spec_id, None)
+
+    def _candidates(self, rect):
+        res = set(self._huge_ids)
+        x1, y1, x2, y2 = self._cell_range(rect)
+        if (x2 - x1 + 1) * (y2 - y1 + 1) > len(self._cells):
+            # the query is bigger than the populated area, so it's faster to just walk the cells that exist
+            for (x, y), ids in self._cells.items():
+                if x1 <= x <= x2 and y1 <= y <= y2:
+                    res.update(ids)
+        else:
+            for cell in self._all_cells_in_rect(rect):
+                if cell in self._cells:
+                    res.update(self._cells[cell])
+        return res
+
+    def query_point(self, xy):
+        """returns: the ids of the specs whose rects contain the point."""
+        return set(spec_id for spec_id in self._candidates([xy[0], xy[1], 0, 0])
+                   if util.rect_contains(self._rects[spec_id], xy))
+
+    def query_rect(self, rect):
+        """returns: the ids of the specs whose rects intersect the given rect."""
+        return set(spec_id for spec_id in self._candidates(rect)
+                   if util.rects_intersect(self._rects[spec_id], rect))
+
+
+class SpecStore:
+    """The level editor's entity specs, each with a stable integer id.
+
+        Specs are treated as immutable (SpecUtils always returns modified copies), so the same spec objects are
+        shared between the store and the undo history instead of being copied on every edit. Specs are kept in id
+        order, which matches the order they were added in (replacing a spec keeps its place).
+
+        If rect_provider (a lambda spec -> rect or None) is given, the specs' rects are kept in a SpecIndex.
+    """
+
+    def __init__(self, specs=(), rect_provider=None):
+        self._specs = {}         # spec_id -> spec, in id order (unless _needs_sort)
+        self._ids = {}           # id(spec) -> spec_id
+        self._next_id = 0
+        self._needs_sort = False
+        self._cached_list = None
+
+        self._changes = {}  # spec_id -> spec before the first change since the last call to consume_changes()
+        self._changed_ids = set()  # same idea, but tracked separately so the editor's world can sync itself
+
+        self._rect_provider = rect_provider
+        self._index = SpecIndex() if rect_provider is not None else None
+
+        for s in specs:
+            self.add(s)
+        self.consume_changes()
+        self.consume_changed_ids()
+
+    def __len__(self):
+        return len(self._specs)
+
+    def __contains__(self, spec_id):
+        return spec_id in self._specs
+
+    def get(self, spec_id):
+        return self._specs.get(spec_id, None)
+
+    def get_id(self, spec):
+        """returns: the id of the given spec object (not just an equal one), or None if it isn't in the store."""
+        if spec is None:
+            return None
+        return self._ids.get(id(spec), None)
+
+    def all_ids(self):
+        self._sort_if_necessary()
+        return self._specs.keys()
+
+    def all_specs(self):
+        """returns: list of all the specs, in order. Don't modify it."""
+        if self._cached_list is None:
+            self._sort_if_necessary()
+            self._cached_list = list(self._specs.values())
+        return self._cached_list
+
+    def _sort_if_necessary(self):
+        if self._needs_sort:
+            self._specs = {spec_id: self._specs[spec_id] for spec_id in sorted(self._specs)}
+            self._needs_sort = False
+
+    def _reindex(self, spec_id):
+        if self._index is not None:
+            spec = self._specs.get(spec_id, None)
+            self._index.set(spec_id, None if spec is None else self._rect_provider(spec))
+
+    def get_rect(self, spec_id):
+        """returns: the spec's indexed rect, or None if it has no rect (or there's no index)."""
+        return None if self._index is None else self._index.get_rect(spec_id)
+
+    def ids_at(self, xy):
+        """returns: sorted list of the ids of the specs whose rects contain the point."""
+        return sorted(self._index.query_point(xy))
+
+    def ids_in_rect(self, rect):
+        """returns: sorted list of the ids of the specs whose rects intersect the given rect."""
+        return sorted(self._index.query_rect(rect))
+
+    def _record_change(self, spec_id):
+        if spec_id not in self._changes:
+            self._changes[spec_id] = self._specs.get(spec_id, None)
+        self._changed_ids.add(spec_id)
+        self._cached_list = None
+
+    def add(self, spec, spec_id=None):
+        """returns: the new spec's id."""
+        if id(spec) in self._ids:
+            spec = spec.copy()  # the same object can't be in here twice
+        if spec_id is None:
+            spec_id = self._next_id
+        elif spec_id in self._specs:
+            raise ValueError("spec id is already in use: {}".format(spec_id))
+
+        if len(self._specs) > 0 and spec_id < next(reversed(self._specs)):
+            self._needs_sort = True  # it's re-entering the store, probably from an undo
+        self._next_id = max(self._next_id, spec_id + 1)
+
+        self._record_change(spec_id)
+        self._specs[spec_id] = spec
+        self._ids[id(spec)] = spec_id
+        self._reindex(spec_id)
+        return spec_id
+
+    def remove(self, spec_id):
+        """returns: the removed spec."""
+        self._record_change(spec_id)
+        spec = self._specs.pop(spec_id)
+        del self._ids[id(spec)]
+        self._reindex(spec_id)
+        return spec
+
+    def replace(self, spec_id, new_spec):
+        old_spec = self._specs[spec_id]
+        if new_spec is old_spec:
+            return
+        if id(new_spec) in self._ids:
+            new_spec = new_spec.copy()
+        self._record_change(spec_id)
+        del self._ids[id(old_spec)]
+        self._specs[spec_id] = new_spec
+        self._ids[id(new_spec)] = spec_id
+        self._reindex(spec_id)
+
+    def set(self, spec_id, spec):
+        """Puts the spec at the given id, adding, replacing or removing (if spec is None) as necessary."""
+        if spec is None:
+            if spec_id in self._specs:
+                self.remove(spec_id)
+        elif spec_id in self._specs:
+            self.replace(spec_id, spec)
+        else:
+            self.add(spec, spec_id=spec_id)
+
+    def consume_changes(self):
+        """returns: map of spec_id -> (old_spec, new_spec) for every spec that's changed since the last call.
+            old_spec is None for added specs, new_spec is None for removed ones.
+        """
+        res = {}
+        for spec_id, old_spec in self._changes.items():
+            new_spec = self._specs.get(spec_id, None)
+            if old_spec is not new_spec:
+                res[spec_id] = (old_spec, new_spec)
+        self._changes = {}
+        return res
+
+    def consume_changed_ids(self):
+        """returns: the ids of the specs that were added, removed or replaced since the last call."""
+        res = self._changed_ids
+        self._changed_ids = set()
+        return res
+
+
+def _approx_size(spec):
+    if spec is None:
+        return 0
+    return sys.getsizeof(spec) + sum(sys.getsizeof(v) for v in spec.values())
+
+
+class _HistoryEntry:
+
+    def __init__(self, changes, selection, checkpoint=None):
+        self.changes = changes      # spec_id -> (old_spec, new_spec), i.e. what this entry did to the previous state
+        self.selection = selection  # frozenset, the selection after this entry
+        self.checkpoint = checkpoint  # full {spec_id: spec} map after this entry, or None
+
+        self.size = sum(_approx_size(old) + _approx_size(new) for (old, new) in changes.values())
+        if checkpoint is not None:
+            self.size += sys.getsizeof(checkpoint)
+
+
+class EditHistory:
+    """Undo/redo for the level editor. Each entry stores only the specs that changed, plus a full checkpoint (which
+        shares its specs with the store, so it's just a map of references) every checkpoint_period entries.
+    """
+
+    def __init__(self, store: SpecStore, selection=(), max_entries=32, max_bytes=16 * 1024 * 1024,
+                 checkpoint_period=16):
+        self.store = store
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.checkpoint_period = checkpoint_period
+
+        self._entries = []
+        self._idx = -1
+        self._total_size = 0
+        self._stamps_since_checkpoint = 0
+
+        self.stamp(selection)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_idx(self):
+        return self._idx
+
+    def get_total_size(self):
+        return self._total_size
+
+    def can_undo(self):
+        return self._idx > 0
+
+    def can_redo(self):
+        return self._idx < len(self._entries) - 1
+
+    def get_selection(self):
+        return self._entries[self._idx].selection
+
+    def stamp(self, selection):
+        """Records the changes made to the store since the last stamp (or undo / redo) as a new entry.
+            returns: whether an entry was added.
+        """
+        changes = self.store.consume_changes()
+        selection = frozenset(selection)
+
+        if len(self._entries) > 0 and len(changes) == 0 and self._entries[self._idx].selection == selection:
+            return False  # no changes were made, just abort
+
+        # if there are non-applied edits ahead of us, blow them away
+        while len(self._entries) > self._idx + 1:
+            self._total_size -= self._entries.pop().size
+
+        checkpoint = None
+        self._stamps_since_checkpoint += 1
+        if len(self._entries) == 0 or self._stamps_since_checkpoint >= self.checkpoint_period:
+            checkpoint = {spec_id: self.store.get(spec_id) for spec_id in self.store.all_ids()}
+            self._stamps_since_checkpoint = 0
+
+        entry = _HistoryEntry(changes, selection, checkpoint=checkpoint)
+        self._entries.append(entry)
+        self._total_size += entry.size
+        self._idx = len(self._entries) - 1
+
+        self._trim()
+        return True
+
+    def _trim(self):
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or
+                                          (self.max_bytes is not None and self._total_size > self.max_bytes)):
+            self._total_size -= self._entries.pop(0).size
+            self._idx -= 1
+
+            # the oldest entry's changes can't be undone anymore, so they don't need to be kept around
+            oldest = self._entries[0]
+            self._total_size -= oldest.size
+            oldest.changes = {}
+            oldest.size = 0 if oldest.checkpoint is None else sys.getsizeof(oldest.checkpoint)
+            self._total_size += oldest.size
+
+    def _apply_changes(self, changes, forward):
+        for spec_id, (old_spec, new_spec) in changes.items():
+            self.store.set(spec_id, new_spec if forward else old_spec)
+
+    def _apply_checkpoint(self, checkpoint):
+        for spec_id in [s_id for s_id in self.store.all_ids() if s_id not in checkpoint]:
+            self.store.remove(spec_id)
+        for spec_id, spec in checkpoint.items():
+            self.store.set(spec_id, spec)
+
+    def jump_to(self, idx):
+        """Puts the store into the state it was in at the given entry.
+            returns: the selection at that entry, or None if the index is out of range.
+        """
+        if not (0 <= idx < len(self._entries)):
+            return None
+
+        # unstamped changes get thrown away, so the store matches the current entry again
+        self._apply_changes(self.store.consume_changes(), False)
+
+        # walk the diffs, unless there's a checkpoint that's closer
+        n_steps = abs(idx - self._idx)
+        best_checkpoint = None
+        for i in range(0, len(self._entries)):
+            if self._entries[i].checkpoint is not None and abs(idx - i) + 1 < n_steps:
+                if best_checkpoint is None or abs(idx - i) < abs(idx - best_checkpoint):
+                    best_checkpoint = i
+
+        cur_idx = self._idx
+        if best_checkpoint is not None:
+            self._apply_checkpoint(self._entries[best_checkpoint].checkpoint)
+            cur_idx = best_checkpoint
+
+        while cur_idx > idx:
+            self._apply_changes(self._entries[cur_idx].changes, False)
+            cur_idx -= 1
+        while cur_idx < idx:
+            cur_idx += 1
+            self._apply_changes(self._entries[cur_idx].changes, True)
+
+        self._idx = idx
+        self.store.consume_changes()
+        return self._entries[idx].selection
+
+    def undo(self):
+        """returns: the selection to restore, or None if there's nothing to undo."""
+        if not self.can_undo():
+            return None
+        return self.jump_to(self._idx - 1)
+
+    def redo(self):
+        """returns: the selection to restore, or None if there's nothing to redo."""
+        if not self.can_redo():
+            return None
+        return self.jump_to(self._idx + 1)
@@ -1,4 +1,5 @@
 
+import itertools
 import math
 import random
 import typing
@@ -12,6 +13,7 @@ import src.engine.spritesheets as spritesheets
 import src.engine.inputs as inputs
 import src.engine.keybinds as keybinds
 import src.engine.sounds as sounds
+import src.engine.qualitygovernor as qualitygovernor
 
 import configs as configs
 
@@ -26,13 +28,11 @@ import src.game.dialog as dialog
 import src.game.particles as particles
 
 
-_ENT_ID = 0
+_ENT_ID = itertools.count()
 
 
 def next_entity_id():
-    global _ENT_ID
-    _ENT_ID += 1
-    return _ENT_ID - 1
+    return next(_ENT_ID)  # atomic, since worlds can be built off the main thread
 
 
 # physics groups
@@ -94,6 +94,7 @@ class Entity:
         self._perturbs = []
 
         self._last_updated_at = -1  # should only be set by World
+        self._n_skipped_updates = 0  # should only be set by World
 
     def get_world(self) -> 'src.game.worlds.World':
         return self._world
@@ -133,7 +134,7 @@ class Entity:
         self._perturbs = shake_points
 
     def get_xy_perturb(self):
-        if len(self._perturbs) > 0:
+        if len(self._perturbs) > 0 and not qualitygovernor.is_reduced(qualitygovernor.Reductions.SHAKE):
             return self._perturbs[-1]
         else:
             return (0, 0)
@@ -327,6 +328,35 @@ class Entity:
     def update_sprites(self):
         pass
 
+    def is_gameplay_neutral(self):
+        """Whether this entity's update() is purely cosmetic (i.e. skipping it can never affect gameplay).
+            The World may update neutral entities at a reduced rate (or not at all) while they're far from the camera.
+        """
+        return False
+
+    def get_offscreen_update_period(self):
+        """returns: how often (in ticks) to update this entity while it's off-screen, or 0 to never update it.
+            Only applies to gameplay-neutral entities.
+        """
+        return 0
+
+    def catch_up(self, n_ticks):
+        """Called by the World right before update() when a gameplay-neutral entity has skipped n_ticks updates."""
+        pass
+
+    def has_static_sprites(self):
+        """Whether this entity's sprites can be baked into the WorldView's chunks. Such entities must never move,
+            and must call World.mark_static_sprites_dirty() whenever their appearance changes (except for
+            periodic changes like lighting, see get_sprite_refresh_phase()).
+        """
+        return False
+
+    def get_sprite_refresh_phase(self):
+        """returns: (period, offset) in ticks if this entity's static sprites might change on the ticks where
+            (tick - offset) % period == 0, or None if they only change when the world is notified.
+        """
+        return None
+
     def update_frame_of_reference_parents(self):
         pass
 
@@ -554,6 +584,7 @@ class AbstractBlockEntity(Entity):
         # and we apply a random offset so they aren't all updating on the same frame.
         self._cached_color_this_frame = [-1, colors.WHITE]
         self._color_recalc_period = 10
+        self._reduced_color_recalc_period = 40  # used when the game's running slow, must be a multiple of the above
         self._color_recalc_offset = random.randint(0, self._color_recalc_period)
 
     def update(self):
@@ -568,6 +599,10 @@ class AbstractBlockEntity(Entity):
     def is_color_baked_into_sprites(self):
         return False
 
+    def get_sprite_refresh_phase(self):
+        # lighting only changes when the color is recalculated
+        return (self._color_recalc_period, self._color_recalc_offset)
+
     def get_color(self, ignore_override=False, include_lighting=True):
         base_color = super().get_color(ignore_override=ignore_override)
         if not ignore_override and self.get_color_override() is not None:
@@ -577,8 +612,12 @@ class AbstractBlockEntity(Entity):
         else:
             cur_tick = gs.get_instance().tick_count()
             last_recalc_tick = self._cached_color_this_frame[0]
+            if qualitygovernor.is_reduced(qualitygovernor.Reductions.LIGHTING):
+                period = self._reduced_color_recalc_period
+            else:
+                period = self._color_recalc_period
             if last_recalc_tick < 0 or (last_recalc_tick != cur_tick
-                                        and (cur_tick - self._color_recalc_offset) % self._color_recalc_period == 0):
+                                        and (cur_tick - self._color_recalc_offset) % period == 0):
                 w = self.get_world()
                 dark_color = colors.darken(base_color, 0.333)
                 bright_color = colors.lighten(base_color, 0.333)
@@ -629,6 +668,9 @@ class BlockEntity(AbstractBlockEntity):
     def update(self):
         super().update()
 
+    def has_static_sprites(self):
+        return not self.is_dynamic()
+
     def get_depth(self):
         return BLOCK_DEPTH
 
@@ -1084,6 +1126,9 @@ class MovingBlockEntity(BlockEntity):
         super().update_sprites()
         self.controller.update_sprites()
 
+    def has_static_sprites(self):
+        return False
+
     def get_depth(self):
         return MOVING_BLOCK_DEPTH
 
@@ -1118,6 +1163,8 @@ class DoorBlock(BlockEntity, HasLightSourcesEntity):
         self._is_solid = val
         for c in self.all_colliders(solid=True, enabled=None):
             c.set_enabled(val)
+        if self.get_world() is not None:
+            self.get_world().mark_static_sprites_dirty(self)
 
     def get_main_model(self):
         w, h = self.get_size()
@@ -1710,6 +1757,9 @@ class SlopeBlockEntity(AbstractBlockEntity):
 
         self.set_colliders(SlopeBlockEntity.build_colliders_for_points(self._points))
 
+    def has_static_sprites(self):
+        return True
+
     def get_points(self, origin=None):
         if origin is None:
             origin = self.get_xy(raw=False)
@@ -2976,8 +3026,11 @@ class FloatingDustParticleEntity(Entity):
         self._sprite = None
 
     def calc_next_vel(self, cur_vel):
-        sway_val_rads = 2 * (0.5 - random.random()) * self._max_sway / configs.target_fps
-        vel_with_sway = util.rotate(cur_vel, sway_val_rads)
+        if qualitygovernor.is_reduced(qualitygovernor.Reductions.PARTICLES):
+            vel_with_sway = cur_vel  # it's subtle, and there's a lot of these
+        else:
+            sway_val_rads = 2 * (0.5 - random.random()) * self._max_sway / configs.target_fps
+            vel_with_sway = util.rotate(cur_vel, sway_val_rads)
 
         new_vel = util.add(vel_with_sway, self._accel)
         if util.mag(new_vel) > self._max_speed:
@@ -3014,6 +3067,19 @@ class FloatingDustParticleEntity(Entity):
         self.update_sprites()
         self._ticks_active += 1
 
+    def is_gameplay_neutral(self):
+        return True
+
+    def get_offscreen_update_period(self):
+        return 15  # still need to expire eventually
+
+    def catch_up(self, n_ticks):
+        n_ticks = min(n_ticks, max(0, self._duration - self._ticks_active))
+        if n_ticks > 0:
+            # skip the swaying, it's not visible anyways
+            self.set_xy(util.add(self.get_xy(raw=True), util.mult(self.get_vel(), n_ticks)))
+            self._ticks_active += n_ticks
+
     def all_sprites(self):
         yield self._sprite
 
@@ -3041,10 +3107,16 @@ class ParticleEmitterZone(DynamicEntity):
     def get_physics_group(self):
         return DECORATION_GROUP
 
+    def is_gameplay_neutral(self):
+        return True
+
     def update(self):
         self._active_particle_ids = [p for p in self._active_particle_ids if self.get_world().has_entity_with_id(p)]
         if self._max_particles < 0 or len(self._active_particle_ids) < self._max_particles:
-            if self.enabled and random.random() < self._spawn_chance_per_frame:
+            spawn_chance = self._spawn_chance_per_frame
+            if qualitygovernor.is_reduced(qualitygovernor.Reductions.PARTICLES):
+                spawn_chance *= configs.reduced_particle_spawn_rate
+            if self.enabled and random.random() < spawn_chance:
                 xy_scalars = self._xy_provider()
                 xy = util.add(self.get_xy(), (self.get_w() * xy_scalars[0], self.get_h() * xy_scalars[1]))
                 new_particle = self._spawner(xy)
@@ -3325,7 +3397,8 @@ class DecorationEntity(Entity):
             self._sprite = sprites.ImageSprite.new_sprite(spriteref.BLOCK_LAYER, depth=0)
         model, can_recolor = spriteref.decoration_sheet().get_sprite(self.get_size(), self.art_id)
         if model is None:
-            model = spritesheets.get_white_square_img(opacity=0.75)
+            # has to be opaque, since the block layer is cutout-only (translucent pixels would still write depth)
+            model = spritesheets.get_white_square_img(opacity=1.0)
             self._sprite = self._sprite.update(new_model=model, new_x=self.get_x(), new_y=self.get_y(),
                                                new_raw_size=self.get_size(), new_color=self.get_color())
         else:
@@ -3339,6 +3412,9 @@ class DecorationEntity(Entity):
     def is_dynamic(self):
         return False
 
+    def is_gameplay_neutral(self):
+        return True
+
 
 class FalseBlockEntity(BlockEntity):
     """Block that doesn't prevent movement and gradually disappears when you enter it"""
@@ -3366,6 +3442,9 @@ class FalseBlockEntity(BlockEntity):
     def is_block(self):
         return False  # not a block in any real sense (collisions, mainly)
 
+    def has_static_sprites(self):
+        return False  # it fades when you walk through it
+
     def get_color(self, ignore_override=False, include_lighting=True):
         base_color = super().get_color(ignore_override=ignore_override, include_lighting=include_lighting)
 
@@ -3694,6 +3773,9 @@ class CameraBoundMarker(Entity):
     def get_show_timer(self):
         return self.show_timer
 
+    def is_gameplay_neutral(self):
+        return True  # the World reads its position directly, update() doesn't matter
+
     def get_color(self, ignore_override=False):
         if ignore_override:
             return colors.PERFECT_WHITE
@@ -1,11 +1,15 @@
 import traceback
 import os
+import time
+import copy
+import atexit
 
 import configs
 import src.game.const as const
 import src.utils.util as util
 import src.game.colors as colors
 import src.engine.keybinds as keybinds
+import src.utils.threadutils as threadutils
 
 
 class SaveAndLoadJsonBlob:
@@ -30,16 +34,11 @@ class SaveAndLoadJsonBlob:
         return self
 
     def save_to_disk(self, filepath):
-        try:
-            if os.path.exists(filepath):
-                print("INFO: overwriting {}...".format(filepath))
-            else:
-                print("INFO: creating {}...".format(filepath))
-            util.save_json_to_path(self.json_blob, filepath, make_pretty=True)
-            print("INFO: saved data successfully")
-        except Exception:
-            print("ERROR: failed to write {}".format(filepath))
-            traceback.print_exc()
+        _write_json_blob(self.json_blob, filepath)
+
+    def snapshot(self):
+        """returns: a copy of the blob that's safe to hand off to another thread."""
+        return copy.deepcopy(self.json_blob)
 
     def _safe_clean(self, attrib, new_val):
         try:
@@ -73,6 +72,87 @@ class SaveAndLoadJsonBlob:
         pass
 
 
+def _write_json_blob(json_blob, filepath):
+    try:
+        if os.path.exists(filepath):
+            print("INFO: overwriting {}...".format(filepath))
+        else:
+            print("INFO: creating {}...".format(filepath))
+        util.save_json_to_path(json_blob, filepath, make_pretty=True, atomic=True)
+        print("INFO: saved data successfully")
+        return True
+    except Exception:
+        print("ERROR: failed to write {}".format(filepath))
+        traceback.print_exc()
+        return False
+
+
+class AsyncSaver:
+    """Coalesces save requests and writes them on a background thread, so saving doesn't stall the game."""
+
+    DEBOUNCE_SECS = 0.5  # saves requested within this window of each other get merged into one write
+
+    def __init__(self):
+        self._pending = {}  # filepath -> json_blob snapshot
+        self._first_request_time = None
+        self._in_flight = None  # Future
+
+        self.num_requests = 0
+        self.num_writes = 0
+        self.last_request_ms = 0  # time spent on the main thread by the last request
+        self.last_write_ms = 0    # time spent on the background thread by the last write
+
+        self._registered_exit_hook = False
+
+    def request_save(self, blob: SaveAndLoadJsonBlob, filepath):
+        start_time = time.perf_counter()
+        self._pending[filepath] = blob.snapshot()
+        if self._first_request_time is None:
+            self._first_request_time = time.time()
+        self.num_requests += 1
+
+        if not self._registered_exit_hook:
+            # in case the game doesn't get to exit cleanly
+            atexit.register(self.flush)
+            self._registered_exit_hook = True
+
+        self.last_request_ms = (time.perf_counter() - start_time) * 1000
+
+    def has_pending_writes(self):
+        return len(self._pending) > 0 or (self._in_flight is not None and not self._in_flight.is_done())
+
+    def update(self):
+        if self._in_flight is not None and self._in_flight.is_done():
+            self._in_flight = None
+
+        if (self._in_flight is None and len(self._pending) > 0
+                and time.time() - self._first_request_time >= AsyncSaver.DEBOUNCE_SECS):
+            to_write = self._pending
+            self._pending = {}
+            self._first_request_time = None
+            self._in_flight = threadutils.do_work_on_background_thread(lambda: self._write_all(to_write))
+
+    def _write_all(self, to_write):
+        start_time = time.perf_counter()
+        for filepath in to_write:
+            _write_json_blob(to_write[filepath], filepath)
+        self.num_writes += 1
+        self.last_write_ms = (time.perf_counter() - start_time) * 1000
+        print("INFO: wrote {} file(s) in {:.1f}ms (last request cost the main thread {:.2f}ms)".format(
+            len(to_write), self.last_write_ms, self.last_request_ms))
+
+    def flush(self):
+        """Blocks until every requested save has been written."""
+        if self._in_flight is not None:
+            self._in_flight.wait(poll_rate_secs=0.01)
+            self._in_flight = None
+        if len(self._pending) > 0:
+            to_write = self._pending
+            self._pending = {}
+            self._first_request_time = None
+            self._write_all(to_write)
+
+
 class SaveData(SaveAndLoadJsonBlob):
 
     COMPLETED_LEVELS = "completed_levels"
@@ -197,6 +277,7 @@ class GlobalState:
 
         self._save_data = SaveData()
         self._settings = Settings()
+        self._saver = AsyncSaver()
 
         self._should_quit_for_real = False
 
@@ -219,6 +300,7 @@ class GlobalState:
         self._update_fullscreen_fade()
         self._tick_count += 1
         self._save_data.set(SaveData.TOTAL_PLAYTIME, self._save_data.get_total_playtime() + 1)
+        self._saver.update()
 
     def all_sprites(self):
         if self._fullscreen_fade_sprite is not None:
@@ -305,9 +387,18 @@ class GlobalState:
         self._save_data.load_from_disk(util.user_data_path(configs.save_data_path, forcelocal=configs.use_local_paths))
         self._settings.load_from_disk(util.user_data_path(configs.settings_path, forcelocal=configs.use_local_paths))
 
-    def save_data_to_disk(self):
-        self._save_data.save_to_disk(util.user_data_path(configs.save_data_path, forcelocal=configs.use_local_paths))
-        self._settings.save_to_disk(util.user_data_path(configs.settings_path, forcelocal=configs.use_local_paths))
+    def save_data_to_disk(self, now=False):
+        """
+        now: if False, the save happens on a background thread a moment later (along with any other saves requested
+             in the meantime). If True, blocks until everything's been written.
+        """
+        self._saver.request_save(self._save_data, util.user_data_path(configs.save_data_path, forcelocal=configs.use_local_paths))
+        self._saver.request_save(self._settings, util.user_data_path(configs.settings_path, forcelocal=configs.use_local_paths))
+        if now:
+            self._saver.flush()
+
+    def get_saver(self) -> AsyncSaver:
+        return self._saver
 
     def quit_game_for_real(self):
         self._should_quit_for_real = True
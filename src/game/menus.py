@@ -19,6 +19,7 @@ import src.game.debug as debug
 import src.utils.util as util
 import src.utils.artutils as artutils
 import src.utils.matutils as matutils
+import src.utils.threadutils as threadutils
 import src.game.spriteref as spriteref
 import src.game.colors as colors
 import src.game.overworld as overworld
@@ -35,12 +36,35 @@ class CircuitsSceneManager(scenes.SceneManager):
 
     def __init__(self, cur_scene):
         super().__init__(cur_scene)
+        self._fade_when_activating = False
 
     def set_next_scene(self, scene, delay=0, do_fade=True):
-        if do_fade and not delay:
-            gs.get_instance().do_simple_fade_in()
+        # the fade starts when the scene actually becomes active, which might be a few frames from now if it's
+        # still being prepared in the background.
+        self._fade_when_activating = do_fade and not delay
+        songsystem.prefetch_song(_get_song_for_scene(scene))
         super().set_next_scene(scene, delay=delay)
 
+    def _activate_next_scene(self):
+        if self._fade_when_activating:
+            gs.get_instance().do_simple_fade_in()
+            self._fade_when_activating = False
+        super()._activate_next_scene()
+
+
+def _get_song_for_scene(scene):
+    """returns: the song the scene is going to play when it becomes active (if it's known ahead of time), or None."""
+    if isinstance(scene, MainMenuScene):
+        return songsystem.MAIN_MENU_SONG
+    elif isinstance(scene, InstructionsScene):
+        return songsystem.INSTRUCTION_MENU_SONG
+    elif isinstance(scene, LevelPlayerOverviewScene):
+        return scene.game_scene.get_state().get_song()
+    elif isinstance(scene, RealGameScene):
+        return scene.get_state().get_song()
+    else:
+        return None
+
 
 def _make_overworlds_scene():
     # TODO may want to just move this into assets (and del from make_exe too).
@@ -269,6 +293,12 @@ class LevelPlayerOverviewScene(scenes.Scene):
         self.trans_delay = 20
         self.trans_ticks = 0
 
+    def is_ready(self):
+        return self.game_scene.is_ready()
+
+    def finish_preparing(self):
+        self.game_scene.finish_preparing()
+
     def _get_lines(self):
         """ returns: list of (ImageModel, text, color)
         """
@@ -388,6 +418,9 @@ class LevelPlayerOverviewScene(scenes.Scene):
         for spr in self.game_scene.all_sprites():
             yield spr
 
+    def all_sprite_groups(self):
+        return self.game_scene.all_sprite_groups()
+
 
 class CreditsScene(scenes.Scene):
     # most of this is yoinked from Skeletris
@@ -776,13 +809,36 @@ class CutsceneScene(scenes.Scene):
 
         self._bg_sprite = None
 
+        self._next_streamed_images = ()
+
         self.tick_count = 0
 
+    def became_active(self):
+        spriteref.set_active_cutscene_images(self.get_streamed_images())
+
+    def jump_to_scene(self, next_scene, do_fade=True):
+        if isinstance(next_scene, CutsceneScene):
+            self._next_streamed_images = next_scene.get_streamed_images()
+        else:
+            self._next_streamed_images = ()
+        super().jump_to_scene(next_scene, do_fade=do_fade)
+
+    def about_to_become_inactive(self):
+        # evicting here rather than in jump_to_scene so the image stays up during the fade out.
+        spriteref.set_active_cutscene_images(self._next_streamed_images)
+
     def update(self):
         self.update_sprites()
         self.handle_inputs()
         self.tick_count += 1
 
+    def get_streamed_images(self):
+        """returns: the cutscene images this scene is showing (or will show soon), so they can be loaded ahead of time."""
+        return ()
+
+    def is_bg_image_loading(self) -> bool:
+        return False
+
     def get_text(self) -> sprites.TextBuilder:
         raise NotImplementedError()
 
@@ -806,11 +862,13 @@ class CutsceneScene(scenes.Scene):
         game_size = renderengine.get_instance().get_game_size()
 
         bg_img = self.get_bg_image()
-        if bg_img is None:
+        if bg_img is None and self.is_bg_image_loading():
+            return  # hold off on laying anything out until it arrives (it was probably prefetched, so not long)
+        elif bg_img is None:
             self._bg_sprite = None
         else:
             if self._bg_sprite is None:
-                self._bg_sprite = sprites.ImageSprite(bg_img, 0, 0, spriteref.UI_BG_LAYER)
+                self._bg_sprite = sprites.ImageSprite(bg_img, 0, 0, spriteref.CUTSCENE_LAYER)
 
             bg_x = game_size[0] // 2 - self._bg_sprite.width() // 2
             bg_y = 0
@@ -888,6 +946,19 @@ class MultiPageCutsceneScene(CutsceneScene):
         else:
             return None
 
+    def is_bg_image_loading(self) -> bool:
+        img_type = self.all_pages[self.page][0]
+        return img_type is not None and spriteref.is_cutscene_image_loading(img_type)
+
+    def get_streamed_images(self):
+        # the current page's image, plus the next one's so it's ready by the time the player clicks
+        res = []
+        for page in range(self.page, min(self.page + 2, len(self.all_pages))):
+            img_type = self.all_pages[page][0]
+            if img_type is not None:
+                res.append(img_type)
+        return res
+
     def get_cutscene_for_page(self, page):
         return MultiPageCutsceneScene(self.all_pages, page,
                                       next_scene_provider=self.next_scene_provider,
@@ -942,6 +1013,7 @@ class IntroCutsceneScene(MultiPageCutsceneScene):
                          next_scene_provider=next_scene_provider, sound_for_next_page=sound_for_next_page)
 
     def became_active(self):
+        super().became_active()
         if self.page == 0:
             sounds.play_sound(soundref.ModernUI.open_or_enable_4a)
             gs.get_instance().do_fullscreen_fade(60, colors.PERFECT_BLACK, 1.0, 0.0)
@@ -990,20 +1062,53 @@ class _BaseGameScene(scenes.Scene):
         self._world = None
         self._world_view = None
 
+        self._pending_world = None   # (bp, Future of World), while the world is being built in the background
+        self._prebuilt_world = None  # (bp, World), for setup_new_world to pick up
+
     def setup_new_world(self, bp):
         if bp is None:
             self._world = None
             self._world_view = None
         else:
             print("INFO: activating blueprint: {}".format(bp.name()))
-            self._world = bp.create_world()
+            if self._prebuilt_world is not None and self._prebuilt_world[0] is bp:
+                self._world = self._prebuilt_world[1]
+            else:
+                self._world = self._build_world(bp)
+            self._prebuilt_world = None
             self._world_view = worldview.WorldView(self._world)
             self._world_view.set_free_camera(False)
 
+    def setup_new_world_in_background(self, bp):
+        """Like setup_new_world, except the world (i.e. the entities and spatial hashes) is built on a worker thread.
+            The rest of the setup (placing players, creating the view, etc.) happens in finish_preparing, on the main
+            thread, once the scene is about to become active (or as soon as something needs the world).
+        """
+        self._pending_world = (bp, threadutils.do_work_on_background_thread(lambda: self._build_world(bp)))
+
+    def _build_world(self, bp) -> worlds.World:
+        return bp.create_world()
+
+    def is_ready(self):
+        return self._pending_world is None or self._pending_world[1].is_done()
+
+    def finish_preparing(self):
+        if self._pending_world is not None:
+            bp, fut = self._pending_world
+            self._pending_world = None
+            world = fut.wait()  # only blocks if something needed the world before it was ready
+            if world is not None:
+                self._prebuilt_world = (bp, world)
+            self.setup_new_world(bp)  # if the build failed, this will just try again on the main thread
+
     def get_world(self) -> worlds.World:
+        if self._pending_world is not None:
+            self.finish_preparing()
         return self._world
 
     def get_world_view(self) -> worldview.WorldView:
+        if self._pending_world is not None:
+            self.finish_preparing()
         return self._world_view
 
     def update_world_and_view(self):
@@ -1052,6 +1157,11 @@ class _BaseGameScene(scenes.Scene):
         else:
             return []
 
+    def all_sprite_groups(self):
+        if self._world_view is not None:
+            for group in self._world_view.all_sprite_groups():
+                yield group
+
 
 class Status:
 
@@ -1479,8 +1589,8 @@ class RealGameScene(_BaseGameScene, dialog.DialogScene):
 
         self._fadeout_duration = 90
 
-        self.setup_new_world(bp)
         self._handled_level_fail = False
+        self.setup_new_world_in_background(bp)
 
         self._queued_next_world = None
         self._next_world_countdown = 0
@@ -1613,6 +1723,13 @@ class RealGameScene(_BaseGameScene, dialog.DialogScene):
         sounds.play_sound(soundref.MENU_BACK)  # pause sound
         self.jump_to_scene(GamePausedScene(self, _on_quit))
 
+    def on_window_focus_changed(self, has_focus):
+        # pause mid-run, rather than let the level keep going (slowly) in the background
+        if not has_focus and configs.pause_when_unfocused and self.is_active() \
+                and self._state.get_status() == Statuses.IN_PROGRESS:
+            print("INFO: window lost focus, pausing")
+            self.handle_esc_pressed()
+
     def start_dialog(self, dialog_frag):
         super().start_dialog(dialog_frag)
 
@@ -1776,6 +1893,9 @@ class DebugGameScene(RealGameScene):
     def handle_esc_pressed(self):
         self.get_manager().set_next_scene(self.edit_scene)
 
+    def on_window_focus_changed(self, has_focus):
+        pass  # esc goes back to the editor here, which isn't what you want when alt-tabbing
+
 
 class GamePausedScene(OptionSelectScene):
 
@@ -1817,6 +1937,9 @@ class GamePausedScene(OptionSelectScene):
         for spr in super().all_sprites():
             yield spr
 
+    def all_sprite_groups(self):
+        return self._game_scene.all_sprite_groups()
+
 
 class StatsScene(OptionSelectScene):
 
@@ -2102,18 +2225,18 @@ class LevelEditGameScene(_BaseGameScene):
         """
         _BaseGameScene.__init__(self)
 
+        import src.game.editorstate as editorstate  # editor-only, so it's loaded on first use
+
         self.orig_bp = bp
         self._level_id = bp.level_id()
 
         self.mouse_mode = NormalMouseMode(self)
 
-        self.edit_queue = []
-        self.edit_queue_idx = -1
-        self.edit_queue_max_size = 32
-
-        self.selected_specs = set()
-        self.all_spec_blobs = [s[0] for s in bp.all_entities()]
-        self.entities_for_specs = {}  # SpecType -> List of Entities
+        self.selected_specs = set()  # set of spec_ids
+        self.specs = editorstate.SpecStore((s[0] for s in bp.all_entities()),
+                                           rect_provider=LevelEditGameScene._get_spec_rect)
+        self.edit_history = editorstate.EditHistory(self.specs, selection=self.selected_specs, max_entries=32)
+        self.entities_for_spec_ids = {}  # spec_id -> List of Entities
 
         cs = gs.get_instance().cell_size
         self.edit_resolution = cs  # how far blocks move & change in size when you press the key commands
@@ -2125,8 +2248,7 @@ class LevelEditGameScene(_BaseGameScene):
 
         self._dirty = False  # whether the current state is different from the last-saved state
 
-        self.stamp_current_state()
-        self.setup_new_world(bp)
+        self.setup_new_world_in_background(bp)
 
         self._prev_scene_provider = prev_scene_provider
 
@@ -2166,23 +2288,16 @@ class LevelEditGameScene(_BaseGameScene):
         else:
             self.set_mouse_mode(None)
 
-    def stamp_current_state(self):
-        cur_specs = [s.copy() for s in self.all_spec_blobs]
-        cur_selection = set(self.selected_specs)
-        state = EditorState(cur_specs, cur_selection)
-
-        if 0 <= self.edit_queue_idx < len(self.edit_queue):
-            if self.edit_queue[self.edit_queue_idx] == state:
-                return  # no changes were made, just abort
+    @property
+    def all_spec_blobs(self):
+        return self.specs.all_specs()
 
-        self.edit_queue_idx += 1
-        if len(self.edit_queue) >= self.edit_queue_idx:
-            # if there are non-applied edits ahead of us, blow them away
-            self.edit_queue = self.edit_queue[0 : self.edit_queue_idx]
-        self.edit_queue.append(state)
+    @staticmethod
+    def _get_spec_rect(spec):
+        return blueprints.SpecUtils.get_rect(spec, default_size=gs.get_instance().cell_size)
 
-        if len(self.edit_queue) > self.edit_queue_max_size:
-            self.edit_queue = self.edit_queue[-self.edit_queue_max_size:]
+    def stamp_current_state(self):
+        self.edit_history.stamp(self.selected_specs)
 
     def mark_dirty(self):
         self._dirty = True
@@ -2191,24 +2306,16 @@ class LevelEditGameScene(_BaseGameScene):
         return self._dirty
 
     def undo(self):
-        self.edit_queue_idx = util.bound(self.edit_queue_idx, 0, len(self.edit_queue))
-        if self.edit_queue_idx > 0:
-            self.edit_queue_idx -= 1
-        else:
-            return
-        state_to_apply = self.edit_queue[self.edit_queue_idx]
-        self._apply_state(state_to_apply)
-        self.mark_dirty()
+        selection = self.edit_history.undo()
+        if selection is not None:
+            self._apply_selection(selection)
+            self.mark_dirty()
 
     def redo(self):
-        self.edit_queue_idx = util.bound(self.edit_queue_idx, 0, len(self.edit_queue))
-        if self.edit_queue_idx < len(self.edit_queue) - 1:
-            self.edit_queue_idx += 1
-        else:
-            return
-        state_to_apply = self.edit_queue[self.edit_queue_idx]
-        self._apply_state(state_to_apply)
-        self.mark_dirty()
+        selection = self.edit_history.redo()
+        if selection is not None:
+            self._apply_selection(selection)
+            self.mark_dirty()
 
     def set_mouse_mode(self, mode):
         if self.mouse_mode is not None:
@@ -2222,22 +2329,21 @@ class LevelEditGameScene(_BaseGameScene):
         self.mouse_mode.activate()
 
     def get_selected_specs(self):
-        # TODO pretty inefficient due to poor design
-        return [s for s in self.all_spec_blobs if self.is_selected(s)]
+        return [self.specs.get(spec_id) for spec_id in sorted(self.selected_specs)]
 
     def _mutate_selected_specs(self, funct, select_results=True, undoable=True):
         """
         funct: lambda spec -> spec, or a list of specs
         returns: (list of orig specs, list of new specs)
         """
-        # TODO this is all pretty inefficient
         orig_specs = []
         new_specs = []
         if len(self.selected_specs) > 0:
-            to_modify = self.get_selected_specs()
+            to_modify = sorted(self.selected_specs)
             self.deselect_all()
 
-            for orig_s in to_modify:
+            for spec_id in to_modify:
+                orig_s = self.specs.get(spec_id)
                 orig_specs.append(orig_s)
                 try:
                     res = util.listify(funct(orig_s))
@@ -2247,20 +2353,18 @@ class LevelEditGameScene(_BaseGameScene):
                     res = [orig_s]  # keep it as-is
 
                 if len(res) == 0:
-                    self.all_spec_blobs.remove(orig_s)
+                    self.specs.remove(spec_id)
                 else:
-                    orig_idx = self.all_spec_blobs.index(orig_s)
-                    self.all_spec_blobs[orig_idx] = res[0]
-                    for i in range(1, len(res)):
-                        self.all_spec_blobs.append(res[i])
-                    for new_s in res:
-                        new_specs.append(new_s)
+                    self.specs.replace(spec_id, res[0])
+                    new_ids = [spec_id] + [self.specs.add(res[i]) for i in range(1, len(res))]
+                    for new_id in new_ids:
+                        new_specs.append(self.specs.get(new_id))
                         if select_results:
-                            self.set_selected(new_s, select=True)
+                            self.set_selected_id(new_id, select=True)
             if undoable:
                 self.stamp_current_state()
 
-            self.setup_new_world(self.build_current_bp())
+            self._update_world()
             self.mark_dirty()
 
         return orig_specs, new_specs
@@ -2298,8 +2402,7 @@ class LevelEditGameScene(_BaseGameScene):
                     needs_undo_stamp = True
                     self.deselect_all()
                     for spec in shifted_specs:
-                        self.all_spec_blobs.append(spec)
-                        self.set_selected(spec, select=True)
+                        self.selected_specs.add(self.specs.add(spec))
 
                     print("INFO: pasted {} spec(s) into world".format(len(shifted_specs)))
 
@@ -2307,7 +2410,7 @@ class LevelEditGameScene(_BaseGameScene):
             print("ERROR: failed to paste data from clipboard: {}".format(raw_data))
             traceback.print_exc()
 
-        self.setup_new_world(self.build_current_bp())
+        self._update_world()
         if needs_undo_stamp:
             self.stamp_current_state()
             self.mark_dirty()
@@ -2378,15 +2481,12 @@ class LevelEditGameScene(_BaseGameScene):
         advanced_edit_func = lambda s: blueprints.SpecUtils.open_advanced_editor(s)
         self._mutate_selected_specs(advanced_edit_func)
 
-    def _apply_state(self, state: 'EditorState'):
-        self.all_spec_blobs = [s.copy() for s in state.all_specs]
-
-        self.setup_new_world(self.build_current_bp())
-        for spec in self.all_spec_blobs:
-            if util.to_key(spec) in state.selected_specs:
-                self.set_selected(spec, select=True)
-            else:
-                self.set_selected(spec, select=False)
+    def _apply_selection(self, selection):
+        old_selection = self.selected_specs
+        self.selected_specs = set(selection)
+        self._update_world()
+        for spec_id in old_selection.symmetric_difference(self.selected_specs):
+            self._update_entity_colors(spec_id)
 
     def build_current_bp(self):
         return blueprints.LevelBlueprint.build(self.orig_bp.name(),
@@ -2400,14 +2500,7 @@ class LevelEditGameScene(_BaseGameScene):
                                                directory=self.orig_bp.directory)
 
     def get_specs_at(self, world_xy):
-        res = []
-        for spec in self.all_spec_blobs:
-            r = blueprints.SpecUtils.get_rect(spec, default_size=gs.get_instance().cell_size)
-            if r is None:
-                continue
-            elif util.rect_contains(r, world_xy):
-                res.append(spec)
-        return res
+        return [self.specs.get(spec_id) for spec_id in self.specs.ids_at(world_xy)]
 
     def save_to_disk(self, force_new_id=False):
         bp_to_save = self.build_current_bp()
@@ -2450,6 +2543,7 @@ class LevelEditGameScene(_BaseGameScene):
         super().setup_new_world(bp)
         self.get_world().set_is_being_edited(True)
         self._refresh_entities()
+        self.specs.consume_changed_ids()  # the new world is already up to date
 
         self.get_world_view().set_free_camera(True)
 
@@ -2458,23 +2552,63 @@ class LevelEditGameScene(_BaseGameScene):
         if camera_zoom is not None:
             self.get_world_view().set_zoom(camera_zoom)
 
-    def _refresh_entities(self):
-        self.entities_for_specs.clear()
+    def _build_world(self, bp):
+        # built from the editor's own specs (rather than the blueprint's), so it knows which entities came from which
+        # spec, and can patch them when the specs change (see _update_world).
+        self.entities_for_spec_ids.clear()
+        world = worlds.World(bp=bp)
+        for spec_id in self.specs.all_ids():
+            self.entities_for_spec_ids[spec_id] = blueprints.build_spec_into_world(self.specs.get(spec_id), world)
+        world.set_safe_zones(blueprints.calc_safe_zones(world))
+        return world
+
+    def _update_world(self):
+        """Applies the specs that changed since the last call to the live world, instead of rebuilding it."""
+        changed_ids = self.specs.consume_changed_ids()
+        world = self.get_world()
+        if world is None:
+            self.setup_new_world(self.build_current_bp())
+            return
+        elif len(changed_ids) == 0:
+            return
 
-        for ent in self.get_world().all_entities():
-            spec = ent.get_spec()
+        affects_safe_zones = False
+        for spec_id in changed_ids:
+            for ent in self.entities_for_spec_ids.pop(spec_id, ()):
+                affects_safe_zones |= ent.is_block() or ent.is_camera_bound_marker()
+                if ent.get_world() is world:
+                    world.remove_entity(ent, next_update=False)
+
+            spec = self.specs.get(spec_id)
             if spec is not None:
-                as_key = util.to_key(spec)
-                if as_key not in self.entities_for_specs:
-                    self.entities_for_specs[as_key] = []
-                self.entities_for_specs[as_key].append(ent)
-
-            if util.to_key(spec) in self.selected_specs:
-                ent.set_color_override(self._get_selected_entity_color(ent))
-                ent.set_selected_in_editor(True)
-            else:
-                ent.set_color_override(None)
-                ent.set_selected_in_editor(False)
+                new_ents = blueprints.build_spec_into_world(spec, world)
+                self.entities_for_spec_ids[spec_id] = new_ents
+                for ent in new_ents:
+                    affects_safe_zones |= ent.is_block() or ent.is_camera_bound_marker()
+                self._update_entity_colors(spec_id)
+
+        world.mark_blueprint_stale(self.build_current_bp)  # it's O(n), so only built if it's needed
+        if affects_safe_zones:
+            world.set_safe_zones(blueprints.calc_safe_zones(world))
+
+    def _set_entity_selected(self, ent, selected):
+        if selected:
+            ent.set_color_override(self._get_selected_entity_color(ent))
+            ent.set_selected_in_editor(True)
+        else:
+            ent.set_color_override(None)
+            ent.set_selected_in_editor(False)
+
+    def _update_entity_colors(self, spec_id):
+        if spec_id in self.entities_for_spec_ids:
+            for ent in self.entities_for_spec_ids[spec_id]:
+                self._set_entity_selected(ent, spec_id in self.selected_specs)
+
+    def _refresh_entities(self):
+        for ent in self.get_world().all_entities():
+            self._set_entity_selected(ent, False)
+        for spec_id in self.entities_for_spec_ids:
+            self._update_entity_colors(spec_id)
 
     def update(self):
         if inputs.get_instance().was_pressed(keybinds.get_instance().get_keys(const.RESET)):
@@ -2589,21 +2723,26 @@ class LevelEditGameScene(_BaseGameScene):
             self.mouse_mode.handle_click_at(world_xy, button=button)
 
     def is_selected(self, spec):
-        return util.to_key(spec) in self.selected_specs
+        return self.specs.get_id(spec) in self.selected_specs
 
     def deselect_all(self):
         all_selects = [s for s in self.selected_specs]
-        for s in all_selects:
-            self.set_selected(s, select=False)
+        for spec_id in all_selects:
+            self.set_selected_id(spec_id, select=False)
 
     def select_all(self, in_rect=None):
-        for s in self.all_spec_blobs:
-            if in_rect is None:
-                self.set_selected(s, select=True)
-            else:
-                spec_rect = blueprints.SpecUtils.get_rect(s)
+        if in_rect is None:
+            to_select = self.specs.all_ids()
+        else:
+            # the index narrows it down, but the final check is the same one rect-selection has always used
+            # (rather than the index's rects, which are padded out to a cell for specs with no size).
+            to_select = []
+            for spec_id in self.specs.ids_in_rect(in_rect):
+                spec_rect = blueprints.SpecUtils.get_rect(self.specs.get(spec_id))
                 if spec_rect is not None and util.rects_intersect(in_rect, spec_rect):
-                    self.set_selected(s, select=True)
+                    to_select.append(spec_id)
+        for spec_id in to_select:
+            self.set_selected_id(spec_id, select=True)
 
     def _get_selected_entity_color(self, ent):
         color_id = ent.get_color_id()
@@ -2613,23 +2752,19 @@ class LevelEditGameScene(_BaseGameScene):
             return colors.darken(ent.get_color(ignore_override=True), 0.30)
 
     def set_selected(self, spec, select=True):
-        if spec is None:
+        """spec: one of the specs in the editor (not just an equal one)."""
+        self.set_selected_id(self.specs.get_id(spec), select=select)
+
+    def set_selected_id(self, spec_id, select=True):
+        if spec_id is None:
             return
-        else:
-            key = util.to_key(spec)
-            if select:
-                self.selected_specs.add(key)
-                if key in self.entities_for_specs:
-                    for ent in self.entities_for_specs[key]:
-                        ent.set_color_override(self._get_selected_entity_color(ent))
-                        ent.set_selected_in_editor(True)
-            else:
-                if key in self.selected_specs:
-                    self.selected_specs.remove(key)
-                if key in self.entities_for_specs:
-                    for ent in self.entities_for_specs[key]:
-                        ent.set_color_override(None)
-                        ent.set_selected_in_editor(False)
+        elif select:
+            if spec_id not in self.specs:
+                return
+            self.selected_specs.add(spec_id)
+        elif spec_id in self.selected_specs:
+            self.selected_specs.remove(spec_id)
+        self._update_entity_colors(spec_id)
 
     def all_sprites(self):
         for spr in super().all_sprites():
@@ -2692,30 +2827,18 @@ class LevelEditGameScene(_BaseGameScene):
         if spec_to_spawn is not None and xy is not None:
             spec_to_spawn = blueprints.SpecUtils.set_xy(spec_to_spawn, xy)
 
-            self.all_spec_blobs.append(spec_to_spawn)
+            self.specs.add(spec_to_spawn)
             self.stamp_current_state()
-            self.setup_new_world(self.build_current_bp())
+            self._update_world()
 
     def spawn_object_at(self, spec_type, xy):
         spec_blob = spec_type.get_default_blob()
         if spec_blob is not None and xy is not None:
             spec_to_spawn = blueprints.SpecUtils.set_xy(spec_blob, xy)
 
-            self.all_spec_blobs.append(spec_to_spawn)
+            self.specs.add(spec_to_spawn)
             self.stamp_current_state()
-            self.setup_new_world(self.build_current_bp())
-
-
-class EditEvent:
-    def __init__(self, old_state, new_state):
-        self.old_state = old_state
-        self.new_state = new_state
-
-
-class EditorState:
-    def __init__(self, all_specs, selected_specs):
-        self.all_specs = all_specs
-        self.selected_specs = selected_specs
+            self._update_world()
 
 
 class MouseMode:
@@ -4,9 +4,15 @@ import traceback
 import os
 import random
 import re
-from collections import deque
+import json
+import hashlib
+import weakref
+from collections import deque, OrderedDict
 import typing
 
+import pygame
+import numpy
+
 import src.engine.scenes as scenes
 import src.game.blueprints as blueprints
 import src.game.worldview as worldview
@@ -17,10 +23,13 @@ import src.engine.sounds as sounds
 import src.game.globalstate as gs
 import src.engine.renderengine as renderengine
 import src.engine.spritesheets as spritesheets
+import src.engine.startupreport as startupreport
+import src.engine.qualitygovernor as qualitygovernor
 import src.game.const as const
 import configs as configs
 import src.game.debug as debug
 import src.utils.util as util
+import src.utils.threadutils as threadutils
 import src.game.ui as ui
 import src.game.spriteref as spriteref
 import src.game.colors as colors
@@ -401,6 +410,11 @@ class OverworldPack:
 
     @staticmethod
     def load_from_dir(path):
+        with startupreport.phase("level index"):
+            return OverworldPack._load_from_dir(path)
+
+    @staticmethod
+    def _load_from_dir(path):
         try:
             print("INFO: loading overworld pack from {}".format(path))
 
@@ -1280,9 +1294,10 @@ class LevelPreviewElement(ui.UiElement):
         self._size = (188, 100)
 
         self.bg_border_sprite = None
+        self.static_preview_sprite = None  # everything that doesn't move, pre-rendered (see _LevelPreviewCache)
 
         self._current_bp = None
-        self._preview_sprites = []
+        self._preview_sprites = []  # the things that do move
 
         cs = gs.get_instance().cell_size
         self._vis_rect_in_level = [0, 0, 30 * cs, 15 * cs]
@@ -1292,9 +1307,24 @@ class LevelPreviewElement(ui.UiElement):
             self._current_bp = bp
             self._preview_sprites = None
 
+    def prefetch_bp(self, bp: blueprints.LevelBlueprint):
+        """Starts rendering a level's static preview in the background, so it's ready if the level gets shown."""
+        if bp is not None:
+            get_level_preview_cache().prefetch(bp, self._vis_rect_in_level, self._get_canvas_size())
+
     def set_size(self, size):
         self._size = size
 
+    def _get_inner_rect(self):
+        rect = self.get_rect(absolute=True)
+        border_thickness = spriteref.overworld_sheet().border_thin[0].size()
+        return util.rect_expand(rect, left_expand=-border_thickness[0], right_expand=-border_thickness[0],
+                                up_expand=-border_thickness[1], down_expand=-border_thickness[1])
+
+    def _get_canvas_size(self):
+        inner_rect = self._get_inner_rect()
+        return (int(inner_rect[2]), int(inner_rect[3]))
+
     def update(self):
         rect = self.get_rect(absolute=True)
 
@@ -1302,24 +1332,33 @@ class LevelPreviewElement(ui.UiElement):
         if self.bg_border_sprite is None:
             self.bg_border_sprite = sprites.BorderBoxSprite(spriteref.UI_BG_LAYER, rect, all_borders=border_to_use,
                                                             hollow_center=True)
-        border_thickness = border_to_use[0].size()
-        inner_rect = util.rect_expand(rect, left_expand=-border_thickness[0], right_expand=-border_thickness[0],
-                                      up_expand=-border_thickness[1], down_expand=-border_thickness[1])
+        inner_rect = self._get_inner_rect()
         self.bg_border_sprite.update(new_rect=inner_rect, new_depth=5, new_color=colors.WHITE)
 
         if self._preview_sprites is None:
             self._preview_sprites = []
             if self._current_bp is not None:
                 for (blob, spec) in self._current_bp.all_entities():
-                    self._preview_sprites.append(_EntityPreview(blob, spec))
-            to_remove = []
-            for preview in self._preview_sprites:
-                preview.update_sprites(self._vis_rect_in_level, inner_rect, gs.get_instance().tick_count())
-                if len([s for s in preview.all_sprites()]) == 0:
-                    to_remove.append(preview)  # remove things that are offscreen (or have no sprites)
+                    preview = _EntityPreview(blob, spec)
+                    # static stuff is in the pre-rendered image, and things that never come into view can be skipped
+                    if preview.is_animated() and preview.can_ever_be_visible(self._vis_rect_in_level):
+                        self._preview_sprites.append(preview)
+
+        static_model = None
+        if self._current_bp is not None:
+            static_model = get_level_preview_cache().get_model(self._current_bp, self._vis_rect_in_level,
+                                                               self._get_canvas_size())
+        if static_model is None:
+            self.static_preview_sprite = None
         else:
-            for preview in self._preview_sprites:
-                preview.update_sprites(self._vis_rect_in_level, inner_rect, gs.get_instance().tick_count())
+            if self.static_preview_sprite is None:
+                self.static_preview_sprite = sprites.ImageSprite(static_model, 0, 0, spriteref.LEVEL_PREVIEW_LAYER)
+            self.static_preview_sprite = self.static_preview_sprite.update(new_model=static_model,
+                                                                           new_x=inner_rect[0], new_y=inner_rect[1],
+                                                                           new_color=colors.WHITE)
+
+        for preview in self._preview_sprites:
+            preview.update_sprites(self._vis_rect_in_level, inner_rect, gs.get_instance().tick_count())
 
     def get_size(self):
         return self._size
@@ -1328,6 +1367,8 @@ class LevelPreviewElement(ui.UiElement):
         if self.bg_border_sprite is not None:
             for spr in self.bg_border_sprite.all_sprites():
                 yield spr
+        if self.static_preview_sprite is not None:
+            yield self.static_preview_sprite
         if self._preview_sprites is not None:
             for preview in self._preview_sprites:
                 for spr in preview.all_sprites():
@@ -1345,6 +1386,9 @@ class _EntityPreview():
         blueprints.SpecTypes.MOVING_BLOCK: -10
     }
 
+    RECT = "rect"
+    TRIANGLE = "triangle"
+
     @staticmethod
     def _xform_point(xy, vis_rect_in_level, canvas_rect):
         x_new = (xy[0] - vis_rect_in_level[0]) * canvas_rect[2] / vis_rect_in_level[2] + canvas_rect[0]
@@ -1359,7 +1403,23 @@ class _EntityPreview():
         xy2 = _EntityPreview._xform_point((world_rect[0] + world_rect[2], world_rect[1] + world_rect[3]), vis_rect_in_level, canvas_rect)
         return [xy1[0], xy1[1], xy2[0] - xy1[0], xy2[1] - xy1[1]]
 
-    def update_sprites(self, vis_rect_in_level, canvas, tick):
+    def is_animated(self):
+        """Whether the entity's preview changes over time (i.e. it moves along a path)."""
+        return (self.spec_type in (blueprints.SpecTypes.MOVING_BLOCK, blueprints.SpecTypes.SPIKES)
+                and len(util.listify(self.blob.get(blueprints.POINTS, []))) > 0)
+
+    def can_ever_be_visible(self, vis_rect_in_level):
+        rect = blueprints.SpecUtils.get_rect(self.blob)
+        if rect is None:
+            return False
+        elif self.is_animated():
+            rects = [[p[0], p[1], rect[2], rect[3]] for p in util.listify(self.blob[blueprints.POINTS])]
+            rect = util.rect_union([rect] + rects)
+        return util.rects_intersect(rect, vis_rect_in_level)
+
+    def calc_shapes(self, vis_rect_in_level, canvas, tick):
+        """returns: list of (RECT or TRIANGLE, rect or points, color, depth), in canvas coordinates."""
+        res = []
         color = blueprints.SpecUtils.get_preview_color(self.blob)
         depth = _EntityPreview.DEPTH_OVERRIDES[self.spec_type] if self.spec_type in _EntityPreview.DEPTH_OVERRIDES else 0
 
@@ -1374,11 +1434,8 @@ class _EntityPreview():
                 down_expand = -1 if rect_in_canvas[1] + rect_in_canvas[3] < canvas[1] + canvas[3] else 0
                 right_expand = -1 if rect_in_canvas[0] + rect_in_canvas[2] < canvas[0] + canvas[2] else 0
                 rect_in_canvas = util.rect_expand(rect_in_canvas, down_expand=down_expand, right_expand=right_expand)
+                res.append((_EntityPreview.RECT, rect_in_canvas, color, depth))
 
-                util.extend_or_empty_list_to_length(self.sprites, 1, creator=lambda: sprites.RectangleSprite(spriteref.POLYGON_ULTRA_OMEGA_TOP_LAYER))
-                self.sprites[0] = self.sprites[0].update(new_rect=rect_in_canvas, new_color=color, new_depth=depth)
-            else:
-                self.sprites.clear()
         elif self.spec_type == blueprints.SpecTypes.SLOPE_BLOCK_QUAD:
             world_triangle, world_rect = self.spec_type.get_triangle_and_rect(self.blob, with_xy_offset=True)
             triangle_right = any([p[0] > world_rect[0] + world_rect[2] for p in world_triangle])
@@ -1386,39 +1443,28 @@ class _EntityPreview():
             triangle_down = any([p[1] > world_rect[1] + world_rect[3] for p in world_triangle])
             triangle_up = any([p[1] < world_rect[1] for p in world_triangle])
 
-            rect_in_level = util.rects_intersect(world_rect, vis_rect_in_level)
-            tri_in_level = util.rect_intersects_triangle(vis_rect_in_level, world_triangle)
-
-            if rect_in_level or tri_in_level:
-                util.extend_or_empty_list_to_length(self.sprites, 2, creator=lambda: None)
-                if self.sprites[0] is None:
-                    self.sprites[0] = sprites.RectangleSprite(spriteref.POLYGON_ULTRA_OMEGA_TOP_LAYER)
-                if self.sprites[1] is None:
-                    self.sprites[1] = sprites.TriangleSprite(spriteref.POLYGON_ULTRA_OMEGA_TOP_LAYER)
-
-                if rect_in_level:
-                    rect_in_canvas = _EntityPreview._stretch_rect_to_fit(world_rect, vis_rect_in_level, canvas)
-                    down_expand = -1 if not triangle_down and rect_in_canvas[1] + rect_in_canvas[3] < canvas[1] + canvas[3] else 0
-                    right_expand = -1 if not triangle_right and rect_in_canvas[0] + rect_in_canvas[2] < canvas[0] + canvas[2] else 0
-                    rect_in_canvas = util.rect_expand(rect_in_canvas, down_expand=down_expand, right_expand=right_expand)
-                    self.sprites[0].update(new_rect=rect_in_canvas, new_color=color, new_depth=depth)
-
-                if tri_in_level:
-                    canvas_triangle = [_EntityPreview._xform_point(p, vis_rect_in_level, canvas) for p in world_triangle]
-                    bounding_rect = util.get_rect_containing_points(canvas_triangle, inclusive=True)
-                    if triangle_up:
-                        down_expand = 0
-                    else:
-                        down_expand = -1 if bounding_rect[1] + bounding_rect[3] < canvas[1] + canvas[3] else 0
-                    if triangle_left:
-                        right_expand = 0
-                    else:
-                        right_expand = -1 if bounding_rect[0] + bounding_rect[2] < canvas[0] + canvas[2] else -1
-                    bounding_rect = util.rect_expand(bounding_rect, down_expand=down_expand, right_expand=right_expand)
-                    canvas_triangle = [util.constrain_point_to_rect(bounding_rect, p) for p in canvas_triangle]
-                    self.sprites[1] = self.sprites[1].update(new_points=canvas_triangle, new_color=color, new_depth=depth)
-            else:
-                self.sprites.clear()
+            if util.rects_intersect(world_rect, vis_rect_in_level):
+                rect_in_canvas = _EntityPreview._stretch_rect_to_fit(world_rect, vis_rect_in_level, canvas)
+                down_expand = -1 if not triangle_down and rect_in_canvas[1] + rect_in_canvas[3] < canvas[1] + canvas[3] else 0
+                right_expand = -1 if not triangle_right and rect_in_canvas[0] + rect_in_canvas[2] < canvas[0] + canvas[2] else 0
+                rect_in_canvas = util.rect_expand(rect_in_canvas, down_expand=down_expand, right_expand=right_expand)
+                res.append((_EntityPreview.RECT, rect_in_canvas, color, depth))
+
+            if util.rect_intersects_triangle(vis_rect_in_level, world_triangle):
+                canvas_triangle = [_EntityPreview._xform_point(p, vis_rect_in_level, canvas) for p in world_triangle]
+                bounding_rect = util.get_rect_containing_points(canvas_triangle, inclusive=True)
+                if triangle_up:
+                    down_expand = 0
+                else:
+                    down_expand = -1 if bounding_rect[1] + bounding_rect[3] < canvas[1] + canvas[3] else 0
+                if triangle_left:
+                    right_expand = 0
+                else:
+                    right_expand = -1 if bounding_rect[0] + bounding_rect[2] < canvas[0] + canvas[2] else -1
+                bounding_rect = util.rect_expand(bounding_rect, down_expand=down_expand, right_expand=right_expand)
+                canvas_triangle = [util.constrain_point_to_rect(bounding_rect, p) for p in canvas_triangle]
+                res.append((_EntityPreview.TRIANGLE, canvas_triangle, color, depth))
+
         elif self.spec_type == blueprints.SpecTypes.SPIKES:
             world_rect = blueprints.SpecUtils.get_rect(self.blob, at_tick=tick)
 
@@ -1426,8 +1472,6 @@ class _EntityPreview():
                 rect_in_canvas = _EntityPreview._stretch_rect_to_fit(world_rect, vis_rect_in_level, canvas)
 
                 spike_dims = (world_rect[2] // 8, world_rect[3] // 8)
-                util.extend_or_empty_list_to_length(self.sprites, spike_dims[0] * spike_dims[1],
-                                                    creator=lambda: sprites.RectangleSprite(spriteref.POLYGON_ULTRA_OMEGA_TOP_LAYER))
                 for i in range(0, spike_dims[0] * spike_dims[1]):
                     spike_x = i % spike_dims[0]
                     spike_y = i // spike_dims[0]
@@ -1441,15 +1485,132 @@ class _EntityPreview():
                     spike_rect = util.rect_expand(spike_rect,
                                                   right_expand=-w / 4, left_expand=-w / 4,
                                                   up_expand=-h / 4, down_expand=-h / 4)
-                    self.sprites[i] = self.sprites[i].update(new_rect=spike_rect, new_color=color, new_depth=depth)
+                    res.append((_EntityPreview.RECT, spike_rect, color, depth))
+
+        return res
+
+    def update_sprites(self, vis_rect_in_level, canvas, tick):
+        shapes = self.calc_shapes(vis_rect_in_level, canvas, tick)
+        util.extend_or_empty_list_to_length(self.sprites, len(shapes), creator=lambda: None)
+
+        for i, (shape_type, geom, color, depth) in enumerate(shapes):
+            if shape_type == _EntityPreview.RECT:
+                if not isinstance(self.sprites[i], sprites.RectangleSprite):
+                    self.sprites[i] = sprites.RectangleSprite(spriteref.POLYGON_ULTRA_OMEGA_TOP_LAYER)
+                self.sprites[i] = self.sprites[i].update(new_rect=geom, new_color=color, new_depth=depth)
             else:
-                self.sprites.clear()
+                if not isinstance(self.sprites[i], sprites.TriangleSprite):
+                    self.sprites[i] = sprites.TriangleSprite(spriteref.POLYGON_ULTRA_OMEGA_TOP_LAYER)
+                self.sprites[i] = self.sprites[i].update(new_points=geom, new_color=color, new_depth=depth)
 
     def all_sprites(self):
         for spr in self.sprites:
             yield spr
 
 
+def _render_static_preview(entity_previews, vis_rect_in_level, size) -> pygame.Surface:
+    """Draws the previews into a new surface (at tick 0). Safe to call off the main thread."""
+    surface = pygame.Surface(size, pygame.SRCALPHA)
+    canvas = [0, 0, size[0], size[1]]
+
+    shapes = []
+    for preview in entity_previews:
+        shapes.extend(preview.calc_shapes(vis_rect_in_level, canvas, 0))
+    shapes.sort(key=lambda shape: -shape[3])  # same order the polygon layer would draw them in
+
+    for (shape_type, geom, color, _) in shapes:
+        int_color = colors.to_int(*color)
+        if shape_type == _EntityPreview.RECT:
+            x1, y1 = round(geom[0]), round(geom[1])
+            x2, y2 = round(geom[0] + geom[2]), round(geom[1] + geom[3])
+            if x2 > x1 and y2 > y1:
+                surface.fill(int_color, (x1, y1, x2 - x1, y2 - y1))
+        else:
+            pygame.draw.polygon(surface, int_color, [(round(p[0]), round(p[1])) for p in geom])
+
+    return surface
+
+
+class _LevelPreviewCache:
+    """
+        Pre-rendered images of levels' static content (everything except moving blocks and spikes), for the
+        overworld's level preview. Images are rendered on a background thread and uploaded into their own texture
+        pages, keyed by (level_id, content hash, visible rect, size), so edited levels get new images.
+    """
+
+    MAX_IMAGES = 24
+
+    def __init__(self):
+        self._models = OrderedDict()  # key -> ImageModel, least recently used first
+        self._pending = {}  # key -> Future (of Surface, or None if it failed)
+        self._failed = set()  # keys that couldn't be rendered, so they aren't retried every frame
+        self._content_hashes = weakref.WeakKeyDictionary()  # LevelBlueprint -> str
+
+    def _get_content_hash(self, bp):
+        if bp not in self._content_hashes:
+            entity_json = json.dumps(bp.json_blob.get(blueprints.ENTITIES, []), sort_keys=True)
+            self._content_hashes[bp] = hashlib.md5(entity_json.encode("utf-8")).hexdigest()
+        return self._content_hashes[bp]
+
+    def _get_key(self, bp, vis_rect_in_level, size):
+        return (bp.level_id(), self._get_content_hash(bp), tuple(vis_rect_in_level), tuple(size))
+
+    def prefetch(self, bp, vis_rect_in_level, size):
+        key = self._get_key(bp, vis_rect_in_level, size)
+        if key not in self._models and key not in self._pending and key not in self._failed:
+            previews = [_EntityPreview(blob, spec) for (blob, spec) in bp.all_entities()]
+            previews = [p for p in previews if not p.is_animated()]
+            vis_rect_in_level = list(vis_rect_in_level)
+            self._pending[key] = threadutils.do_work_on_background_thread(
+                lambda: _LevelPreviewCache._render(previews, vis_rect_in_level, size))
+
+    @staticmethod
+    def _render(previews, vis_rect_in_level, size):
+        try:
+            return _render_static_preview(previews, vis_rect_in_level, size)
+        except Exception:
+            print("ERROR: failed to render level preview")
+            traceback.print_exc()
+            return None
+
+    def get_model(self, bp, vis_rect_in_level, size) -> sprites.ImageModel:
+        """returns: the level's static preview image, or None if it's still being rendered (or can't be)."""
+        key = self._get_key(bp, vis_rect_in_level, size)
+        if key in self._models:
+            self._models.move_to_end(key)
+            return self._models[key]
+        elif key in self._failed:
+            return None
+
+        self.prefetch(bp, vis_rect_in_level, size)
+        fut = self._pending[key]
+        if not fut.is_done():
+            return None
+
+        del self._pending[key]
+        surface = fut.get_val()
+        if surface is None:
+            self._failed.add(key)
+            return None
+
+        page_id = "level_preview:{}".format(key)
+        renderengine.get_instance().set_texture_page(page_id, surface)
+        self._models[key] = sprites.ImageModel(0, 0, size[0], size[1], texture_size=size, texture_page=page_id)
+
+        while len(self._models) > _LevelPreviewCache.MAX_IMAGES:
+            old_key, _ = self._models.popitem(last=False)
+            renderengine.get_instance().remove_texture_page("level_preview:{}".format(old_key))
+
+        return self._models[key]
+
+
+_LEVEL_PREVIEW_CACHE = _LevelPreviewCache()
+
+
+def get_level_preview_cache() -> _LevelPreviewCache:
+    return _LEVEL_PREVIEW_CACHE
+
+
 class OverworldInfoPanelElement(ui.UiElement):
 
     def __init__(self, state: OverworldState):
@@ -1466,6 +1627,17 @@ class OverworldInfoPanelElement(ui.UiElement):
         self.level_preview_panel_element = self.add_child(LevelPreviewElement())
         self.options_element = self.add_child(ui.OptionsList())
 
+        self._last_node_shown = None
+
+    def _prefetch_neighboring_previews(self, node):
+        # the cursor is probably going to one of these next, so get their previews ready
+        grid = self.state.get_grid()
+        for direction in ((0, -1), (1, 0), (0, 1), (-1, 0)):
+            neighbor = grid.get_connected_node_in_dir(node.get_xy(), direction)
+            if neighbor is not None and isinstance(neighbor, OverworldGrid.LevelNode):
+                _, _, neighbor_bp = neighbor.get_level_info(self.state)
+                self.level_preview_panel_element.prefetch_bp(neighbor_bp)
+
     def get_node_to_show(self):
         if self.state.cell_under_mouse is not None:
             node = self.state.get_grid().get_node(self.state.cell_under_mouse)
@@ -1555,6 +1727,9 @@ class OverworldInfoPanelElement(ui.UiElement):
             level_num, level_id, level_bp = (None, None, None)
 
         self.level_preview_panel_element.set_bp(level_bp)
+        if node is not None and node != self._last_node_shown:
+            self._last_node_shown = node
+            self._prefetch_neighboring_previews(node)
 
         desc_text = self.get_description_text()
         if desc_text is None:
@@ -1608,7 +1783,10 @@ class OverworldScene(scenes.Scene):
         scenes.Scene.__init__(self)
         self.state = state
 
-        self.bg_triangle_sprites = [[] for _ in range(0, 9)]
+        self.bg_triangle_sprites = []
+        self.bg_triangle_group = sprites.SpriteGroup(sprite_provider=lambda: self.bg_triangle_sprites)
+        self._bg_mesh = None         # (OverworldBlueprint, base points array, anchor idx array)
+        self._bg_mesh_state = None   # the inputs the sprites were last positioned with
 
         self.grid_ui_element = OverworldGridElement(self.state)
         self.info_panel_element = OverworldInfoPanelElement(self.state)
@@ -1651,9 +1829,9 @@ class OverworldScene(scenes.Scene):
         yield self.sector_info_text_bg_sprite
         if self.fade_overlay is not None:
             yield self.fade_overlay
-        for l in self.bg_triangle_sprites:
-            for spr in l:
-                yield spr
+
+    def all_sprite_groups(self):
+        yield self.bg_triangle_group
 
     def get_sector_info_text(self):
         name = self.state.current_overworld.name
@@ -1915,11 +2093,37 @@ class OverworldScene(scenes.Scene):
                 return True
         return False
 
+    def _build_bg_mesh(self, overworld_bp):
+        # the triangles never change shape, only the anchors they're attached to move
+        base_points = []
+        anchor_idxs = []
+        self.bg_triangle_sprites = []
+        for i in range(0, 9):
+            for j, (p1, p2, p3, color) in enumerate(overworld_bp.bg_triangles[i]):
+                base_points.append((p1, p2, p3))
+                anchor_idxs.append(i)
+                self.bg_triangle_sprites.append(sprites.TriangleSprite(spriteref.POLYGON_UI_BG_LAYER,
+                                                                       color=color, depth=j))
+        self._bg_mesh = (overworld_bp,
+                         numpy.array(base_points, dtype=int).reshape((len(base_points), 3, 2)),
+                         numpy.array(anchor_idxs, dtype=int))
+
     def _update_bg_triangles(self):
         size = renderengine.get_instance().get_game_size()
         size = (size[0] - self.info_panel_element.get_size()[0], size[1])
 
         fade_pcnt = self._get_fade_prog()
+        if qualitygovernor.is_reduced(qualitygovernor.Reductions.BG_ANIMATION):
+            # animate in a few coarse steps, instead of moving every triangle on every tick
+            fade_pcnt = round(fade_pcnt * 4) / 4
+
+        mesh_state = (self.state.current_overworld, size, fade_pcnt)
+        if mesh_state == self._bg_mesh_state:
+            return  # nothing has moved
+        self._bg_mesh_state = mesh_state
+
+        if self._bg_mesh is None or self._bg_mesh[0] is not self.state.current_overworld:
+            self._build_bg_mesh(self.state.current_overworld)
 
         anchors = [
             (0, 0), (size[0] // 2, 0), (size[0], 0),
@@ -1933,18 +2137,13 @@ class OverworldScene(scenes.Scene):
             v = util.set_length(util.sub(anchors[i], center_pt), max_zoom_dist * (fade_pcnt ** 2))
             anchors[i] = util.round_vec(util.add(anchors[i], v))
 
-        for i in range(0, 9):
-            bp_tri_list = self.state.current_overworld.bg_triangles[i]
-            util.extend_or_empty_list_to_length(self.bg_triangle_sprites[i], len(bp_tri_list),
-                                                lambda: sprites.TriangleSprite(spriteref.POLYGON_UI_BG_LAYER))
-            for j in range(0, len(bp_tri_list)):
-                p1 = util.add(anchors[i], bp_tri_list[j][0])
-                p2 = util.add(anchors[i], bp_tri_list[j][1])
-                p3 = util.add(anchors[i], bp_tri_list[j][2])
-
-                color = bp_tri_list[j][3]
-                self.bg_triangle_sprites[i][j] = self.bg_triangle_sprites[i][j].update(new_p1=p1, new_p2=p2, new_p3=p3,
-                                                                                       new_color=color, new_depth=j)
+        _, base_points, anchor_idxs = self._bg_mesh
+        all_points = (base_points + numpy.array(anchors, dtype=int)[anchor_idxs][:, None, :]).tolist()
+        for k in range(0, len(self.bg_triangle_sprites)):
+            p1, p2, p3 = all_points[k]
+            self.bg_triangle_sprites[k] = self.bg_triangle_sprites[k].update(new_p1=tuple(p1), new_p2=tuple(p2),
+                                                                             new_p3=tuple(p3))
+        self.bg_triangle_group.mark_changed()
 
 
 if __name__ == "__main__":
@@ -74,6 +74,10 @@ class PlayerType:
     def get_letter(self):
         return self.get_name()
 
+    def all_sound_overrides(self):
+        """returns: the sounds this player type plays instead of the defaults."""
+        return list(self._sound_mappings.values())
+
     def translate_sound(self, sound_id):
         if isinstance(sound_id, list):
             effect_path, _ = sounds.resolve_path_and_volume(sound_id)
@@ -6,6 +6,7 @@ import traceback
 import src.game.globalstate as gs
 
 import src.utils.util as util
+import src.utils.threadutils as threadutils
 
 
 _INSTANCE = None
@@ -27,27 +28,97 @@ class MultiChannelSong:
         # XXX don't want to actually initialize these until the song is actually about to start
         # (and presumably other channels are silent) because calling pygame.Sound(...) with large
         # audio files seems to cause other active Sounds to glitch for a moment (they like, go silent)
-        self._sounds_are_actually_loaded = False
+        # so the decoding is done on a background thread instead, see prefetch().
+        self._sounds_are_actually_loaded = len(filenames) == 0
         self._sounds = [None for _ in filenames]
 
+        self._load_future = None
+        self._ready_callbacks = []
+
         self._master_volume = 1
         self._adjusted_volume = adjusted_volume  # some songs are intrinsically louder than others and need some EQ
         self._volumes = [1 for _ in range(0, len(self._sounds))]
 
         self._playing = False
 
-    def _actually_load_sounds(self):
-        self._sounds_are_actually_loaded = True
-        self._sounds = [pygame.mixer.Sound(f) for f in self.filenames]
+    def _decode_sounds(self):
+        """Creates the song's Sounds. This is the slow part, and it's safe to call from a background thread."""
+        sounds = [pygame.mixer.Sound(f) for f in self.filenames]
 
         # This system won't work at all if the lengths aren't **exactly** the same.
         # TODO none of the songs are actually multi-track anymore, so this can probably be nuked
         lengths = set()
-        for s in self._sounds:
+        for s in sounds:
             lengths.add(s.get_length())
         if len(lengths) > 1:
             raise ValueError("song's channels have different lengths: {}".format(lengths))
 
+        return sounds
+
+    def _finish_loading(self, sounds):
+        if sounds is None:
+            # the background thread already printed the traceback
+            print("ERROR: failed to decode song {}, it'll be silent instead".format(self.song_id))
+            sounds = []
+        self._sounds = sounds
+        self._sounds_are_actually_loaded = True
+        self._load_future = None
+        _mark_resident(self)
+
+        callbacks = self._ready_callbacks
+        self._ready_callbacks = []
+        for c in callbacks:
+            c(self)
+
+    def _actually_load_sounds(self):
+        if self._sounds_are_actually_loaded:
+            return
+        elif self._load_future is not None:
+            # already decoding in the background, just block until it's done
+            self._finish_loading(self._load_future.wait(poll_rate_secs=0.005))
+        else:
+            try:
+                sounds = self._decode_sounds()
+            except Exception:
+                traceback.print_exc()
+                sounds = None
+            self._finish_loading(sounds)
+
+    def prefetch(self, callback=None):
+        """Starts decoding the song's channels on a background thread, if they aren't loaded already.
+            callback: optional (song) -> None, called on the main thread once the song is ready to play.
+        """
+        if self.is_loaded():
+            if callback is not None:
+                callback(self)
+            return
+
+        if callback is not None:
+            self._ready_callbacks.append(callback)
+        if self._load_future is None:
+            print("INFO: decoding song in background: {}".format(self.song_id))
+            self._load_future = threadutils.do_decode_work_on_background_thread(self._decode_sounds)
+
+    def is_loading(self):
+        return self._load_future is not None and not self.is_loaded()
+
+    def is_loaded(self):
+        """returns: whether the song can be started without blocking. Also picks up the result of a finished
+            background decode, so this should only be called from the main thread.
+        """
+        if not self._sounds_are_actually_loaded and self._load_future is not None and self._load_future.is_done():
+            self._finish_loading(self._load_future.get_val())
+        return self._sounds_are_actually_loaded
+
+    def unload(self):
+        """Drops the decoded audio so it can be garbage collected. The song will be re-decoded if it's needed again."""
+        if self._playing or not self._sounds_are_actually_loaded or len(self.filenames) == 0:
+            return False
+        print("INFO: unloading song: {}".format(self.song_id))
+        self._sounds = [None for _ in self.filenames]
+        self._sounds_are_actually_loaded = False
+        return True
+
     def __repr__(self):
         return f"{type(self).__name__}({self.song_id}, {self.get_volumes()})"
 
@@ -74,7 +145,7 @@ class MultiChannelSong:
         return res
 
     def num_sounds(self):
-        return len(self._sounds)
+        return len(self._sounds)  # before loading, this is the number of files
 
     def get_volumes(self):
         return self._volumes  # would probably be better to return a copy but ggf
@@ -120,8 +191,9 @@ class MultiChannelSong:
 
     def start(self):
         print("INFO: starting song: {}".format(self.song_id))
-        if not self._sounds_are_actually_loaded:
+        if not self.is_loaded():
             self._actually_load_sounds()
+        _mark_resident(self)
         self._playing = True
         self.update()
         for s in self._sounds:
@@ -226,6 +298,47 @@ def get_default_song_id_for_level(overworld_id, level_pcnt: float=0.0):
 
 _LOADED_SONGS = {}
 
+# decoded songs are big (tens of MB of PCM each), so only the most recently used few are kept around.
+MAX_RESIDENT_SONGS = 3
+_RESIDENT_SONGS = []  # list of MultiChannelSongs, least recently used first
+
+
+def _mark_resident(song):
+    if len(song.filenames) == 0:
+        return  # silence doesn't take up any room
+    if song in _RESIDENT_SONGS:
+        _RESIDENT_SONGS.remove(song)
+    _RESIDENT_SONGS.append(song)
+
+
+def _evict_idle_songs(keep=()):
+    idx = 0
+    while len(_RESIDENT_SONGS) > MAX_RESIDENT_SONGS and idx < len(_RESIDENT_SONGS):
+        song = _RESIDENT_SONGS[idx]
+        if song not in keep and song.unload():
+            _RESIDENT_SONGS.pop(idx)
+        else:
+            idx += 1
+
+
+def _poll_loading_songs():
+    for song in _LOADED_SONGS.values():
+        if song.is_loading():
+            song.is_loaded()  # fires the song's ready-callbacks if it just finished
+
+
+def prefetch_song(song_id, callback=None):
+    """Starts decoding a song in the background so it's ready to go by the time it's needed (e.g. when the next
+        scene starts).
+    :param song_id: id of the song, or (id, volume_levels) tuple
+    :param callback: optional (MultiChannelSong) -> None, called on the main thread once it's ready.
+    """
+    if isinstance(song_id, tuple):
+        song_id = song_id[0]
+    if song_id is None or song_id == CONTINUE_CURRENT:
+        return
+    _get_song_lazily(song_id).prefetch(callback=callback)
+
 
 def _get_song_lazily(song_id, force_load=False) -> MultiChannelSong:
     if song_id not in _LOADED_SONGS:
@@ -261,6 +374,8 @@ class LoopFader:
 
         self._dirty = False  # if true, means a volume refresh is needed
 
+        self._waiting_on_song = None  # song that should be playing but is still being decoded
+
     def current_song(self) -> MultiChannelSong:
         if len(self.song_queue) > 0:
             return self.song_queue[0][0]
@@ -325,7 +440,9 @@ class LoopFader:
         elif song_id is None:
             song_id = SILENCE
 
-        song = _get_song_lazily(song_id, force_load=self.current_song() is None)
+        song = _get_song_lazily(song_id)
+        song.prefetch()  # decodes while the current song fades out
+        self._waiting_on_song = None
 
         if isinstance(volume_levels, int) or isinstance(volume_levels, float):
             volume_levels = [volume_levels] * song.num_sounds()
@@ -369,6 +486,11 @@ class LoopFader:
         elapsed_time_ms = cur_time - self.last_update_time
         self.last_update_time = cur_time
 
+        if self._waiting_on_song is not None:
+            # freeze the queue while the song decodes, so fades start when the song actually does
+            self.song_queue = [(s, v, t + elapsed_time_ms) for (s, v, t) in self.song_queue]
+
+        _poll_loading_songs()
         self._sort_and_refresh_queue(cur_time)
 
         cur_song_info = self.song_queue[0] if len(self.song_queue) >= 1 else None
@@ -418,15 +540,18 @@ class LoopFader:
         if needs_update:
             cur_song.update()
 
-        if do_start:
-            # XXX This call will load the song from disk if it hasn't been yet.
-            # Which can cause a noticeable stutter in the game and mess up the precise
-            # timing we're doing for fading.
-            # TODO We should probably move song loading into a separate thread to prevent the stutter.
+        if not do_start:
+            self._waiting_on_song = None
+        elif not cur_song.is_loaded():
+            # it's still decoding on the background thread, try again next frame
+            cur_song.prefetch()
+            self._waiting_on_song = cur_song
+        else:
+            self._waiting_on_song = None
             cur_song.start()
+            _evict_idle_songs(keep=[s for (s, v, t) in self.song_queue])
 
-            # XXX But we can fix the fading by shifting the entire queue over whenever we start a song :)
-            # it's 5am on a Thursday and we're like 3 days from release
+            # start() can still take a moment, so shift the queue over to keep the fades in sync with the song
             shift = pygame.time.get_ticks() - cur_time
             new_queue = [(s, v, t + shift) for (s, v, t) in self.song_queue]
             self.song_queue.clear()
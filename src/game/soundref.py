@@ -1,5 +1,7 @@
 import re
 
+import src.engine.sounds as sounds
+
 
 _BASE_PATH = "assets/sounds/"
 
@@ -191,5 +193,70 @@ PLAYER_DESYNC = ModernUI.close_or_disable_3
 PLAYER_RESYNC = ModernUI.open_or_enable_3
 
 
+# category -> (max simultaneous voices, priority, effects)
+# a few effects are shared between categories, in which case the first one listed here wins.
+_CATEGORIES = {
+    "menu": (3, 3, [MENU_BLIP, MENU_ACCEPT, MENU_ERROR, MENU_BACK, MENU_START, MENU_SLIDE]),
+    "level": (2, 4, [LEVEL_START, LEVEL_QUIT, LEVEL_FAILED, LEVEL_PARTIAL_SUCCESS, LEVEL_FULL_SUCCESS]),
+    "player": (6, 2, [PLAYER_JUMP, PLAYER_DEATH, PLAYER_DIALOG, DIALOG_EXIT, PLAYER_ALERT, PLAYER_PICKUP,
+                      PLAYER_PUTDOWN, PLAYER_FLY, PLAYER_DESYNC, PLAYER_RESYNC,
+                      TELEPORT, TELEPORT_BLOCKED, TELEPORT_UNBLOCKED]),
+    "block": (4, 1, [BLOCK_BREAK, BLOCK_PRIMED_TO_FALL, SWITCH_ACTIVATED, SWITCH_DEACTIVATED])
+}
+
+
+def _is_sound(val):
+    if isinstance(val, str):
+        return val.startswith(_BASE_PATH)
+    elif isinstance(val, (tuple, list, frozenset, set)) and len(val) > 0:
+        return all(_is_sound(item) or isinstance(item, (int, float)) for item in val) \
+            and any(_is_sound(item) for item in val)
+    else:
+        return False
+
+
+def _all_constants():
+    """returns: every sound effect constant defined in this module (e.g. PLAYER_JUMP)."""
+    return [val for (name, val) in globals().items() if name.isupper() and not name.startswith("_")
+            and _is_sound(val)]
+
+
+def _player_sound_overrides():
+    import src.game.playertypes as playertypes  # it imports this module
+    res = []
+    for ptype in playertypes.PlayerTypes.all_types():
+        res.extend(ptype.all_sound_overrides())
+    return res
+
+
+def get_categories():
+    """returns: category -> (max simultaneous voices, priority, effects). Player types' replacements for the
+        player sounds count as player sounds too.
+    """
+    res = dict(_CATEGORIES)
+    max_voices, priority, effects = res["player"]
+    res["player"] = (max_voices, priority, effects + _player_sound_overrides())
+    return res
+
+
+def all_effects():
+    res = []
+    for (_, _, effects) in get_categories().values():
+        res.extend(effects)
+    res.extend(_all_constants())
+    return res
+
+
+def initialize_sounds():
+    """Sets up the sound effects' polyphony limits and starts loading them in the background."""
+    categories = get_categories()
+    for category in categories:
+        max_voices, priority, effects = categories[category]
+        sounds.set_category_limit(category, max_voices)
+        for effect in effects:
+            sounds.set_category(effect, category, priority=priority)
+    return sounds.preload_sounds(all_effects())
+
+
 if __name__ == "__main__":
     ModernUI._assets_to_code()
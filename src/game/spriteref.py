@@ -21,8 +21,10 @@ ENTITY_LAYER = "entity_layer"
 WORLD_UI_LAYER = "world_ui_layer"
 
 POLYGON_UI_BG_LAYER = "polygon_ui_bg_layer"
+CUTSCENE_LAYER = "cutscene_layer"
 UI_BG_LAYER = "ui_bg_layer"
 UI_FG_LAYER = "ui_fg_layer"
+LEVEL_PREVIEW_LAYER = "level_preview_layer"
 POLYGON_ULTRA_OMEGA_TOP_LAYER = "polygon_ui_fg_layer"
 ULTRA_OMEGA_GAMMA_TOP_IMAGE_LAYER = "actual_top_image_layer"
 
@@ -1016,14 +1018,25 @@ class ThreeDeeModels:
             texture_id = "rainbow"
         return lambda xy: _3D_TEXTURES[texture_id].get_xform_to_atlas()(xy)
 
+    @staticmethod
+    def _get_cache_dir():
+        try:
+            return util.user_data_path(configs.model_cache_dir, forcelocal=configs.use_local_paths)
+        except ValueError:
+            return None  # user data path hasn't been set up, so just don't cache
+
     @staticmethod
     def load_models_from_disk():
         xform = lambda ident: ThreeDeeModels._get_xform_for_texture(ident)
+        cache_dir = ThreeDeeModels._get_cache_dir()
+
+        def load(model_id, path, texture_id):
+            return threedee.ThreeDeeModel.load_from_disk(model_id, path, xform(texture_id), cache_dir=cache_dir)
 
-        ThreeDeeModels.SHIP = threedee.ThreeDeeModel.load_from_disk("ship", "assets/models/ship.obj", xform("ship_texture"))
-        ThreeDeeModels.POINTY_BOX = threedee.ThreeDeeModel.load_from_disk("pointy_box", "assets/models/pointy_box.obj", xform("ship_texture"))
-        ThreeDeeModels.AXIS = threedee.ThreeDeeModel.load_from_disk("axis", "assets/models/axis.obj", xform("ship_texture"))
-        ThreeDeeModels.SUN_FLAT = threedee.ThreeDeeModel.load_from_disk("sun_flat", "assets/models/sun_flat.obj", xform("sun_texture_flat"))
+        ThreeDeeModels.SHIP = load("ship", "assets/models/ship.obj", "ship_texture")
+        ThreeDeeModels.POINTY_BOX = load("pointy_box", "assets/models/pointy_box.obj", "ship_texture")
+        ThreeDeeModels.AXIS = load("axis", "assets/models/axis.obj", "ship_texture")
+        ThreeDeeModels.SUN_FLAT = load("sun_flat", "assets/models/sun_flat.obj", "sun_texture_flat")
 
     @staticmethod
     def from_2d_model(model_2d):
@@ -1054,9 +1067,11 @@ _DECORATIONS = None
 _LEVEL_BUILDER = None
 _STARS = None
 
-_CUTSCENES = {}    # sheet_id -> Sheet
 _3D_TEXTURES = {}  # sheet_id -> TextureSheet
 
+# cutscenes are big and rarely shown, so they're streamed in as needed instead of living in the atlas.
+_CUTSCENE_LOADER = spritesheets.StreamedImageLoader()
+
 
 def object_sheet() -> _ObjectSheet:
     return _OBJECTS
@@ -1091,12 +1106,23 @@ def star_sheet() -> _StarSheet:
 
 
 def cutscene_image(sheet_type) -> sprites.ImageModel:
-    if sheet_type in _CUTSCENES and _CUTSCENES[sheet_type] is not None:
-        return _CUTSCENES[sheet_type].get_img()
+    """returns: the cutscene's model (which belongs on the CUTSCENE_LAYER), or None if it isn't loaded yet."""
+    return _CUTSCENE_LOADER.get_img(sheet_type)
+
+
+def is_cutscene_image_loading(sheet_type) -> bool:
+    return _CUTSCENE_LOADER.is_loading(sheet_type)
+
+
+def set_active_cutscene_images(sheet_types):
+    """Starts loading the given cutscene images and unloads all the others."""
+    _CUTSCENE_LOADER.evict_all_except(keep=sheet_types)
+    for sheet_type in sheet_types:
+        _CUTSCENE_LOADER.prefetch(sheet_type)
 
 
 def initialize_sheets() -> typing.List[spritesheets.SpriteSheet]:
-    global _OBJECTS, _PLAYER_C, _BLOCKS, _OVERWORLD, _CUTSCENES, _UI, _DECORATIONS, _LEVEL_BUILDER, _STARS
+    global _OBJECTS, _PLAYER_C, _BLOCKS, _OVERWORLD, _UI, _DECORATIONS, _LEVEL_BUILDER, _STARS
     _OBJECTS = _ObjectSheet()
     _PLAYER_C = _PlayerCSheet()
     _BLOCKS = _BlockSheet()
@@ -1108,10 +1134,6 @@ def initialize_sheets() -> typing.List[spritesheets.SpriteSheet]:
 
     all_sheets = [_OBJECTS, _PLAYER_C, _BLOCKS, _OVERWORLD, _UI, _DECORATIONS, _LEVEL_BUILDER, _STARS]
 
-    for sheet_id in CutsceneTypes.ALL_TYPES:
-        _CUTSCENES[sheet_id] = spritesheets.SingleImageSheet(sheet_id)
-        all_sheets.append(_CUTSCENES[sheet_id])
-
     for id_and_file in TextureSheetTypes.ALL_TYPES:
         sheet_id, filepath = id_and_file
         _3D_TEXTURES[sheet_id] = TextureSheet(sheet_id, filepath)
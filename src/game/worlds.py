@@ -44,10 +44,32 @@ class World:
         self.safe_zones = []  # list of rects that are safe for actors to be in. if empty, the entire world is safe
 
         self._orig_blueprint = bp
+        self._blueprint_provider = None  # rebuilds the blueprint when it's stale, see mark_blueprint_stale
         self._is_being_edited = False
 
         self._tick = 0
 
+        # gameplay-neutral entities outside this rect are updated at a reduced rate. if None, all entities are
+        # updated every frame. this is typically set by the WorldView to be (a bit larger than) the camera's rect.
+        self._update_focus_rect = None
+        self._update_count = 0  # unlike _tick, this increments every update (even when paused)
+
+        # entities with static sprites that were added, removed, or changed their appearance since the WorldView
+        # last checked. it uses this to re-bake only the chunks that need it.
+        self._static_sprite_changes = set()
+
+    def set_update_focus_rect(self, rect):
+        self._update_focus_rect = rect
+
+    def get_update_focus_rect(self):
+        return self._update_focus_rect
+
+    def _should_update_neutral_entity(self, ent):
+        if self._update_focus_rect is None or util.rects_intersect(self._update_focus_rect, ent.get_rect()):
+            return True
+        period = ent.get_offscreen_update_period()
+        return period > 0 and (self._update_count + ent.get_ent_id()) % period == 0
+
     def set_game_state(self, game_state):
         self._game_state = game_state
 
@@ -144,6 +166,9 @@ class World:
             self._ent_id_to_ent[ent.get_ent_id()] = ent
             ent.set_world(self)
 
+            if ent.has_static_sprites():
+                self.mark_static_sprites_dirty(ent)
+
             for subent in ent.all_sub_entities():
                 self.add_entity(subent, next_update=False)
 
@@ -163,6 +188,9 @@ class World:
             del self._ent_id_to_ent[ent.get_ent_id()]
             ent.set_world(None)
 
+            if ent.has_static_sprites():
+                self.mark_static_sprites_dirty(ent)
+
             for subent in ent.all_sub_entities():
                 if subent.get_world() == self:  # make sure it hasn't died already
                     self.remove_entity(subent, next_update=False)
@@ -206,6 +234,14 @@ class World:
                         del self._cells_to_entities[cell]
             del self._entities_to_cells[ent]
 
+    def mark_static_sprites_dirty(self, ent):
+        self._static_sprite_changes.add(ent)
+
+    def consume_static_sprite_changes(self) -> typing.Set[entities.Entity]:
+        res = self._static_sprite_changes
+        self._static_sprite_changes = set()
+        return res
+
     def all_cells_in_rect(self, rect):
         cs = gs.get_instance().cell_size
         if rect[2] <= 0 or rect[3] <= 0:
@@ -250,8 +286,21 @@ class World:
             gs.get_instance().get_settings().set(gs.Settings.SHOW_LIGHTING, not showing)
 
     def get_blueprint(self):
+        if self._blueprint_provider is not None:
+            self._orig_blueprint = self._blueprint_provider()
+            self._blueprint_provider = None
         return self._orig_blueprint
 
+    def set_blueprint(self, bp):
+        self._orig_blueprint = bp
+        self._blueprint_provider = None
+
+    def mark_blueprint_stale(self, provider):
+        """Called when the world's entities were changed directly (e.g. by the level editor).
+            provider: () -> LevelBlueprint, only called if something actually asks for the blueprint.
+        """
+        self._blueprint_provider = provider
+
     def all_start_blocks(self, player_types=(), cond=None):
         def _cond(b):
             if len(player_types) > 0 and b.get_player_type() not in player_types:
@@ -331,6 +380,13 @@ class World:
             phys_groups[e.get_physics_group()].append(e)
 
         for ent in self.all_entities():
+            if ent.is_gameplay_neutral():
+                if not self._should_update_neutral_entity(ent):
+                    ent._n_skipped_updates += 1
+                    continue
+                elif ent._n_skipped_updates > 0:
+                    ent.catch_up(ent._n_skipped_updates)
+                    ent._n_skipped_updates = 0
             ent.update()
             ent._last_updated_at = self._tick
 
@@ -401,6 +457,7 @@ class World:
 
         if self.get_game_state() is not None and self.get_game_state().get_status().world_ticks_inc:
             self._tick += 1
+        self._update_count += 1
 
     def all_entities(self, cond=None, types=(entities.Entity,)) -> typing.Iterable[entities.Entity]:
         for t in types:
@@ -15,6 +15,85 @@ import src.game.colors as colors
 
 _ZOOM_LEVELS = (0.5, 1, 2, 3, 4)
 
+_CHUNK_SIZE = 16  # in cells
+
+
+class _BlockChunk:
+    """A square region of the world whose static entities (see Entity.has_static_sprites) are rendered as a single
+        retained SpriteGroup. Their sprites are only updated when the world says they changed, or when their
+        lighting is due for a refresh, and the group is only re-submitted if that actually changed anything.
+        An entity belongs to the chunk containing its top-left corner.
+    """
+
+    def __init__(self):
+        self._entities = set()
+        self._sprite_keys = {}     # ent -> list of (sprite uid, last modified tick)
+        self._refresh_phases = {}  # (period, offset) -> set of ents
+        self._bounds = None        # union of all the entities' rects
+        self._to_refresh = set()
+        self._needs_full_refresh = True
+
+        self.group = sprites.SpriteGroup(sprite_provider=self._all_sprites)
+
+    def add(self, ent):
+        self._entities.add(ent)
+        phase = ent.get_sprite_refresh_phase()
+        if phase is not None:
+            phase = (phase[0], phase[1] % phase[0])
+            if phase not in self._refresh_phases:
+                self._refresh_phases[phase] = set()
+            self._refresh_phases[phase].add(ent)
+        self._bounds = ent.get_rect() if self._bounds is None else util.rect_union([self._bounds, ent.get_rect()])
+        self._to_refresh.add(ent)
+
+    def remove(self, ent):
+        self._entities.discard(ent)
+        self._to_refresh.discard(ent)
+        if ent in self._sprite_keys:
+            del self._sprite_keys[ent]
+        for phase in self._refresh_phases:
+            self._refresh_phases[phase].discard(ent)
+        self.group.mark_changed()
+
+    def __contains__(self, ent):
+        return ent in self._entities
+
+    def get_bounds(self):
+        return self._bounds
+
+    def mark_needs_full_refresh(self):
+        self._needs_full_refresh = True
+
+    def mark_needs_refresh(self, ent):
+        self._to_refresh.add(ent)
+
+    def refresh(self, ents):
+        """Updates the given entities' sprites, and marks the group as changed if any of them actually changed."""
+        for ent in ents:
+            ent.update_sprites()
+            keys = [(spr.uid(), spr.last_modified_tick()) for spr in ent.all_sprites() if spr is not None]
+            if self._sprite_keys.get(ent) != keys:
+                self._sprite_keys[ent] = keys
+                self.group.mark_changed()
+
+    def update(self, tick, refresh_lighting):
+        if self._needs_full_refresh:
+            self._needs_full_refresh = False
+            self.refresh(self._entities)
+        else:
+            if len(self._to_refresh) > 0:
+                self.refresh(self._to_refresh)
+            if refresh_lighting:
+                for phase in self._refresh_phases:
+                    if (tick - phase[1]) % phase[0] == 0:
+                        self.refresh(self._refresh_phases[phase])
+        self._to_refresh.clear()
+
+    def _all_sprites(self):
+        for ent in self._entities:
+            for spr in ent.all_sprites():
+                yield spr
+
 
 class WorldView:
 
@@ -47,6 +126,10 @@ class WorldView:
         self._bg_colors_tick = 0
         self._loop_bg_colors = True
 
+        self._chunks = None  # (chunk_x, chunk_y) -> _BlockChunk, built on the first update
+        self._chunks_to_render = []
+        self._lighting_was_shown = None
+
     def update(self):
         if configs.is_dev:
             self._handle_debug_inputs()
@@ -76,7 +159,22 @@ class WorldView:
         camera_bound_rect = self._world.get_camera_bound()
         cam_x, cam_y = self.get_camera_pos_in_world()
 
-        self._entities_to_render = [ent for ent in self._calc_entities_to_render_this_frame(inside_rect=camera_bound_rect)]
+        use_chunks = self._should_use_chunks()
+        if use_chunks:
+            self._update_chunks(camera_bound_rect)
+        elif self._chunks is not None:
+            # the static entities are about to be updated and rendered individually, so the chunks will be stale
+            for chunk in self._chunks.values():
+                chunk.mark_needs_full_refresh()
+            self._chunks_to_render = []
+
+        cond = (lambda e: not e.has_static_sprites()) if use_chunks else None
+        self._entities_to_render = [ent for ent in self._calc_entities_to_render_this_frame(inside_rect=camera_bound_rect,
+                                                                                           cond=cond)]
+
+        # decorative entities far from the camera don't need full-rate updates
+        update_zone = self.get_camera_rect_in_world(integer=True, expansion=gs.get_instance().cell_size * 8)
+        self._world.set_update_focus_rect(update_zone)
 
         # update the sprites of entities near the camera
         for ent in self._entities_to_render:
@@ -273,14 +371,77 @@ class WorldView:
                 size[0] + expansion * 2,
                 size[1] + expansion * 2]
 
-    def _calc_entities_to_render_this_frame(self, inside_rect=None):
+    def _get_render_zone(self, inside_rect=None):
         buffer_zone = gs.get_instance().cell_size * 4
         render_zone = self.get_camera_rect_in_world(integer=True, expansion=buffer_zone)
         if inside_rect is not None:
             render_zone = util.get_rect_intersect(render_zone, inside_rect)
-        for ent in self._world.all_entities_in_rect(render_zone):
+        return render_zone
+
+    def _calc_entities_to_render_this_frame(self, inside_rect=None, cond=None):
+        render_zone = self._get_render_zone(inside_rect=inside_rect)
+        if render_zone is None:
+            return
+        for ent in self._world.all_entities_in_rect(render_zone, cond=cond):
             yield ent
 
+    def _should_use_chunks(self):
+        # in the editor, blocks get moved and recolored all the time
+        return not self._world.is_being_edited() and not gs.get_instance().debug_render
+
+    def _get_chunk_key(self, ent):
+        chunk_size = gs.get_instance().cell_size * _CHUNK_SIZE
+        xy = ent.get_xy()
+        return (int(xy[0] // chunk_size), int(xy[1] // chunk_size))
+
+    def _update_chunks(self, camera_bound_rect):
+        if self._chunks is None:
+            self._chunks = {}
+            self._world.consume_static_sprite_changes()
+            for ent in self._world.all_entities(cond=lambda e: e.has_static_sprites()):
+                self._add_to_chunk(ent)
+        else:
+            for ent in self._world.consume_static_sprite_changes():
+                key = self._get_chunk_key(ent)
+                if not self._world.has_entity(ent):
+                    if key in self._chunks:
+                        self._chunks[key].remove(ent)
+                elif key not in self._chunks or ent not in self._chunks[key]:
+                    self._add_to_chunk(ent)
+                else:
+                    self._chunks[key].mark_needs_refresh(ent)
+
+        show_lighting = gs.get_instance().get_settings().get(gs.Settings.SHOW_LIGHTING)
+        if show_lighting != self._lighting_was_shown:
+            for chunk in self._chunks.values():
+                chunk.mark_needs_full_refresh()
+            self._lighting_was_shown = show_lighting
+
+        render_zone = self._get_render_zone(inside_rect=camera_bound_rect)
+        old_chunks_to_render = set(self._chunks_to_render)
+        self._chunks_to_render = []
+        if render_zone is not None:
+            for chunk in self._chunks.values():
+                bounds = chunk.get_bounds()
+                if bounds is not None and util.rects_intersect(bounds, render_zone):
+                    if chunk not in old_chunks_to_render:
+                        chunk.mark_needs_full_refresh()  # it wasn't being updated while off-screen
+                    self._chunks_to_render.append(chunk)
+
+        tick = gs.get_instance().tick_count()
+        for chunk in self._chunks_to_render:
+            chunk.update(tick, show_lighting)
+
+    def _add_to_chunk(self, ent):
+        key = self._get_chunk_key(ent)
+        if key not in self._chunks:
+            self._chunks[key] = _BlockChunk()
+        self._chunks[key].add(ent)
+
+    def all_sprite_groups(self):
+        for chunk in self._chunks_to_render:
+            yield chunk.group
+
     def screen_pos_to_world_pos(self, screen_xy):
         if screen_xy is None:
             return None
@@ -1,62 +1,267 @@
-import _thread
+import collections
+import os
+import threading
 import time
 import traceback
 
 
+class CancelledError(Exception):
+    pass
+
+
 class Future:
+    """The result of some work that's happening (or will happen) on another thread.
+
+        Waiting is done with a condition variable, so it doesn't poll. Callbacks registered with add_done_callback()
+        run on the main thread by default (see process_main_thread_callbacks), so they're free to touch pygame
+        and sprite state.
+    """
 
     def __init__(self, callback=None):
+        """
+            callback: optional lambda val -> None, run on the main thread when the future completes successfully.
+        """
         self._val = None
+        self._exception = None
         self._done = False
+        self._cancelled = False
 
-        self._callback = callback
+        self._cond = threading.Condition()
+        self._callbacks = []  # list of (lambda Future -> None, on_main_thread)
+
+        if callback is not None:
+            self.add_done_callback(lambda fut: callback(fut.get_val()) if fut.get_exception() is None else None)
 
     def __repr__(self):
         return "{}({}, done={})".format(type(self).__name__, self._val, self._done)
 
+    def _complete(self, val=None, exception=None, cancelled=False) -> bool:
+        with self._cond:
+            if self._done:
+                return False
+            self._val = val
+            self._exception = exception
+            self._cancelled = cancelled
+            self._done = True
+            callbacks = self._callbacks
+            self._callbacks = []
+            self._cond.notify_all()
+
+        for (cb, on_main_thread) in callbacks:
+            self._run_callback(cb, on_main_thread)
+        return True
+
+    def _run_callback(self, cb, on_main_thread):
+        if on_main_thread:
+            run_on_main_thread(lambda: cb(self))
+        else:
+            try:
+                cb(self)
+            except Exception:
+                traceback.print_exc()
+
     def set_val(self, val) -> 'Future':
-        self._val = val
-        self._done = True
-        if self._callback is not None:
-            self._callback(val)
+        self._complete(val=val)
+        return self
+
+    def set_exception(self, exception) -> 'Future':
+        self._complete(exception=exception)
         return self
 
+    def cancel(self) -> bool:
+        """Cancels the work if it hasn't finished yet (work that's already running won't be interrupted, but its
+            result will be ignored). returns: whether the future was cancelled.
+        """
+        return self._complete(exception=CancelledError(), cancelled=True)
+
+    def add_done_callback(self, callback, on_main_thread=True):
+        """callback: lambda Future -> None. If on_main_thread is False, it's run on whichever thread completes
+            the future (or immediately, if it's already done).
+        """
+        with self._cond:
+            if not self._done:
+                self._callbacks.append((callback, on_main_thread))
+                return
+        self._run_callback(callback, on_main_thread)
+
     def is_done(self):
         return self._done
 
+    def is_cancelled(self):
+        return self._cancelled
+
     def get_val(self):
+        """returns: the result, or None if the work isn't done, failed, or was cancelled."""
         return self._val
 
-    def wait(self, poll_rate_secs=0.1, time_limit_secs=None):
-        if self._done:
-            return self._val
-        else:
-            start_time_secs = time.time()
-            while not self._done:
-                cur_time_secs = time.time()
-                if time_limit_secs is not None and cur_time_secs - start_time_secs > time_limit_secs:
-                    raise ValueError("Future did not complete within time limit ({} sec)".format(time_limit_secs))
-                time.sleep(poll_rate_secs)
-            return self._val
+    def get_exception(self):
+        return self._exception
+
+    def wait(self, poll_rate_secs=None, time_limit_secs=None):
+        """Blocks until the future is done. poll_rate_secs is ignored, and only kept for compatibility.
+            returns: the result, or None if the work failed or was cancelled.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._done, timeout=time_limit_secs):
+                raise ValueError("Future did not complete within time limit ({} sec)".format(time_limit_secs))
+        return self._val
+
+    def result(self, time_limit_secs=None):
+        """Like wait(), but raises the exception the work failed with (or CancelledError)."""
+        val = self.wait(time_limit_secs=time_limit_secs)
+        if self._exception is not None:
+            raise self._exception
+        return val
+
+
+_MAIN_THREAD_QUEUE = collections.deque()  # of lambda: None. deque's append and popleft are thread-safe
+
+
+def run_on_main_thread(runnable):
+    """Schedules the runnable to be run on the main thread, during the next process_main_thread_callbacks()."""
+    _MAIN_THREAD_QUEUE.append(runnable)
+
+
+def process_main_thread_callbacks(time_budget_secs=None) -> int:
+    """Runs the queued main-thread callbacks in the order they were queued. Called by the game loop once per frame.
+        time_budget_secs: if not None, stops once this much time is used, leaving the rest for the next call.
+        returns: the number of callbacks that were run.
+    """
+    start_time = time.perf_counter()
+    n = 0
+    while len(_MAIN_THREAD_QUEUE) > 0:
+        if time_budget_secs is not None and n > 0 and time.perf_counter() - start_time >= time_budget_secs:
+            break
+        runnable = _MAIN_THREAD_QUEUE.popleft()
+        try:
+            runnable()
+        except Exception:
+            traceback.print_exc()
+        n += 1
+    return n
+
+
+def num_pending_main_thread_callbacks():
+    return len(_MAIN_THREAD_QUEUE)
+
+
+class WorkerPool:
+    """A fixed number of daemon threads, which run jobs in the order they're submitted."""
+
+    def __init__(self, max_workers=None, name="worker"):
+        if max_workers is None:
+            # at least 2, so one slow job can't hold up everything else on machines with few cores
+            max_workers = max(2, min(4, (os.cpu_count() or 2) - 1))
+        self.max_workers = max_workers
+        self.name = name
+
+        self._jobs = collections.deque()  # of (runnable, Future)
+        self._cond = threading.Condition()
+        self._threads = []
+        self._n_idle = 0
+        self._shutdown = False
+
+    def submit(self, runnable, future=None) -> Future:
+        """
+        runnable: () -> val or () -> None
+        future: an optional Future to use. If None, a new one will be made.
+        """
+        if future is None:
+            future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise ValueError("can't submit work to a pool that's been shut down")
+            self._jobs.append((runnable, future))
+            if self._n_idle == 0 and len(self._threads) < self.max_workers:
+                # threads are started lazily, so pools that are never used don't cost anything
+                thread = threading.Thread(target=self._run_worker, daemon=True,
+                                          name="{}-{}".format(self.name, len(self._threads)))
+                self._threads.append(thread)
+                thread.start()
+            else:
+                self._cond.notify()
+        return future
+
+    def _run_worker(self):
+        while True:
+            with self._cond:
+                self._n_idle += 1
+                self._cond.wait_for(lambda: len(self._jobs) > 0 or self._shutdown)
+                self._n_idle -= 1
+                if len(self._jobs) == 0:
+                    return  # shut down
+                runnable, future = self._jobs.popleft()
+
+            if future.is_done():
+                continue  # it was cancelled while it was queued
+            try:
+                future.set_val(runnable())
+            except Exception as e:
+                traceback.print_exc()
+                future.set_exception(e)
+
+    def num_queued(self):
+        return len(self._jobs)
+
+    def shutdown(self, cancel_queued=True):
+        with self._cond:
+            self._shutdown = True
+            if cancel_queued:
+                while len(self._jobs) > 0:
+                    self._jobs.popleft()[1].cancel()
+            self._cond.notify_all()
+
+
+_DEFAULT_POOL = None
+_DECODE_POOL = None
+
+
+def get_default_pool() -> WorkerPool:
+    global _DEFAULT_POOL
+    if _DEFAULT_POOL is None:
+        _DEFAULT_POOL = WorkerPool()
+    return _DEFAULT_POOL
+
+
+def get_decode_pool() -> WorkerPool:
+    """A separate pool for decoding audio and images, which can take a long time."""
+    global _DECODE_POOL
+    if _DECODE_POOL is None:
+        _DECODE_POOL = WorkerPool(max_workers=2, name="decoder")
+    return _DECODE_POOL
 
 
 def do_work_on_background_thread(runnable, future=None) -> Future:
     """
+    Runs the work on the default WorkerPool.
     runnable: () -> val or () -> None
     future: an optional Future to use. If None, a new one will be made.
     """
+    return get_default_pool().submit(runnable, future=future)
+
+
+def do_decode_work_on_background_thread(runnable, future=None) -> Future:
+    """Like do_work_on_background_thread, but runs on the decode pool, so long decodes (songs, big images) don't
+        hold up the default pool's work (like world builds and saves).
+    """
+    return get_decode_pool().submit(runnable, future=future)
+
+
+def do_work_on_dedicated_thread(runnable, future=None) -> Future:
+    """Like do_work_on_background_thread, but gets a thread of its own. For work that blocks for a long time
+        (like waiting on user input), so it doesn't tie up one of the pool's workers.
+    """
     if future is None:
         future = Future()
 
     def _do_work():
-        result = None
         try:
-            result = runnable()
-        except Exception:
+            future.set_val(runnable())
+        except Exception as e:
             traceback.print_exc()
-        future.set_val(result)
+            future.set_exception(e)
 
-    _thread.start_new_thread(_do_work, ())
+    threading.Thread(target=_do_work, daemon=True).start()
     return future
 
 
@@ -93,7 +298,7 @@ def prompt_for_text(window_title, question_text, default_text, do_async=True) ->
         return result[0]
 
     if do_async:
-        return do_work_on_background_thread(_do_prompt)
+        return do_work_on_dedicated_thread(_do_prompt)
     else:
         res = Future()
         res.set_val(_do_prompt())
@@ -113,7 +318,56 @@ if __name__ == "__main__":
         return sum
 
     fut = do_work_on_background_thread(do_some_long_running_work)
+    fut.add_done_callback(lambda f: print("callback on {}: {}".format(threading.current_thread().name, f.get_val())))
     while not fut.is_done():
         print("waiting on main thread...")
         time.sleep(0.1)
-    print(fut.get_val())
\ No newline at end of file
+    print(fut.get_val())
+    process_main_thread_callbacks()
+
+    # jobs start in order, and main-thread callbacks run in the order the jobs finished
+    pool = WorkerPool(max_workers=1, name="test")
+    finished = []
+    futs = [pool.submit(lambda i=i: i) for i in range(0, 10)]
+    for f in futs:
+        f.add_done_callback(lambda f: finished.append(f.get_val()))
+    futs[-1].wait(time_limit_secs=5)
+    process_main_thread_callbacks()
+    assert finished == list(range(0, 10)), finished
+
+    # queued jobs can be cancelled, and never run
+    ran = []
+    gate = threading.Event()
+    blocker = pool.submit(lambda: gate.wait(5))
+    cancelled = pool.submit(lambda: ran.append(True))
+    assert cancelled.cancel() and cancelled.is_cancelled()
+    gate.set()
+    blocker.wait(time_limit_secs=5)
+    pool.submit(lambda: None).wait(time_limit_secs=5)
+    assert len(ran) == 0
+    try:
+        cancelled.result()
+        assert False
+    except CancelledError:
+        pass
+
+    # exceptions get delivered to whoever asks for the result
+    failed = pool.submit(lambda: 1 / 0)
+    assert failed.wait(time_limit_secs=5) is None
+    assert isinstance(failed.get_exception(), ZeroDivisionError)
+    try:
+        failed.result()
+        assert False
+    except ZeroDivisionError:
+        pass
+
+    # time limits
+    slow = pool.submit(lambda: time.sleep(0.5))
+    try:
+        slow.wait(time_limit_secs=0.05)
+        assert False
+    except ValueError:
+        pass
+
+    pool.shutdown()
+    print("all good")
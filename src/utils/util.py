@@ -5,8 +5,10 @@ import json
 import re
 import sys
 import heapq
+import bisect
 import traceback
 import copy
+import collections
 
 import appdirs
 
@@ -966,7 +968,11 @@ def load_json_from_path(filepath):
         raise e
 
 
-def save_json_to_path(json_blob, filepath, make_pretty=True):
+def save_json_to_path(json_blob, filepath, make_pretty=True, atomic=False):
+    """
+    atomic: if True, the data is written to a temp file, fsync'd, and then renamed over the destination. This way a
+        crash (or power loss) mid-write leaves behind the old file instead of a truncated one.
+    """
     try:
         json_string = json.dumps(json_blob, indent=4, sort_keys=True)
     except (ValueError, TypeError) as e:
@@ -981,8 +987,16 @@ def save_json_to_path(json_blob, filepath, make_pretty=True):
     if directory != "" and not os.path.exists(directory):
         os.makedirs(directory)
 
-    with open(filepath, 'w') as outfile:
-        outfile.write(json_string)
+    if atomic:
+        tmp_filepath = filepath + ".tmp"
+        with open(tmp_filepath, 'w') as outfile:
+            outfile.write(json_string)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tmp_filepath, filepath)
+    else:
+        with open(filepath, 'w') as outfile:
+            outfile.write(json_string)
 
 
 _paren_dict = {"(": ")", ")": "(", "[": "]", "]": "[", "{": "}", "}": "{", "<": ">", ">": "<"}
@@ -995,40 +1009,59 @@ def opposite_paren(paren_char):
         return paren_char
 
 
-def make_json_pretty(json_string, _rm_newlines=True):
-    """removes newlines between elements of innermost lists."""
-
-    def find_close_paren(string, index, open='(', closed=')'):
-        balance = 0
-        for i in range(index, len(string)):
-            if string[i] == open:
-                balance += 1
-            elif string[i] == closed:
-                balance -= 1
-            if balance == 0:
-                return i
-        raise ValueError("Unbalanced parenthesis in " + string)
-
-    m = re.search('[({[]', json_string)
-    if m is None:
-        if _rm_newlines:
-            # json_string has no inner collection, so remove all internal newlines
-            res = re.sub("\s*,\s*", ", ", json_string)
-
-            # remove leading and trailing whitespace
-            res = re.sub("^\s*", "", res)
-            res = re.sub("\s*$", "", res)
-        else:
-            res = json_string
-    else:
-        # TODO treat small lists like non-lists
-        i = m.start(0)
-        j = find_close_paren(json_string, i, json_string[i], opposite_paren(json_string[i]))
-        substring = make_json_pretty(json_string[i + 1:j], True)
+_JSON_OPEN_BRACKET_RE = re.compile(r"[({[]")
+_JSON_ANY_BRACKET_RE = re.compile(r"[(){}\[\]]")
+_JSON_COMMA_RE = re.compile(r"\s*,\s*")
+_JSON_LEADING_WHITESPACE_RE = re.compile(r"^\s*")
+_JSON_TRAILING_WHITESPACE_RE = re.compile(r"\s*$")
 
-        res = json_string[:i + 1] + substring + make_json_pretty(json_string[j:], False)
 
-    return res
+def make_json_pretty(json_string):
+    """removes newlines between elements of innermost lists.
+        Brackets are matched with one pass over the string (instead of re-scanning and re-slicing it for every
+        collection), so this is linear in the length of the json.
+    """
+    open_idxs = [m.start(0) for m in _JSON_OPEN_BRACKET_RE.finditer(json_string)]
+
+    close_idxs = {}  # open bracket idx -> matching close bracket idx
+    stacks = {"(": [], "[": [], "{": []}
+    for m in _JSON_ANY_BRACKET_RE.finditer(json_string):
+        c = m.group(0)
+        if c in stacks:
+            stacks[c].append(m.start(0))
+        else:
+            stack = stacks[opposite_paren(c)]
+            if len(stack) > 0:
+                close_idxs[stack.pop()] = m.start(0)
+
+    def _rm_newlines(segment):
+        # segment has no inner collection, so remove all internal newlines
+        res = _JSON_COMMA_RE.sub(", ", segment)
+
+        # remove leading and trailing whitespace
+        res = _JSON_LEADING_WHITESPACE_RE.sub("", res)
+        return _JSON_TRAILING_WHITESPACE_RE.sub("", res)
+
+    parts = []
+
+    def _emit(start, end, rm_newlines):
+        # siblings are handled by the loop, so the recursion only goes as deep as the json's nesting
+        while True:
+            next_open = bisect.bisect_left(open_idxs, start)
+            i = open_idxs[next_open] if next_open < len(open_idxs) else end
+            if i >= end:
+                parts.append(_rm_newlines(json_string[start:end]) if rm_newlines else json_string[start:end])
+                return
+            j = close_idxs.get(i, end)
+            if j >= end:
+                raise ValueError("Unbalanced parenthesis in " + json_string[i:end])
+            parts.append(json_string[start:i + 1])
+            _emit(i + 1, j, True)
+            start = j
+            rm_newlines = False
+
+    _emit(0, len(json_string), True)
+    return "".join(parts)
 
 
 def read_int(json_blob, key, default):
@@ -1582,6 +1615,90 @@ class SpacialHashMap:
             print()
 
 
+class LRUCache:
+    """A bounded key-value cache that evicts its least recently used items when it gets too big."""
+
+    def __init__(self, max_size, size_func=None, on_evict=None):
+        """
+            max_size: the maximum total size of the items in the cache.
+            size_func: value -> int, the size of an item. If None, every item has size 1.
+            on_evict: (key, value) -> None, called whenever an item leaves the cache.
+        """
+        self._max_size = max_size
+        self._size_func = size_func
+        self._on_evict = on_evict
+
+        self._items = collections.OrderedDict()  # key -> (value, size), least recently used first
+        self._total_size = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key, or_else=None):
+        if key in self._items:
+            self._items.move_to_end(key)
+            self._hits += 1
+            return self._items[key][0]
+        else:
+            self._misses += 1
+            return or_else
+
+    def put(self, key, value):
+        self.remove(key)
+        size = 1 if self._size_func is None else self._size_func(value)
+        if size > self._max_size:
+            return  # would just get evicted immediately
+        self._items[key] = (value, size)
+        self._total_size += size
+        while self._total_size > self._max_size:
+            old_key = next(iter(self._items))
+            self.remove(old_key)
+            self._evictions += 1
+
+    def remove(self, key):
+        if key in self._items:
+            value, size = self._items.pop(key)
+            self._total_size -= size
+            if self._on_evict is not None:
+                self._on_evict(key, value)
+
+    def clear(self):
+        for key in list(self._items.keys()):
+            self.remove(key)
+
+    def set_max_size(self, max_size):
+        self._max_size = max_size
+        while self._total_size > self._max_size and len(self._items) > 0:
+            self.remove(next(iter(self._items)))
+            self._evictions += 1
+
+    def get_max_size(self):
+        return self._max_size
+
+    def get_total_size(self):
+        return self._total_size
+
+    def get_stats(self):
+        """returns: (hits, misses, evictions) since the cache was created or the stats were last reset."""
+        return self._hits, self._misses, self._evictions
+
+    def reset_stats(self):
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return "{}:[num_items={}, size={}/{}, hits={}, misses={}]".format(
+            type(self).__name__, len(self), self._total_size, self._max_size, self._hits, self._misses)
+
+
 class _HashableWrapper:
     """You can make mutable objects hashable with this handy wrapper. Is this a good idea? No."""
 
@@ -1650,6 +1767,103 @@ if __name__ == "__main__":
     print([x for x in hashmap.all_items_at_point((0, 5))])
 
 
+if __name__ == "__main__":
+    import time
+
+    def _make_json_pretty_reference(json_string, _rm_newlines=True):
+        # the original (quadratic) implementation, which make_json_pretty must match exactly
+        def find_close_paren(string, index, open='(', closed=')'):
+            balance = 0
+            for i in range(index, len(string)):
+                if string[i] == open:
+                    balance += 1
+                elif string[i] == closed:
+                    balance -= 1
+                if balance == 0:
+                    return i
+            raise ValueError("Unbalanced parenthesis in " + string)
+
+        m = re.search('[({[]', json_string)
+        if m is None:
+            if _rm_newlines:
+                res = re.sub(r"\s*,\s*", ", ", json_string)
+                res = re.sub(r"^\s*", "", res)
+                res = re.sub(r"\s*$", "", res)
+            else:
+                res = json_string
+        else:
+            i = m.start(0)
+            j = find_close_paren(json_string, i, json_string[i], opposite_paren(json_string[i]))
+            substring = _make_json_pretty_reference(json_string[i + 1:j], True)
+            res = json_string[:i + 1] + substring + _make_json_pretty_reference(json_string[j:], False)
+        return res
+
+    def _check_pretty(blob, name):
+        raw = json.dumps(blob, indent=4, sort_keys=True)
+        try:
+            expected = _make_json_pretty_reference(raw)
+        except ValueError:
+            expected = ValueError  # brackets inside strings can unbalance it
+        try:
+            actual = make_json_pretty(raw)
+        except ValueError:
+            actual = ValueError
+        assert actual == expected, "make_json_pretty differs from the reference for {}".format(name)
+
+    # the old version recurses once per sibling collection
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20000))
+
+    # every level in the game
+    root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+    n_files = 0
+    for corpus_dir in ("overworlds", "level_purgatory"):
+        for dirpath, _, filenames in os.walk(os.path.join(root_dir, corpus_dir)):
+            for filename in sorted(filenames):
+                if filename.endswith(".json"):
+                    filepath = os.path.join(dirpath, filename)
+                    with open(filepath) as f:
+                        _check_pretty(json.load(f), filepath)
+                    n_files += 1
+    assert n_files > 0, "couldn't find any levels"
+    print("INFO: make_json_pretty matches the reference on {} level files".format(n_files))
+
+    # awkward strings, including brackets and commas inside them
+    rng = random.Random(12345)
+
+    def _rand_blob(depth):
+        choice = rng.randint(0, 5 if depth < 4 else 2)
+        if choice == 0:
+            return rng.randint(-100, 100)
+        elif choice == 1:
+            return "".join(rng.choice("ab ,\n[]{}()") for _ in range(rng.randint(0, 6)))
+        elif choice == 2:
+            return rng.choice([None, True, False, 0.5])
+        elif choice in (3, 4):
+            return [_rand_blob(depth + 1) for _ in range(rng.randint(0, 4))]
+        else:
+            return {"k{}".format(i): _rand_blob(depth + 1) for i in range(rng.randint(0, 4))}
+
+    for n in range(2000):
+        _check_pretty(_rand_blob(0), "random blob {}".format(n))
+    print("INFO: make_json_pretty matches the reference on 2000 random blobs")
+
+    def _synthetic_level(n_entities):
+        ents = [{"type": "block", "x": 16 * (i % 500), "y": 16 * (i // 500), "w": 16, "h": 16,
+                 "art_id": i % 7, "color_id": i % 5, "points": [[i, 0], [0, i]]} for i in range(n_entities)]
+        return {"level_id": "synthetic", "name": "Synthetic", "entities": ents, "characters": ["player_fast"],
+                "special": [], "time_limit": 3600, "song_id": None, "description": ""}
+
+    # the reference can't handle huge levels in a reasonable time, so it's only compared on a smaller one
+    _check_pretty(_synthetic_level(2000), "2k-entity level")
+
+    for n_entities in (1000, 10000, 100000):
+        raw = json.dumps(_synthetic_level(n_entities), indent=4, sort_keys=True)
+        start_time = time.perf_counter()
+        make_json_pretty(raw)
+        print("INFO: make_json_pretty on a {}-entity level ({:.1f}MB): {:.3f}s".format(
+            n_entities, len(raw) / 1e6, time.perf_counter() - start_time))
+
+
 if __name__ == "__main__" and False:
     sizes = [(5, 5), (2, 3), (7, 2), (1, 5), (9, 4), (3, 16), (3, 3), (3, 4)]
     packed, bound = pack_rects_into_smallest_rect(sizes)